@@ -1,26 +1,37 @@
 # Run this app with `python app.py` and
 # visit http://127.0.0.1:8050/ in your web browser.
 
+import os
+
 from dash import Dash, html, dcc, ctx
-from dash.dependencies import Input, Output, State
+from dash.dependencies import Input, Output, State, ClientsideFunction, ALL, MATCH
+from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
 
-import plotly.graph_objects as go
-import plotly.express as px
-
-import numpy as np
 import glider.polar as gp
+from glider import fitting
 
-
-from ui.polar_compare import *
-from ui.wl_effect import *
+from ui.polar_compare import render_tab_compare_polars, update_tab_compare_polars, polars_selection, add_compare_slot, compare_trace
+from ui.wl_effect import (render_tab_wingloading_analysis, update_tab_wingloading_analysis, update_tab_wingloading_analysis_clientside,
+	CLIENTSIDE_WING_LOADING, WL_EFFECT_METHODS)
+from ui.glider_search import search_options
+from ui.xc_speed import render_tab_xc_speed, update_tab_xc_speed, task_speed_engine, maccready_engine
+from ui.fleet_ranking import render_tab_fleet_ranking, update_tab_fleet_ranking, fleet_ranking
+from ui.uncertainty import render_tab_uncertainty, update_tab_uncertainty, uncertainty_traces
+from ui import instrumentation
+from ui import api
+import ui.wl_effect
 
 URL_ACPH = 'https://aeroclub-issoire.fr'
 URL_LOGO_IMG = 'assets/logo-v2017-gray-SD.png'
 
-# load data
-polars_db = gp.PolarsDB.get_instance('./glider-polars-db.json')
-aGliderPolar = polars_db.fromNameAndSource('LAK19-18m','Manual')
+POLARS_DB_FILE = os.environ.get('POLARS_DB_FILE', './glider-polars-db.json')
+
+# the polars DB is loaded by the first request of each worker, or here once in the gunicorn
+# master when PRELOAD_POLARS_DB is set and the app is started with --preload: the workers
+# then share its pages copy on write
+PRELOAD_POLARS_DB = os.environ.get('PRELOAD_POLARS_DB', '').lower() in ['1', 'true', 'yes']
+gp.PolarsDB.get_registry(POLARS_DB_FILE, preload=PRELOAD_POLARS_DB)
 
 # https://dash-bootstrap-components.opensource.faculty.ai/
 app = Dash(__name__,
@@ -32,53 +43,156 @@ app = Dash(__name__,
 		)
 app.config["suppress_callback_exceptions"] = True
 
+if CLIENTSIDE_WING_LOADING:
+	@app.callback(
+		Output(component_id='wing-loading-output', component_property='children'),
+		Output(component_id='wing-loading-slider',component_property='value'),
+		Output('speed-polar-graph','figure'),
+		Output('wing-loading-polar','data'),
+		Input(component_id='glider-selected', component_property='value'),
+	)
+	@instrumentation.instrument
+	def callback_update_tab_wingloading_analysis(glider_name):
+		return update_tab_wingloading_analysis_clientside(glider_name)
+
+	# slider moves are handled in the browser, see assets/wl_effect.js
+	app.clientside_callback(
+		ClientsideFunction(namespace='wl_effect', function_name='update_wing_loading'),
+		Output('speed-polar-graph','figure', allow_duplicate=True),
+		Output(component_id='wing-loading-output', component_property='children', allow_duplicate=True),
+		Input(component_id='wing-loading-slider', component_property='value'),
+		Input('wing-loading-polar','data'),
+		State('speed-polar-graph','figure'),
+		prevent_initial_call=True
+	)
+else:
+	@app.callback(
+		Output(component_id='wing-loading-output', component_property='children'),
+		Output(component_id='wing-loading-slider',component_property='value'),
+		Output('speed-polar-graph','figure'),
+		Input(component_id='glider-selected', component_property='value'),
+		Input(component_id='wing-loading-slider', component_property='value'),
+		State('polars-selection', 'data')
+	)
+	@instrumentation.instrument
+	def callback_update_tab_wingloading_analysis(glider_name, wingloading, data):
+		return update_tab_wingloading_analysis(glider_name, wingloading)
+
+# options of the glider dropdowns, loaded as the user types
 @app.callback(
-	Output(component_id='wing-loading-output', component_property='children'),
-	Output(component_id='wing-loading-slider',component_property='value'),
-	Output('speed-polar-graph','figure'),
-	Input(component_id='glider-selected', component_property='value'),
-	Input(component_id='wing-loading-slider', component_property='value'),
-	State('polars-selection', 'data')
+	Output('glider-selected', 'options'),
+	Input('glider-selected', 'search_value'),
+	State('glider-selected', 'value'),
 )
-def callback_update_tab_wingloading_analysis(glider_name, wingloading, data):
-	return update_tab_wingloading_analysis(glider_name, wingloading)
+@instrumentation.instrument
+def callback_search_wingloading_glider(search_value, value):
+	return search_options(gp.PolarsDB.get_instance(), search_value, value, WL_EFFECT_METHODS, by_label=True)
+
+@app.callback(
+	Output({'type': 'compare-glider', 'index': MATCH}, 'options'),
+	Input({'type': 'compare-glider', 'index': MATCH}, 'search_value'),
+	State({'type': 'compare-glider', 'index': MATCH}, 'value'),
+)
+@instrumentation.instrument
+def callback_search_compare_glider(search_value, value):
+	return search_options(gp.PolarsDB.get_instance(), search_value, value)
+
+@app.callback(
+	Output('xc-glider-selected', 'options'),
+	Input('xc-glider-selected', 'search_value'),
+	State('xc-glider-selected', 'value'),
+)
+@instrumentation.instrument
+def callback_search_xc_glider(search_value, value):
+	return search_options(gp.PolarsDB.get_instance(), search_value, value)
+
+@app.callback(
+	Output('uncertainty-glider-selected', 'options'),
+	Input('uncertainty-glider-selected', 'search_value'),
+	State('uncertainty-glider-selected', 'value'),
+)
+@instrumentation.instrument
+def callback_search_uncertainty_glider(search_value, value):
+	return search_options(gp.PolarsDB.get_instance(), search_value, value)
 
 @app.callback(
 	Output('speed-polar-compare-graph', 'figure'),
 	Input('polars-selection', 'data'),
 )
+@instrumentation.instrument
 def callback_update_tab_compare_polars(data):
 	return update_tab_compare_polars(data)
 
 @app.callback(
 	Output('polars-selection', 'data'),
-	Input(component_id='glider-1', component_property='value'),
-	Input(component_id='glider-2', component_property='value'),
-	Input(component_id='glider-3', component_property='value'),
-	Input(component_id='glider-4', component_property='value'),
+	Input({'type': 'compare-glider', 'index': ALL}, 'value'),
+	Input({'type': 'compare-wing-loading', 'index': ALL}, 'value'),
 )
-def callback_polars_selection(g1, g2, g3, g4):
+@instrumentation.instrument
+def callback_polars_selection(glider_ids, wing_loadings):
 	if ctx.triggered_id is None:
 		raise PreventUpdate
 
-	ctx_msg = json.dumps({
-		'states': ctx.states,
-		'triggered': ctx.triggered,
-		'inputs': ctx.inputs
-	}, indent=2)
+	return polars_selection(glider_ids, wing_loadings)
+
+@app.callback(
+	Output('compare-slots', 'children'),
+	Input('compare-add-glider', 'n_clicks'),
+	prevent_initial_call=True
+)
+@instrumentation.instrument
+def callback_add_compare_slot(n_clicks):
+	return add_compare_slot(n_clicks)
+
+@app.callback(
+	Output('xc-speed-graph', 'figure'),
+	Input('xc-glider-selected', 'value'),
+	Input('xc-mac-cready-slider', 'value'),
+	Input('xc-netto-slider', 'value'),
+)
+@instrumentation.instrument
+def callback_update_tab_xc_speed(glider_id, mac_cready, netto):
+	return update_tab_xc_speed(glider_id, mac_cready, netto)
+
+@app.callback(
+	Output('ranking-graph', 'figure'),
+	Input('ranking-speed-slider', 'value'),
+	Input('ranking-wing-loading-slider', 'value'),
+	Input('ranking-limit', 'value'),
+	Input('ranking-reachable', 'value'),
+)
+@instrumentation.instrument
+def callback_update_tab_fleet_ranking(speed, wing_loading, limit, reachable):
+	return update_tab_fleet_ranking(speed, wing_loading, limit, reachable)
 
-	return ctx_msg
+@app.callback(
+	Output('uncertainty-graph', 'figure'),
+	Input('uncertainty-glider-selected', 'value'),
+	Input('uncertainty-sigma-slider', 'value'),
+	Input('uncertainty-wing-loading', 'value'),
+	Input('uncertainty-samples', 'value'),
+)
+@instrumentation.instrument
+def callback_update_tab_uncertainty(glider_id, sink_rate_sigma, wing_loading, samples):
+	return update_tab_uncertainty(glider_id, sink_rate_sigma, wing_loading, samples)
 
 @app.callback(
 	Output('tabs-content', 'children'),
 	Input('tabs-graph', 'value'),
 	State('polars-selection', 'data')
 )
+@instrumentation.instrument
 def render_tabs_content(active_tab, data):
 	if active_tab == 'tab-1-graph':
 		return render_tab_wingloading_analysis()
 	elif active_tab == 'tab-2-graph':
-		return render_tab_compare_polars(polars_db)
+		return render_tab_compare_polars()
+	elif active_tab == 'tab-3-graph':
+		return render_tab_xc_speed()
+	elif active_tab == 'tab-4-graph':
+		return render_tab_fleet_ranking()
+	elif active_tab == 'tab-5-graph':
+		return render_tab_uncertainty()
 
 header = html.Div(className='mb-5', style={'background-color': 'rgba(0,0,0,.03)', 'color': '#6c757d', 'border': '1px solid rgba(0,0,0,.125)'}, children=[
 	dbc.Row( className='py-3', children=[
@@ -110,6 +224,9 @@ app.layout = html.Div(className='', children=[
 	dcc.Tabs(id="tabs-graph", value='tab-1-graph', className='mx-5', persistence=True, persistence_type='session', children=[
 		dcc.Tab(label='Effect of wing loading ', value='tab-1-graph'),
 		dcc.Tab(label='Compare polars', value='tab-2-graph'),
+		dcc.Tab(label='Cross-country speed', value='tab-3-graph'),
+		dcc.Tab(label='Fleet ranking', value='tab-4-graph'),
+		dcc.Tab(label='Polar uncertainty', value='tab-5-graph'),
 	]),
 	html.Div(id='tabs-content'),
 	footer,
@@ -119,5 +236,21 @@ app.layout = html.Div(className='', children=[
 # https://pythonprogramming.net/deploy-vps-dash-data-visualization/
 server = app.server
 
+# callback metrics on /metrics, and a json line per callback request when CALLBACK_LOG is set
+instrumentation.init_app(server, caches={
+	'polars': lambda: gp.PolarsDB.get_instance().polar_cache.cache_info(),
+	'static_figures': ui.wl_effect._static_figure.cache_info,
+	'compare_traces': compare_trace.cache_info,
+	'task_speed_grids': task_speed_engine.cache_info,
+	'maccready_grids': maccready_engine.cache_info,
+	'fleet_matrix': fleet_ranking.cache_info,
+	'uncertainty_traces': uncertainty_traces.cache_info,
+	'api_responses': api.response_cache.cache_info,
+	'by_hand_fits': fitting._fit.cache_info,
+})
+
+# JSON/HTTP API of the polars on /api/v1
+api.init_app(server)
+
 if __name__ == '__main__':
 	app.run(debug=False)
@@ -0,0 +1,120 @@
+// Browser side version of the wing loading update done by ui/wl_effect.py, used when
+// CLIENTSIDE_WING_LOADING is set. The server stores the reference polar in the
+// 'wing-loading-polar' store, then every slider move is computed here without any
+// round trip. Keep it in line with wing_loading_traces() and wing_loading_annotations().
+
+(function (root) {
+	// str(round(x, n)) of python
+	function pyRound(x, n) {
+		if (isNaN(x)) {
+			return 'nan';
+		}
+		var r = Number(x.toFixed(n));
+		if (Object.is(r, -0)) {
+			return '-0.0';
+		}
+		return Number.isInteger(r) ? r.toFixed(1) : String(r);
+	}
+
+	function polarToString(p) {
+		var polar_str = pyRound(p[0], 4) + 'x<sup>2</sup>';
+		polar_str += (p[1] >= 0) ? ' + ' : ' ';
+		polar_str += pyRound(p[1], 4) + 'x';
+		polar_str += (p[2] >= 0) ? ' + ' : ' ';
+		polar_str += pyRound(p[2], 4);
+		return polar_str;
+	}
+
+	// see glider.polar.wing_loading_coefficients()
+	function coefficientsAt(polar, wing_loading) {
+		var k = Math.sqrt(wing_loading / polar.wing_loading);
+		var c = polar.coefficients;
+		return [c[0] / k, c[1], c[2] * k];
+	}
+
+	function wingLoadingTraces(polar, p, wing_loading) {
+		var scale = polar.speed_scale;
+		var a = p[0], b = p[1], c = p[2];
+		var f = function (x) { return (a * x + b) * x + c; };
+
+		// vertex and tangent through the origin, see glider.solvers
+		var xv = -b / (2 * a);
+		var yv = c - b * b / (4 * a);
+		var u = Math.sqrt(c / a);
+		var slope = 2 * a * u + b;
+
+		return [
+			{x: polar.tangent_x, y: polar.tangent_x.map(function () { return yv; }), name: 'Horizontal tangent'},
+			{x: [xv * scale], y: [yv], name: 'Min sink rate'},
+			{x: polar.tangent_x, y: polar.tangent_x.map(function (x) { return slope * x / scale; }), name: 'Tangent at (0,0)'},
+			{x: [u * scale], y: [f(u)], name: 'Max glide ratio'},
+			{x: polar.x_polar, y: polar.x_polar.map(function (x) { return f(x / scale); }),
+				name: '<b>Adjusted Polar</b><br>(wing loading: ' + wing_loading + ' kg/m2)'},
+		];
+	}
+
+	function metrics(polar, p) {
+		var scale = polar.speed_scale;
+		var a = p[0], b = p[1], c = p[2];
+
+		// same formulas as quadratic_min_sink_rate() and quadratic_max_glide_ratio(), see glider.solvers
+		var msr_speed = -b / (2 * a) * scale;
+		var msr_vz = c - b * b / (4 * a);
+		var u = Math.sqrt(c / a);
+		var mgr_speed = u * scale;
+		var mgr_vz = a * u * u + b * u + c;
+
+		return {
+			min_sink_rate: [msr_speed, msr_vz, -msr_speed / (3.6 * msr_vz)],
+			max_glide_ratio: [mgr_speed, mgr_vz, -mgr_speed / (3.6 * mgr_vz)],
+		};
+	}
+
+	function wingLoadingAnnotations(polar, p, annotations) {
+		var m = metrics(polar, p);
+		var msr = m.min_sink_rate, mgr = m.max_glide_ratio;
+		var texts = {
+			'min-sink-rate': {x: msr[0], y: msr[1],
+				text: '<b>Min sink rate</b><br> speed: ' + pyRound(msr[0], 1) + 'km/h<br> Vz: ' + pyRound(msr[1], 2) + 'm/s<br>L/D: ' + pyRound(msr[2], 1)},
+			'max-glide-ratio': {x: mgr[0], y: mgr[1],
+				text: '<b>Max glide ratio</b><br> speed: ' + pyRound(mgr[0], 1) + 'km/h<br> Vz: ' + pyRound(mgr[1], 2) + 'm/s<br>L/D: ' + pyRound(mgr[2], 1)},
+			'polynomial': {text: 'Polynomial equation for the polar:<br> ' + polarToString(p)},
+		};
+		return annotations.map(function (annotation) {
+			return Object.assign({}, annotation, texts[annotation.name] || {});
+		});
+	}
+
+	function updateWingLoading(wing_loading, polar, figure) {
+		var no_update = root.dash_clientside ? root.dash_clientside.no_update : null;
+		if (wing_loading === null || wing_loading === undefined || !polar || !figure) {
+			return [no_update, no_update];
+		}
+
+		var wl = Math.round(wing_loading * 10) / 10;	// same rounding as the PolarCache key
+		var p = coefficientsAt(polar, wl);
+		var data = figure.data.slice();
+		wingLoadingTraces(polar, p, wl).forEach(function (trace, i) {
+			data[polar.offset + i] = Object.assign({}, data[polar.offset + i], trace);
+		});
+		var layout = Object.assign({}, figure.layout, {
+			annotations: wingLoadingAnnotations(polar, p, figure.layout.annotations || []),
+		});
+
+		return [Object.assign({}, figure, {data: data, layout: layout}), wing_loading + ' kg/m2'];
+	}
+
+	var wl_effect = {
+		update_wing_loading: updateWingLoading,
+		coefficients_at: coefficientsAt,
+		wing_loading_traces: wingLoadingTraces,
+		wing_loading_annotations: wingLoadingAnnotations,
+		metrics: metrics,
+	};
+
+	if (typeof module !== 'undefined' && module.exports) {
+		module.exports = wl_effect;
+	} else {
+		root.dash_clientside = Object.assign({}, root.dash_clientside, {wl_effect: wl_effect});
+	}
+})(typeof window !== 'undefined' ? window : this);
@@ -0,0 +1,83 @@
+# Fit cost and accuracy of the glider.fitting models against the quadratic, on the by-hand
+# polars of the DB. Accuracy is the rms error on the samples and the leave one out rms
+# error (each sample predicted by the model fitted on the others), which penalizes the
+# models that follow the noise of the samples.
+#
+# usage: python benchmarks/bench_by_hand_fit.py
+
+import os
+import sys
+import timeit
+import warnings
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+import glider.polar as gp
+from glider import fitting
+
+DB_FILE = os.path.join(ROOT, 'glider-polars-db.json')
+
+class QuadraticModel:
+	def __init__(self, x, y):
+		self.polynomial = np.poly1d(np.polyfit(x, y, 2))
+
+	def __call__(self, x):
+		return self.polynomial(x)
+
+MODELS = [
+	('quadratic', QuadraticModel, {}),
+	('polynomial 4', fitting.PolynomialModel, {'degree': 4}),
+	('polynomial 6', fitting.PolynomialModel, {'degree': 6}),
+	('spline', fitting.MonotoneSplineModel, {}),
+	('piecewise 3', fitting.PiecewiseQuadraticModel, {'pieces': 3}),
+	('piecewise 4', fitting.PiecewiseQuadraticModel, {'pieces': 4}),
+]
+
+def best_of(statement, number):
+	return min(timeit.repeat(statement, number=number, repeat=5)) / number
+
+def leave_one_out(model, x, y, options):
+	errors = []
+	# the ends are extrapolations for a spline, keep the inner samples only
+	for i in range(1, len(x) - 1):
+		keep = np.arange(len(x)) != i
+		errors.append(model(x[keep], y[keep], **options)(x[i]) - y[i])
+	return np.sqrt(np.mean(np.square(errors)))
+
+def main():
+	warnings.simplefilter('ignore')
+	db = gp.PolarsDB(DB_FILE)
+	speeds = np.linspace(gp.POLAR_CURVE_START_KM, gp.POLAR_CURVE_END_KM, 10000)
+
+	for label in db.findByMethod(['by-hand']):
+		name, source = label.split(' / ', 1)
+		entry = db.entryFromNameAndSource(name, source)
+		x, y = fitting.samples(entry['speed'], entry['sink_rate'])
+		print('{} ({} samples)'.format(label, len(x)))
+		print('{:<14} {:>10} {:>12} {:>10} {:>10} {:>16} {:>16}'.format(
+			'model', 'fit (us)', 'eval 10k (us)', 'rms (m/s)', 'loo (m/s)', 'min sink', 'max L/D'))
+
+		for model_name, model, options in MODELS:
+			fitted = model(x, y, **options)
+			fit_time = best_of(lambda: model(x, y, **options), 200)
+			eval_time = best_of(lambda: fitted(speeds), 200)
+			rms = np.sqrt(np.mean(np.square(fitted(x) - y)))
+
+			min_sink = gp.solvers.maximize(fitted, x[0], x[-1])
+			glide_ratio = lambda s: s / (-gp.KM_TO_MS * np.minimum(fitted(s), -1e-9))
+			max_ld = gp.solvers.maximize(glide_ratio, x[0], x[-1])
+			print('{:<14} {:>10.1f} {:>12.1f} {:>10.4f} {:>10.4f} {:>7.1f} {:>7.3f}  {:>7.1f} {:>7.2f}'.format(
+				model_name, fit_time * 1e6, eval_time * 1e6, rms, leave_one_out(model, x, y, options),
+				min_sink[0], min_sink[1], max_ld[0], max_ld[1]))
+
+		# what PolarCache pays for a new wing loading once the samples were fitted
+		build = best_of(lambda: gp.PolarGlider.factory(entry), 200)
+		optimize = best_of(lambda: gp.PolarGlider.factory(entry).get_max_glide_ratio(), 200) - build
+		print('PolarGliderByHand ({}): build with cached fit {:.1f} us, max glide ratio search {:.1f} us'.format(
+			gp.BY_HAND_MODEL, build * 1e6, optimize * 1e6))
+		print()
+
+if __name__ == '__main__':
+	sys.exit(main())
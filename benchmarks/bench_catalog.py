@@ -0,0 +1,66 @@
+# Load time and memory of PolarsDB for the json polars DB and the compiled catalog
+# (glider.catalog), for the real DB and synthetic catalogs made of copies of its entries.
+# Each measure runs in a fresh process.
+#
+# usage: python benchmarks/bench_catalog.py [size ...]
+
+import os
+import sys
+import tempfile
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+from glider import catalog
+
+DB_FILE = os.path.join(ROOT, 'glider-polars-db.json')
+SIZES = [10000, 100000]
+
+MEASURE = """
+import sys, time, warnings
+sys.path.insert(0, sys.argv[1])
+warnings.simplefilter('ignore')
+import glider.polar as gp
+
+def rss_kb():
+	with open('/proc/self/status') as f:
+		return next(int(l.split()[1]) for l in f if l.startswith('VmRSS'))
+
+rss = rss_kb()
+start = time.perf_counter()
+db = gp.PolarsDB(sys.argv[2])
+load = time.perf_counter() - start
+rss = rss_kb() - rss
+
+start = time.perf_counter()
+for label in db.findByMethod()[::max(1, len(db.polars_db) // 1000)]:
+	name, source = label.split(' / ', 1)
+	db.entryFromNameAndSource(name, source)
+print(load, rss, time.perf_counter() - start)
+"""
+
+def synthetic(entries, size):
+	return [dict(entries[i % len(entries)], source='{} #{}'.format(entries[i % len(entries)]['source'], i)) for i in range(size)]
+
+def measure(filename):
+	output = subprocess.run([sys.executable, '-c', MEASURE, ROOT, filename], capture_output=True, text=True, check=True)
+	load, rss, lookup = output.stdout.split()
+	return float(load), int(rss), float(lookup)
+
+def main(sizes):
+	entries = catalog.load_json(DB_FILE)
+	print('{:>8} {:>8} {:>10} {:>12} {:>10} {:>12}'.format('entries', 'format', 'file (KB)', 'load (ms)', 'RSS (MB)', 'lookups (ms)'))
+	with tempfile.TemporaryDirectory() as tmp:
+		for size in [len(entries)] + sizes:
+			db = entries if size == len(entries) else synthetic(entries, size)
+			json_file = os.path.join(tmp, 'db-{}.json'.format(size))
+			catalog_file = os.path.join(tmp, 'db-{}{}'.format(size, catalog.CATALOG_EXTENSION))
+			catalog.save_json(db, json_file)
+			catalog.compile_entries(db, catalog_file)
+
+			for fmt, filename in [('json', json_file), ('catalog', catalog_file)]:
+				load, rss, lookup = measure(filename)
+				print('{:>8} {:>8} {:>10.0f} {:>12.1f} {:>10.1f} {:>12.1f}'.format(size, fmt, os.path.getsize(filename) / 1024, load * 1e3, rss / 1024, lookup * 1e3))
+
+if __name__ == '__main__':
+	sys.exit(main([int(s) for s in sys.argv[1:]] or SIZES))
@@ -0,0 +1,102 @@
+# IGC replay pipeline (glider.igc) on synthetic flights: a glider alternating thermals and
+# straight glides whose sink rate is the polar of the DB times a known degradation factor.
+# Check that the factor is recovered, the throughput of the sequential and process pool
+# modes over a directory, and that the peak memory does not grow with the length of a log.
+#
+# usage: python benchmarks/bench_igc.py [number of files] [hours per flight]
+
+import os
+import sys
+import math
+import time
+import random
+import tempfile
+import tracemalloc
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+import glider.polar as gp
+from glider import igc
+
+DB_FILE = os.path.join(ROOT, 'glider-polars-db.json')
+GLIDER = ('Ventus 2c (18m)', 'XCSoar')
+DEGRADATION = 1.08
+FILES = 64
+HOURS = 3
+
+def b_record(t, lat, lon, alt):
+	t = int(t) % 86400
+	lat_min, lon_min = abs(lat) * 60, abs(lon) * 60
+	return 'B{:02d}{:02d}{:02d}{:02d}{:05d}{}{:03d}{:05d}{}A{:05d}{:05d}\n'.format(
+		t // 3600, t // 60 % 60, t % 60,
+		int(lat_min // 60), int(round(lat_min % 60 * 1000)), 'N' if lat >= 0 else 'S',
+		int(lon_min // 60), int(round(lon_min % 60 * 1000)), 'E' if lon >= 0 else 'W',
+		int(round(alt)), int(round(alt)))
+
+def write_flight(filename, polar, hours, seed):
+	# 1 Hz fixes, thermals circling at 18 deg/s then glides at a random speed and heading
+	rng = random.Random(seed)
+	t, lat, lon, alt, heading = 36000.0, 45.0, 6.0, 1500.0, 0.0
+	end = t + hours * 3600
+	with open(filename, 'w') as f:
+		f.write('AXXX001 synthetic\nHFDTE010726\n')
+		while t < end:
+			climbing = alt < 1200
+			if climbing:
+				speed, vario, turn, duration = 95, rng.uniform(1, 3), 18, rng.randint(300, 600)
+			else:
+				speed = rng.uniform(80, 180)
+				vario, turn, duration = DEGRADATION * float(polar.curve(speed)), 0, rng.randint(300, 900)
+				heading = rng.uniform(0, 360)
+			for _ in range(duration):
+				heading += turn
+				distance = speed / gp.KM_TO_MS
+				lat += distance * math.cos(math.radians(heading)) / igc.EARTH_RADIUS * 180 / math.pi
+				lon += distance * math.sin(math.radians(heading)) / (igc.EARTH_RADIUS * math.cos(math.radians(lat))) * 180 / math.pi
+				alt += vario + rng.gauss(0, 0.3)
+				t += 1
+				f.write(b_record(t, lat, lon, alt))
+				if climbing and alt > 2500:
+					break
+
+def peak_memory(filename, polar):
+	tracemalloc.start()
+	igc.fit_flight(filename, polar)
+	peak = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+	return peak
+
+def main(files, hours):
+	db = gp.PolarsDB(DB_FILE)
+	entry = db.entryFromNameAndSource(*GLIDER)
+	polar = gp.PolarGlider.factory(entry)
+
+	with tempfile.TemporaryDirectory() as tmp:
+		start = time.perf_counter()
+		for i in range(files):
+			write_flight(os.path.join(tmp, 'flight-{:04d}.igc'.format(i)), polar, hours, i)
+		size = sum(os.path.getsize(os.path.join(tmp, f)) for f in os.listdir(tmp))
+		print('{} synthetic flights of {} h, {:.1f} MB, written in {:.1f} s'.format(files, hours, size / 2**20, time.perf_counter() - start))
+
+		for workers in [1, None]:
+			start = time.perf_counter()
+			fit, per_file = igc.fit_directory(tmp, entry, workers=workers)
+			elapsed = time.perf_counter() - start
+			r = fit.result()
+			print('workers={:<4} {:>7.2f} s {:>8.1f} MB/s  glides {:>6}  factor {:.3f} (expected {:.3f})  rms {:.2f} m/s'.format(
+				str(workers or os.cpu_count()), elapsed, size / 2**20 / elapsed, r['glides'], r['factor'], DEGRADATION, r['rms']))
+			if abs(r['factor'] - DEGRADATION) > 0.02:
+				print('FAILED, degradation factor not recovered')
+				return 1
+
+		# bounded by the window of straight_glides() and the chunks of fit_flight()
+		peaks = []
+		for log_hours in [1, 10, 30]:
+			filename = os.path.join(tmp, 'long-{}.igc'.format(log_hours))
+			write_flight(filename, polar, log_hours, 0)
+			peaks.append('{} h log {:.1f} KB'.format(log_hours, peak_memory(filename, polar) / 1024))
+		print('peak memory: {}'.format(', '.join(peaks)))
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main(*[float(a) if i else int(a) for i, a in enumerate(sys.argv[1:])] or [FILES, HOURS]))
@@ -0,0 +1,125 @@
+# Memory and per call cost of the polars of the whole catalog, PolarGlider (the classes
+# built by PolarGlider.factory()) against PolarRecord (the immutable records kept by the
+# PolarCache). Memory is what the polars of the catalog retain, measured with tracemalloc,
+# at the reference wing loading then with the metrics computed and with one more wing
+# loading per glider. Times are per polar, averaged over the catalog, best of 5 runs.
+#
+# usage: python benchmarks/bench_polar_record.py [--db glider-polars-db.json]
+
+import os
+import gc
+import sys
+import time
+import argparse
+import warnings
+import tracemalloc
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+import glider.polar as gp
+
+DB_FILE = os.path.join(ROOT, 'glider-polars-db.json')
+RUNS = 5
+WING_LOADING_FACTOR = 1.2			# the other wing loading of the memory and wing loading tests
+
+def retained(build):
+	# (objects, bytes) still allocated once build() returned
+	gc.collect()
+	tracemalloc.start()
+	before = tracemalloc.get_traced_memory()[0]
+	objects = build()
+	gc.collect()
+	size = tracemalloc.get_traced_memory()[0] - before
+	tracemalloc.stop()
+	return objects, size
+
+def metrics(polars):
+	for polar in polars:
+		polar.get_min_sink_rate()
+		polar.get_max_glide_ratio()
+		polar.tangent_horizontal(0)
+		polar.tangent_at_origin(0)
+	return polars
+
+def per_call(function, items):
+	# us per polar of function(item), best of RUNS passes over the catalog
+	best = float('inf')
+	for _ in range(RUNS):
+		start = time.perf_counter()
+		for item in items:
+			function(item)
+		best = min(best, time.perf_counter() - start)
+	return best / len(items) * 1e6
+
+def with_wing_loading(polar):
+	polar.update_wing_loading(polar.init_wing_loading * WING_LOADING_FACTOR)
+	return polar
+
+def main(argv):
+	parser = argparse.ArgumentParser(prog='python benchmarks/bench_polar_record.py', description='PolarGlider against PolarRecord over the catalog.')
+	parser.add_argument('--db', default=DB_FILE, help='polars DB (json or compiled catalog)')
+	args = parser.parse_args(argv)
+
+	warnings.simplefilter('ignore')
+	entries = []
+	for entry in gp.PolarsDB(args.db).polars_db:
+		try:
+			gp.PolarGlider.factory(entry)
+			entries.append(entry)
+		except Exception:
+			pass
+	x = np.linspace(gp.POLAR_CURVE_START_KM, gp.POLAR_CURVE_END_KM, gp.POLAR_CURVE_NBR_SAMPLE)
+	n = len(entries)
+	print('{} polars'.format(n))
+	print()
+
+	# memory
+	polars, polars_size = retained(lambda: [gp.PolarGlider.factory(e) for e in entries])
+	records, records_size = retained(lambda: [gp.PolarRecord.from_entry(e) for e in entries])
+	_, polars_metrics = retained(lambda: metrics(polars))
+	_, records_metrics = retained(lambda: metrics(records))
+	# one more wing loading: a new fitted polar for PolarGlider, a new record for PolarRecord
+	_, polars_wl = retained(lambda: [with_wing_loading(gp.PolarGlider.factory(e)) for e in entries])
+	_, records_wl = retained(lambda: [r.at_wing_loading(r.init_wing_loading * WING_LOADING_FACTOR) for r in records])
+	print('{:<36} {:>14} {:>14}'.format('memory per polar (bytes)', 'PolarGlider', 'PolarRecord'))
+	for label, a, b in [
+			('reference wing loading', polars_size, records_size),
+			('+ metrics and tangents computed', polars_metrics, records_metrics),
+			('+ one other wing loading', polars_wl, records_wl)]:
+		print('{:<36} {:>14.0f} {:>14.0f}'.format(label, a / n, b / n))
+	print()
+
+	# per call
+	polars = [gp.PolarGlider.factory(e) for e in entries]
+	records = [gp.PolarRecord.from_entry(e) for e in entries]
+	wing_loading = lambda polar: polar.init_wing_loading * WING_LOADING_FACTOR
+	cases = [
+		('curve ({} speeds)'.format(len(x)), lambda p: p.curve(x), lambda r: r.curve(x)),
+		('get_min_sink_rate', lambda p: p.get_min_sink_rate(), lambda r: r.get_min_sink_rate()),
+		('get_max_glide_ratio', lambda p: p.get_max_glide_ratio(), lambda r: r.get_max_glide_ratio()),
+		('tangent_at_origin', lambda p: p.tangent_at_origin(gp.POLAR_CURVE_END_KM), lambda r: r.tangent_at_origin(gp.POLAR_CURVE_END_KM)),
+		('new wing loading', lambda p: p.update_wing_loading(wing_loading(p)), lambda r: r.at_wing_loading(wing_loading(r))),
+	]
+	print('{:<36} {:>14} {:>14}'.format('per call (us)', 'PolarGlider', 'PolarRecord'))
+	for label, polar_call, record_call in cases:
+		print('{:<36} {:>14.2f} {:>14.2f}'.format(label, per_call(polar_call, polars), per_call(record_call, records)))
+	# a PolarCache miss at a wing loading: a new fitted polar before, a new record of the
+	# cached reference one now
+	print('{:<36} {:>14.2f} {:>14.2f}'.format('cache miss at a wing loading',
+		per_call(lambda e: with_wing_loading(gp.PolarGlider.factory(e)), entries), per_call(lambda r: r.at_wing_loading(wing_loading(r)), records)))
+
+	# first call of the metrics on new records, what the cached values save
+	first = float('inf')
+	for _ in range(RUNS):
+		new_records = [r.at_wing_loading(r.wing_loading) for r in records]
+		start = time.perf_counter()
+		metrics(new_records)
+		first = min(first, time.perf_counter() - start)
+	print('{:<36} {:>14} {:>14.2f}'.format('metrics and tangents, first call', '', first / n * 1e6))
+	print('{:<36} {:>14.2f} {:>14.2f}'.format('metrics and tangents, next calls', per_call(lambda p: metrics([p]), polars), per_call(lambda r: metrics([r]), records)))
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,70 @@
+# Startup time of the Dash app: import of app.py measured with python -X importtime in a new
+# interpreter, best of several runs. Exits with 1 when the import takes more than the budget
+# or when one of the modules that must stay out of the startup path is imported (they are
+# imported on first use, by the command line tools or the benchmarks).
+#
+# usage:
+#	python benchmarks/bench_startup.py
+#	python benchmarks/bench_startup.py --budget 800 --preload		# with the polars DB loaded at import
+
+import os
+import re
+import sys
+import argparse
+import subprocess
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+BUDGET = 1200			# ms
+RUNS = 5
+DEFERRED = ['pandas', 'scipy', 'plotly.express', 'glider.fleet']
+IMPORT_TIME = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+def import_times(preload):
+	# [(module, self us, cumulative us, depth)] of one import of app.py
+	env = dict(os.environ, PRELOAD_POLARS_DB='1' if preload else '')
+	result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'], cwd=ROOT, env=env, capture_output=True, text=True)
+	if result.returncode != 0:
+		raise Exception('import app failed:\n{}'.format(result.stderr))
+	modules = []
+	for line in result.stderr.splitlines():
+		match = IMPORT_TIME.match(line)
+		if match:
+			modules.append((match.group(4), int(match.group(1)), int(match.group(2)), len(match.group(3)) // 2))
+	return modules
+
+def main(argv):
+	parser = argparse.ArgumentParser(prog='python benchmarks/bench_startup.py', description='Import time of app.py against a budget.')
+	parser.add_argument('--budget', type=float, default=BUDGET, help='max import time of app.py in ms (default: {})'.format(BUDGET))
+	parser.add_argument('--runs', type=int, default=RUNS, help='number of imports, the best one is kept')
+	parser.add_argument('--preload', action='store_true', help='load the polars DB at import (PRELOAD_POLARS_DB)')
+	parser.add_argument('--top', type=int, default=10, help='number of modules listed')
+	args = parser.parse_args(argv)
+
+	runs = [import_times(args.preload) for _ in range(args.runs)]
+	best = min(runs, key=lambda modules: modules[-1][2])
+	total = best[-1][2] / 1000
+
+	print('{:<40} {:>12}'.format('direct imports of app.py', 'cumul (ms)'))
+	for name, _, cumulative, depth in sorted((m for m in best if m[3] == 1), key=lambda m: -m[2])[:args.top]:
+		print('{:<40} {:>12.1f}'.format(name, cumulative / 1000))
+	print()
+	print('{:<40} {:>12}'.format('slowest modules', 'self (ms)'))
+	for name, self_time, _, _ in sorted(best, key=lambda m: -m[1])[:args.top]:
+		print('{:<40} {:>12.1f}'.format(name, self_time / 1000))
+	print()
+
+	status = 0
+	imported = {m[0] for m in best}
+	for name in DEFERRED:
+		if name in imported:
+			print('{} is imported at startup'.format(name), file=sys.stderr)
+			status = 1
+	print('import app: {:.1f} ms (best of {}), budget {:.0f} ms'.format(total, args.runs, args.budget))
+	if total > args.budget:
+		print('over budget by {:.1f} ms'.format(total - args.budget), file=sys.stderr)
+		status = 1
+	return status
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv[1:]))
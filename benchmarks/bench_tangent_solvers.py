@@ -0,0 +1,135 @@
+# Compare the closed-form tangent solvers of glider.polar with the former scipy
+# fsolve implementation over every entry of the polars DB.
+#
+# usage: python benchmarks/bench_tangent_solvers.py [path/to/glider-polars-db.json]
+
+import os
+import sys
+import json
+import timeit
+
+import numpy as np
+from scipy.optimize import fsolve
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import glider.polar as gp
+from glider import solvers
+
+DB_FILE = os.path.join(os.path.dirname(__file__), '..', 'glider-polars-db.json')
+# fsolve converges on the double roots of a tangent only up to about sqrt(machine epsilon)
+TOLERANCE = 1e-2
+REPEAT = 3
+
+def line_intersections(a, b, c, slope, intercept):
+	# real roots of a*x^2 + b*x + c = slope*x + intercept, in increasing order.
+	# A tangent line gives a double root, tiny negative discriminants from
+	# rounding are therefore clamped to zero.
+	bb = b - slope
+	cc = c - intercept
+	delta = bb * bb - 4 * a * cc
+	if delta < 0:
+		if delta < -1e-9 * max(bb * bb, abs(4 * a * cc), 1.0):
+			return np.array([])
+		delta = 0.0
+	sq = np.sqrt(delta)
+	return np.unique(np.sort([(-bb - sq) / (2 * a), (-bb + sq) / (2 * a)]))
+
+# the fsolve based implementation, as it was in PolarGlider before the analytic solvers
+def fsolve_tangent_horizontal(polar, tg_x):
+	a, b, c = polar.polynomial.coefficients
+	f = lambda x: a*np.power(x,2) + b*x + c
+	df = lambda x: 2*a*x + b
+
+	def tangent(f, fprime, x):
+		roots = fsolve(lambda x: fprime(x), x)
+		return f(roots) - fprime(roots) * (x - roots)
+
+	tgh_y = tangent(f, df, tg_x)
+	x_int = fsolve(lambda x: tangent(f,df,x) - f(x), 100)
+	return tgh_y, x_int, f(x_int)
+
+def fsolve_tangent_at_origin(polar, tg_x):
+	a, b, c = polar.polynomial.coefficients
+	f = lambda x: a*np.power(x,2) + b*x + c
+	df = lambda x: 2*a*x + b
+
+	def tangent(f, fprime, x):
+		roots = fsolve(lambda u: f(u) - fprime(u)*u, (100,))
+		return fprime(roots)*x
+
+	tgao_y = tangent(f, df, tg_x)
+	x_int = fsolve(lambda x: tangent(f,df,x) - f(x), 100)
+	return tgao_y, x_int, f(x_int)
+
+def speed_scale(polar):
+	return 100 if isinstance(polar, gp.PolarGliderABC) else 1
+
+def run_fsolve(polar, tg_x):
+	scale = speed_scale(polar)
+	tgh = fsolve_tangent_horizontal(polar, np.divide(tg_x, scale))
+	tgao = fsolve_tangent_at_origin(polar, np.divide(tg_x, scale))
+	return (tgh[0], tgh[1]*scale, tgh[2]), (tgao[0], tgao[1]*scale, tgao[2])
+
+def run_analytic(polar, tg_x):
+	return polar.tangent_horizontal(tg_x), polar.tangent_at_origin(tg_x)
+
+def max_error(ref, res):
+	return max(np.max(np.abs(np.asarray(r, dtype=float) - np.asarray(v, dtype=float))) for r, v in zip(ref, res))
+
+def main(db_file):
+	with open(db_file) as f:
+		entries = [e for e in json.load(f) if e['method'] in ['ABC', '3-points']]
+
+	tg_x = np.arange(0,250)
+	polars = []
+	for entry in entries:
+		try:
+			polars.append(gp.PolarGlider.factory(entry))
+		except Exception as e:
+			print('Skip {} / {} => {}'.format(entry['name'], entry['source'], e))
+
+	worst = 0.0
+	mismatches = []
+	degenerated = []
+	for polar in polars:
+		# polars with no real tangent through the origin (c/a < 0) are not comparable
+		a, b, c = polar.polynomial.coefficients
+		if c / a < 0:
+			degenerated.append(polar)
+			continue
+
+		ref = run_fsolve(polar, tg_x)
+		res = run_analytic(polar, tg_x)
+
+		# the tangent lines must touch the polar at the returned point only
+		x_v, y_v = solvers.vertex(a, b, c)
+		u, _, slope = solvers.tangent_through_origin(a, b, c)
+		for x_touch, roots in [(x_v, line_intersections(a, b, c, 0, y_v)), (u, line_intersections(a, b, c, slope, 0))]:
+			if len(roots) == 0 or not np.allclose(roots, x_touch, rtol=1e-6):
+				mismatches.append((polar.name, polar.source, float('nan')))
+
+		err = max(max_error(r, v) for r, v in zip(ref, res))
+		worst = max(worst, err)
+		if err > TOLERANCE:
+			mismatches.append((polar.name, polar.source, err))
+
+	polars = [p for p in polars if p not in degenerated]
+	t_fsolve = min(timeit.repeat(lambda: [run_fsolve(p, tg_x) for p in polars], number=1, repeat=REPEAT))
+	t_analytic = min(timeit.repeat(lambda: [run_analytic(p, tg_x) for p in polars], number=1, repeat=REPEAT))
+
+	print('Polars compared       : {}'.format(len(polars)))
+	print('Max absolute error    : {:.3g}'.format(worst))
+	print('Degenerated polars    : {}'.format(len(degenerated)))
+	for polar in degenerated:
+		print('    {} / {}'.format(polar.name, polar.source))
+	print('Above tolerance ({:g}) : {}'.format(TOLERANCE, len(mismatches)))
+	for name, source, err in mismatches:
+		print('    {} / {} => {:.3g}'.format(name, source, err))
+	print('fsolve   : {:8.2f} ms for the whole DB, {:6.1f} us per polar'.format(t_fsolve * 1e3, t_fsolve * 1e6 / len(polars)))
+	print('analytic : {:8.2f} ms for the whole DB, {:6.1f} us per polar'.format(t_analytic * 1e3, t_analytic * 1e6 / len(polars)))
+	print('speedup  : x{:.1f}'.format(t_fsolve / t_analytic))
+
+	return 1 if mismatches else 0
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv[1] if len(sys.argv) > 1 else DB_FILE))
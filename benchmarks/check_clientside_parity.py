@@ -0,0 +1,109 @@
+# Check that assets/wl_effect.js (clientside wing loading mode) gives the same traces and
+# annotations as ui/wl_effect.py for every polar of the DB over the wing loading slider range.
+# Needs node.js to run the javascript. tests/test_clientside_parity.py runs the same check.
+#
+# usage: python benchmarks/check_clientside_parity.py [path/to/glider-polars-db.json]
+
+import os
+import sys
+import json
+import subprocess
+import warnings
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+import glider.polar as gp
+import ui.wl_effect as wl
+
+DB_FILE = os.path.join(ROOT, 'glider-polars-db.json')
+JS_FILE = os.path.join(ROOT, 'assets', 'wl_effect.js')
+WING_LOADINGS = [30, 33.3, 36.6, 40, 42.5, 47.1, 52]
+RTOL = 1e-9
+
+# reads a json list of cases on stdin, writes the json list of results of run(wl_effect, case)
+NODE_DRIVER = """
+const wl_effect = require(process.argv[1]);
+const run = eval(process.argv[2]);
+let input = '';
+process.stdin.on('data', chunk => input += chunk);
+process.stdin.on('end', () => process.stdout.write(JSON.stringify(JSON.parse(input).map(c => run(wl_effect, c)))));
+"""
+UPDATE_WING_LOADING = """(wl_effect, c) => {
+	const [figure, label] = wl_effect.update_wing_loading(c.wing_loading, c.polar, c.figure);
+	return {traces: figure.data.slice(c.polar.offset), annotations: figure.layout.annotations, label: label};
+}"""
+
+def to_json(obj):
+	# numpy values to plain JSON, NaN to null like the Dash serializer does
+	text = json.dumps(obj, default=lambda o: o.tolist() if hasattr(o, 'tolist') else float(o))
+	return json.dumps(json.loads(text, parse_constant=lambda c: None))
+
+def same_numbers(expected, actual):
+	expected = np.asarray(expected, dtype=float)
+	actual = np.asarray([np.nan if v is None else v for v in actual], dtype=float)
+	return expected.shape == actual.shape and np.allclose(expected, actual, rtol=RTOL, atol=1e-12, equal_nan=True)
+
+def run_node(function, cases):
+	# results of the javascript function (wl_effect, case) => result for each case
+	output = subprocess.run(['node', '-e', NODE_DRIVER, JS_FILE, function], input=to_json(cases), capture_output=True, text=True)
+	if output.returncode != 0:
+		raise Exception('node failed:\n{}'.format(output.stderr))
+	return json.loads(output.stdout)
+
+def parity_failures(polars_db, methods = wl.WL_EFFECT_METHODS, wing_loadings = WING_LOADINGS):
+	# (number of cases, [(label, wing loading, errors)]) of the polars of methods, the
+	# javascript against the server side wing loading mode
+	cases = []
+	expected = []
+	for label in polars_db.findByMethod(methods):
+		name, source = label.split(' / ', 1)
+		reference = polars_db.cachedPolar(name, source)
+		figure = wl.static_figure(name, source)
+		store = wl.wing_loading_store(figure, reference)
+		placeholder = dict(data=[{}] * (store['offset'] + 5), layout=dict(annotations=wl.wing_loading_annotations(reference)))
+
+		for wing_loading in wing_loadings:
+			polar = polars_db.cachedPolar(name, source, wing_loading)
+			cases.append(dict(wing_loading=wing_loading, polar=store, figure=placeholder))
+			expected.append((label, wing_loading, wl.wing_loading_traces(polar), wl.wing_loading_annotations(polar)))
+
+	results = run_node(UPDATE_WING_LOADING, cases)
+
+	failures = []
+	for (label, wing_loading, traces, annotations), result in zip(expected, results):
+		errors = []
+		for trace, js_trace in zip(traces, result['traces']):
+			if trace['name'] != js_trace['name']:
+				errors.append('name {!r} != {!r}'.format(trace['name'], js_trace['name']))
+			for key in ('x', 'y'):
+				if not same_numbers(trace[key], js_trace[key]):
+					errors.append('{} of {}'.format(key, trace['name']))
+		for annotation, js_annotation in zip(annotations, result['annotations']):
+			if annotation['text'] != js_annotation['text']:
+				errors.append('text {!r} != {!r}'.format(annotation['text'], js_annotation['text']))
+			if 'x' in annotation and not same_numbers([annotation['x'], annotation['y']], [js_annotation['x'], js_annotation['y']]):
+				errors.append('position of {}'.format(annotation['name']))
+		if result['label'] != '{} kg/m2'.format(wing_loading):
+			errors.append('label {!r}'.format(result['label']))
+		if errors:
+			failures.append((label, wing_loading, errors))
+	return len(expected), failures
+
+def main(db_file):
+	try:
+		checked, failures = parity_failures(gp.PolarsDB.get_instance(db_file))
+	except Exception as e:
+		print(e)
+		return 1
+
+	print('Cases checked : {}'.format(checked))
+	print('Failures      : {}'.format(len(failures)))
+	for label, wing_loading, errors in failures:
+		print('    {} at {} kg/m2 => {}'.format(label, wing_loading, '; '.join(errors)))
+	return 1 if failures else 0
+
+if __name__ == '__main__':
+	warnings.simplefilter('ignore')
+	sys.exit(main(sys.argv[1] if len(sys.argv) > 1 else DB_FILE))
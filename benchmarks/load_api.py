@@ -0,0 +1,175 @@
+# Load test of the JSON/HTTP API (ui/api.py): concurrent clients post batches of queries
+# for a fixed duration, then the sustained throughput (requests and queries per second) and
+# the latency percentiles are reported. Without --url the app is started in a child
+# process (threaded werkzeug server), so that the clients do not share its GIL.
+#
+# A fraction of the batches (--repeat) are taken from a small pool of batches already sent,
+# to measure the server with its response cache: 0 means every batch is new.
+#
+# usage:
+#	python benchmarks/load_api.py --duration 10 --concurrency 8 --batch 50
+#	python benchmarks/load_api.py --url http://127.0.0.1:8050 --repeat 0.5
+
+import os
+import sys
+import json
+import time
+import random
+import socket
+import argparse
+import threading
+import subprocess
+import http.client
+import urllib.parse
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+DURATION = 10			# seconds
+WARMUP = 1				# seconds, not measured
+CONCURRENCY = 8
+BATCH = 50				# queries per request
+SPEEDS = 10				# speeds per query
+REPEAT = 0.0			# fraction of the batches already sent
+REPEAT_POOL = 32
+
+def serve(port):
+	# child process: the app on a threaded werkzeug server
+	import warnings
+	from werkzeug.serving import make_server
+	warnings.simplefilter('ignore')
+	os.chdir(ROOT)
+	import app
+	make_server('127.0.0.1', port, app.server, threaded=True).serve_forever()
+
+def free_port():
+	with socket.socket() as s:
+		s.bind(('127.0.0.1', 0))
+		return s.getsockname()[1]
+
+def wait_for(url, timeout = 60):
+	parsed = urllib.parse.urlparse(url)
+	end = time.time() + timeout
+	while time.time() < end:
+		try:
+			connection = http.client.HTTPConnection(parsed.hostname, parsed.port, timeout=5)
+			connection.request('GET', '/api/v1/gliders?limit=1')
+			if connection.getresponse().status == 200:
+				return
+		except OSError:
+			time.sleep(0.2)
+	raise Exception('No answer from {} after {} s'.format(url, timeout))
+
+def gliders(url):
+	parsed = urllib.parse.urlparse(url)
+	connection = http.client.HTTPConnection(parsed.hostname, parsed.port)
+	connection.request('GET', '/api/v1/gliders?limit=50')
+	ids = [g['id'] for g in json.loads(connection.getresponse().read())['gliders']]
+	for query in ['a', 'e', 'i', 'o', 's']:
+		connection.request('GET', '/api/v1/gliders?limit=50&q=' + query)
+		ids += [g['id'] for g in json.loads(connection.getresponse().read())['gliders']]
+	return sorted(set(ids))
+
+def random_batch(rng, ids, size, speeds):
+	return json.dumps({'queries': [{
+		'glider': rng.choice(ids),
+		'wing_loading': round(rng.uniform(28, 55), 1),
+		'speeds': sorted(round(rng.uniform(60, 220)) for _ in range(speeds)),
+	} for _ in range(size)]}).encode('utf-8')
+
+class Client(threading.Thread):
+	def __init__(self, url, ids, args, seed, start_at, stop_at):
+		threading.Thread.__init__(self, daemon=True)
+		self.url = urllib.parse.urlparse(url)
+		self.ids = ids
+		self.args = args
+		self.rng = random.Random(seed)
+		self.start_at = start_at
+		self.stop_at = stop_at
+		self.latencies = []
+		self.errors = 0
+		self.pool = []
+
+	def batch(self):
+		if self.pool and self.rng.random() < self.args.repeat:
+			return self.rng.choice(self.pool)
+		body = random_batch(self.rng, self.ids, self.args.batch, self.args.speeds)
+		if len(self.pool) < REPEAT_POOL:
+			self.pool.append(body)
+		return body
+
+	def run(self):
+		connection = http.client.HTTPConnection(self.url.hostname, self.url.port)
+		headers = {'Content-Type': 'application/json'}
+		while True:
+			body = self.batch()
+			start = time.perf_counter()
+			if start >= self.stop_at:
+				break
+			try:
+				connection.request('POST', '/api/v1/polars', body, headers)
+				response = connection.getresponse()
+				response.read()
+				ok = response.status == 200
+			except (OSError, http.client.HTTPException):
+				connection.close()
+				connection = http.client.HTTPConnection(self.url.hostname, self.url.port)
+				ok = False
+			end = time.perf_counter()
+			if start >= self.start_at:
+				if ok:
+					self.latencies.append(end - start)
+				else:
+					self.errors += 1
+
+def percentile(values, p):
+	values = sorted(values)
+	return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))] if values else float('nan')
+
+def main(argv):
+	parser = argparse.ArgumentParser(prog='python benchmarks/load_api.py', description='Throughput and latency of the polars API.')
+	parser.add_argument('--url', help='base url of a running app (default: start one)')
+	parser.add_argument('--duration', type=float, default=DURATION, help='seconds measured, after {} s of warmup'.format(WARMUP))
+	parser.add_argument('--concurrency', type=int, default=CONCURRENCY, help='number of clients')
+	parser.add_argument('--batch', type=int, default=BATCH, help='queries per request')
+	parser.add_argument('--speeds', type=int, default=SPEEDS, help='speeds per query')
+	parser.add_argument('--repeat', type=float, default=REPEAT, help='fraction of the batches already sent (0 to 1)')
+	parser.add_argument('--serve', type=int, help=argparse.SUPPRESS)
+	args = parser.parse_args(argv)
+
+	if args.serve:
+		return serve(args.serve)
+
+	server = None
+	url = args.url
+	if url is None:
+		port = free_port()
+		url = 'http://127.0.0.1:{}'.format(port)
+		server = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', str(port)], stderr=subprocess.DEVNULL)
+	try:
+		wait_for(url)
+		ids = gliders(url)
+		start_at = time.perf_counter() + WARMUP
+		stop_at = start_at + args.duration
+		clients = [Client(url, ids, args, seed, start_at, stop_at) for seed in range(args.concurrency)]
+		for client in clients:
+			client.start()
+		for client in clients:
+			client.join()
+	finally:
+		if server is not None:
+			server.terminate()
+			server.wait()
+
+	latencies = [l for client in clients for l in client.latencies]
+	errors = sum(client.errors for client in clients)
+	print('{} clients, {} queries x {} speeds per request, {:.0%} repeated batches, {:.0f} s'.format(
+		args.concurrency, args.batch, args.speeds, args.repeat, args.duration))
+	print('requests   : {} ({} errors)'.format(len(latencies), errors))
+	print('throughput : {:.1f} requests/s, {:.0f} queries/s'.format(len(latencies) / args.duration, len(latencies) * args.batch / args.duration))
+	print('latency    : p50 {:.1f} ms, p90 {:.1f} ms, p99 {:.1f} ms, max {:.1f} ms'.format(
+		*(percentile(latencies, p) * 1000 for p in (50, 90, 99, 100))))
+	return 1 if errors > 0 or len(latencies) == 0 else 0
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,418 @@
+# Benchmark suite of the hot paths: glider.polar (polars, PolarsDB load and lookups on
+# synthetic catalogs of 1k, 10k and 100k polars) and the Dash figure builders, end to end
+# up to the json sent to the browser. Results are written as json so that a run can be
+# compared to a baseline, a case slower than the baseline by more than the tolerance is a
+# regression and the exit status is then 1 (to run before a deployment).
+#
+# usage:
+#	python benchmarks/suite.py --output results.json				# run all the cases
+#	python benchmarks/suite.py --filter dash --compare results.json	# check against a baseline
+#	python benchmarks/suite.py --filter db.load --profile prof/		# cProfile stats per case
+#	python benchmarks/suite.py --list
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import timeit
+import cProfile
+import platform
+import argparse
+import tempfile
+import warnings
+import statistics
+import subprocess
+from contextvars import copy_context
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+import numpy as np
+import dash
+import plotly
+import plotly.io
+from dash._callback_context import context_value
+from dash._utils import AttributeDict
+
+import glider.polar as gp
+from glider import catalog
+from bench_catalog import synthetic
+
+DB_FILE = os.path.join(ROOT, 'glider-polars-db.json')
+SIZES = [1000, 10000, 100000]
+REFERENCE_POLARS = {
+	'3-points': ('LAK19-18m', 'Manual'),
+	'ABC': ('Ventus2-15m', "Sandro's Polar - Ref #2"),
+	'by-hand': ('Ventus2-15m', "Sandro's Polar - Ref #1"),
+}
+COMPARE_GLIDERS = ['LAK19-18m / Manual', 'Pegase 101A / Seeyou-1', 'Ventus2-15m / Sandro\'s Polar - Ref #2', 'LS 4 / XCVario']
+LOOKUPS = 1000
+API_QUERIES = 50					# queries per batch of the api cases
+UNCERTAINTY_SAMPLES = [10000, 100000, 1000000]
+SEARCHES = ['l', 'ls', 'ls 4', 'ventus 2c', 'discus', 'xcvario', 'ask21']
+TOLERANCE = 0.25
+
+CASES = []
+
+def case(name, **params):
+	# register a case: the decorated function does the setup and returns the callable to time
+	def register(setup):
+		CASES.append((name, params, setup))
+		return setup
+	return register
+
+def case_id(name, params):
+	return name + ''.join('[{}={}]'.format(k, v) for k, v in params.items())
+
+class Environment:
+	# data shared by the cases, the synthetic catalogs are only written when a case needs them
+	def __init__(self, tmp):
+		self.tmp = tmp
+		self.entries = catalog.load_json(DB_FILE)
+		self.files = {}
+		self.dbs = {}
+
+	def db_file(self, fmt, size):
+		key = (fmt, size)
+		if key not in self.files:
+			entries = synthetic(self.entries, size)
+			filename = os.path.join(self.tmp, 'db-{}.{}'.format(size, 'json' if fmt == 'json' else catalog.CATALOG_EXTENSION[1:]))
+			if fmt == 'json':
+				catalog.save_json(entries, filename)
+			else:
+				catalog.compile_entries(entries, filename)
+			self.files[key] = filename
+		return self.files[key]
+
+	def db(self, fmt, size):
+		key = (fmt, size)
+		if key not in self.dbs:
+			self.dbs[key] = gp.PolarsDB(self.db_file(fmt, size))
+		return self.dbs[key]
+
+def reference_entry(method):
+	return gp.PolarsDB.get_instance(DB_FILE).entryFromNameAndSource(*REFERENCE_POLARS[method])
+
+def in_callback(triggered_id, func, *args):
+	# run a callback function as Dash does, ctx.triggered_id being triggered_id
+	def run():
+		context_value.set(AttributeDict(triggered_inputs=[{'prop_id': '{}.value'.format(triggered_id), 'value': None}]))
+		return func(*args)
+	return copy_context().run(run)
+
+def to_json(response):
+	# what Dash serializes for the browser
+	if isinstance(response, (list, tuple)):
+		response = [r.to_plotly_json() if isinstance(r, dash.Patch) else r for r in response]
+	return plotly.io.json.to_json_plotly(response)
+
+def clear_caches():
+	import ui.wl_effect
+	import ui.polar_compare
+	import ui.xc_speed
+	import ui.fleet_ranking
+	import ui.uncertainty
+	gp.PolarsDB.get_instance().polar_cache.clear()
+	ui.wl_effect._static_figure.cache_clear()
+	ui.polar_compare.compare_trace.cache_clear()
+	ui.xc_speed.task_speed_engine.clear()
+	ui.xc_speed.maccready_engine.clear()
+	ui.fleet_ranking.fleet_ranking.clear()
+	ui.uncertainty.uncertainty_traces.cache_clear()
+
+# glider.polar
+
+for method in REFERENCE_POLARS:
+	@case('polar.factory', method=method)
+	def _(env, method=method):
+		entry = reference_entry(method)
+		return lambda: gp.PolarGlider.factory(entry)
+
+	@case('polar.curve', method=method)
+	def _(env, method=method):
+		polar = gp.PolarGlider.factory(reference_entry(method))
+		x = np.linspace(gp.POLAR_CURVE_START, gp.POLAR_CURVE_END, gp.POLAR_CURVE_NBR_SAMPLE)
+		return lambda: polar.curve(x)
+
+	@case('polar.update_wing_loading', method=method)
+	def _(env, method=method):
+		polar = gp.PolarGlider.factory(reference_entry(method))
+		wing_loading = polar.wing_loading + 5
+		return lambda: polar.update_wing_loading(wing_loading)
+
+	for function in ['tangent_horizontal', 'tangent_at_origin']:
+		@case('polar.' + function, method=method)
+		def _(env, method=method, function=function):
+			polar = gp.PolarGlider.factory(reference_entry(method))
+			x = np.array([0, 249])
+			return lambda: getattr(polar, function)(x)
+
+	@case('polar.get_max_glide_ratio', method=method)
+	def _(env, method=method):
+		polar = gp.PolarGlider.factory(reference_entry(method))
+		return polar.get_max_glide_ratio
+
+	@case('xcspeed.grid', method=method)
+	def _(env, method=method):
+		from glider.xcspeed import TaskSpeedGrid
+		polar = gp.PolarGlider.factory(reference_entry(method))
+		return lambda: TaskSpeedGrid(polar)
+
+	for interpolate in [None, True, False]:
+		@case('maccready.speed_to_fly', method=method, interpolate=interpolate)
+		def _(env, method=method, interpolate=interpolate):
+			from glider.maccready import MacCreadyEngine
+			engine = MacCreadyEngine()
+			name, source = REFERENCE_POLARS[method]
+			rng = np.random.default_rng(0)
+			mc, wing_loading = rng.uniform(0, 5, 1000), rng.uniform(25, 55, 1000)
+			engine.speed_to_fly(name, source, mc, wing_loading, interpolate=interpolate)		# grid built once
+			return lambda: engine.speed_to_fly(name, source, mc, wing_loading, interpolate=interpolate)
+
+# PolarsDB
+
+for size in SIZES:
+	for fmt in ['json', 'catalog']:
+		@case('db.load', format=fmt, size=size)
+		def _(env, fmt=fmt, size=size):
+			filename = env.db_file(fmt, size)
+			return lambda: gp.PolarsDB(filename)
+
+		@case('db.lookup', format=fmt, size=size, lookups=LOOKUPS)
+		def _(env, fmt=fmt, size=size):
+			db = env.db(fmt, size)
+			keys = [label.split(' / ', 1) for label in random.Random(0).sample(db.findByMethod(), LOOKUPS)]
+			return lambda: [db.entryFromNameAndSource(name, source) for name, source in keys]
+
+		@case('db.findByMethod', format=fmt, size=size)
+		def _(env, fmt=fmt, size=size):
+			return env.db(fmt, size).findByMethod
+
+		@case('db.search', format=fmt, size=size, queries=len(SEARCHES))
+		def _(env, fmt=fmt, size=size):
+			db = env.db(fmt, size)
+			return lambda: [db.search(query) for query in SEARCHES]
+
+	# the fleet matrix is ~7 kB per glider, not built for the largest catalogs
+	if size <= 10000:
+		@case('ranking.build', size=size)
+		def _(env, size=size):
+			from glider.ranking import FleetMatrix
+			db = env.db('catalog', size)
+			return lambda: FleetMatrix.build(db)
+
+		@case('ranking.rank', size=size)
+		def _(env, size=size):
+			from glider.ranking import FleetMatrix
+			matrix = FleetMatrix.build(env.db('catalog', size))
+			return lambda: matrix.rank(140, 40)
+
+	@case('validation.validate', size=size)
+	def _(env, size=size):
+		from glider.validation import validate
+		entries = catalog.load_json(env.db_file('json', size))
+		return lambda: validate(entries)
+
+	@case('dash.search_options', size=size)
+	def _(env, size=size):
+		from ui.glider_search import search_options
+		db = env.db('catalog', size)
+		return lambda: to_json(search_options(db, 'ventus 2', None))
+
+# glider.uncertainty, in one process: the pool only adds its workers to these timings
+
+for samples in UNCERTAINTY_SAMPLES:
+	for speed_sigma in [0, 1]:
+		@case('uncertainty.monte_carlo', method='3-points', samples=samples, speed_sigma=speed_sigma)
+		def _(env, samples=samples, speed_sigma=speed_sigma):
+			from glider.uncertainty import PolarUncertainty
+			entry = reference_entry('3-points')
+			return lambda: PolarUncertainty(entry, samples=samples, speed_sigma=speed_sigma, workers=1)
+
+@case('dash.render_tab_compare_polars')
+def _(env):
+	from ui.polar_compare import render_tab_compare_polars
+	return lambda: to_json(render_tab_compare_polars())
+
+# Dash figure builders, warm: the polars and static figures are cached as in a running
+# server, cold: every call starts with empty caches
+
+for cache in ['warm', 'cold']:
+	for trigger in ['glider-selected', 'wing-loading-slider']:
+		@case('dash.update_tab_wingloading_analysis', trigger=trigger, cache=cache)
+		def _(env, trigger=trigger, cache=cache):
+			from ui.wl_effect import update_tab_wingloading_analysis
+			def run():
+				if cache == 'cold':
+					clear_caches()
+				return to_json(in_callback(trigger, update_tab_wingloading_analysis, COMPARE_GLIDERS[0], 42.3))
+			return run
+
+	@case('dash.update_tab_compare_polars', gliders=len(COMPARE_GLIDERS), cache=cache)
+	def _(env, cache=cache):
+		from ui.polar_compare import update_tab_compare_polars
+		polars_db = gp.PolarsDB.get_instance()
+		data = {'gliders': [{'id': polars_db.gliderId(*g.split(' / ', 1)), 'wing_loading': None} for g in COMPARE_GLIDERS]}
+		def run():
+			if cache == 'cold':
+				clear_caches()
+			return to_json(update_tab_compare_polars(data))
+		return run
+
+	@case('dash.update_tab_xc_speed', cache=cache)
+	def _(env, cache=cache):
+		from ui.xc_speed import update_tab_xc_speed
+		glider_id = gp.PolarsDB.get_instance().gliderId(*COMPARE_GLIDERS[0].split(' / ', 1))
+		def run():
+			if cache == 'cold':
+				clear_caches()
+			return to_json(update_tab_xc_speed(glider_id, 1.5, 0))
+		return run
+
+	@case('api.evaluate', cache=cache, queries=API_QUERIES)
+	def _(env, cache=cache):
+		from ui import api
+		db = gp.PolarsDB.get_instance()
+		rng = random.Random(0)
+		ids = db.findIdsByMethod()
+		queries = [{'glider': rng.choice(ids), 'wing_loading': round(rng.uniform(28, 55), 1), 'speeds': list(range(60, 221, 16))} for _ in range(API_QUERIES)]
+		def run():
+			if cache == 'cold':
+				clear_caches()
+			return json.dumps(api.evaluate(db, queries))
+		return run
+
+	@case('dash.update_tab_fleet_ranking', cache=cache)
+	def _(env, cache=cache):
+		from ui.fleet_ranking import update_tab_fleet_ranking
+		def run():
+			if cache == 'cold':
+				clear_caches()
+			return to_json(update_tab_fleet_ranking(140, 40, 10, True))
+		return run
+
+	@case('dash.update_tab_uncertainty', cache=cache)
+	def _(env, cache=cache):
+		from ui.uncertainty import update_tab_uncertainty
+		glider_id = gp.PolarsDB.get_instance().gliderId(*COMPARE_GLIDERS[0].split(' / ', 1))
+		def run():
+			if cache == 'cold':
+				clear_caches()
+			return to_json(update_tab_uncertainty(glider_id, 0.05, None, 10000))
+		return run
+
+def measure(func, repeat):
+	# seconds per call, each of the repeat measures running the function for at least 0.2 s
+	timer = timeit.Timer(func)
+	number, _ = timer.autorange()
+	times = [t / number for t in timer.repeat(repeat, number)]
+	return {
+		'number': number,
+		'repeat': repeat,
+		'min': min(times),
+		'median': statistics.median(times),
+		'mean': statistics.mean(times),
+		'stdev': statistics.stdev(times) if len(times) > 1 else 0.0,
+	}
+
+def profile(func, filename, seconds = 1.0):
+	profiler = cProfile.Profile()
+	end = time.perf_counter() + seconds
+	profiler.enable()
+	while time.perf_counter() < end:
+		func()
+	profiler.disable()
+	profiler.dump_stats(filename)
+
+def metadata():
+	try:
+		commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+	except OSError:
+		commit = None
+	return {
+		'date': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+		'commit': commit or None,
+		'python': platform.python_version(),
+		'numpy': np.__version__,
+		'dash': dash.__version__,
+		'plotly': plotly.__version__,
+		'machine': platform.machine(),
+		'cpus': os.cpu_count(),
+	}
+
+def compare(results, baseline, tolerance):
+	# cases slower than the baseline by more than tolerance (relative, on the median)
+	reference = {r['id']: r for r in baseline['results']}
+	regressions = []
+	for r in results:
+		if r['id'] not in reference:
+			continue
+		ratio = r['median'] / reference[r['id']]['median']
+		status = 'REGRESSION' if ratio > 1 + tolerance else ''
+		print('{:<80} {:>10.1f} us {:>7.2f}x {}'.format(r['id'], r['median'] * 1e6, ratio, status))
+		if status:
+			regressions.append(r['id'])
+	return regressions
+
+def main(argv):
+	parser = argparse.ArgumentParser(prog='python benchmarks/suite.py', description='Benchmarks of glider.polar and of the Dash figure builders.')
+	parser.add_argument('--filter', help='only the cases whose id matches this regex')
+	parser.add_argument('--sizes', type=int, nargs='+', help='only these synthetic catalog sizes (default: {})'.format(' '.join(map(str, SIZES))))
+	parser.add_argument('--repeat', type=int, default=5, help='number of measures per case')
+	parser.add_argument('--output', help='write the results to this json file, - for the standard output')
+	parser.add_argument('--compare', help='baseline json file, exit with 1 on regressions')
+	parser.add_argument('--tolerance', type=float, default=TOLERANCE, help='allowed slowdown against the baseline (default: {})'.format(TOLERANCE))
+	parser.add_argument('--profile', metavar='DIRECTORY', help='write the cProfile stats of each case to DIRECTORY/<case>.prof instead of timing')
+	parser.add_argument('--list', action='store_true', help='list the cases')
+	args = parser.parse_args(argv)
+
+	warnings.simplefilter('ignore')
+	gp.PolarsDB.get_instance(DB_FILE)
+	cases = [(case_id(name, params), name, params, setup) for name, params, setup in CASES]
+	if args.filter:
+		cases = [c for c in cases if re.search(args.filter, c[0])]
+	if args.sizes:
+		cases = [c for c in cases if c[2].get('size') is None or c[2]['size'] in args.sizes]
+	if args.list:
+		print('\n'.join(c[0] for c in cases))
+		return 0
+
+	results = []
+	with tempfile.TemporaryDirectory() as tmp:
+		env = Environment(tmp)
+		for id, name, params, setup in cases:
+			func = setup(env)
+			if args.profile:
+				os.makedirs(args.profile, exist_ok=True)
+				filename = os.path.join(args.profile, re.sub(r'[^\w.=-]+', '_', id) + '.prof')
+				profile(func, filename)
+				print('{:<80} {}'.format(id, filename), file=sys.stderr)
+				continue
+			func()			# warm up, lazy imports and caches
+			result = dict(id=id, name=name, params=params, **measure(func, args.repeat))
+			results.append(result)
+			print('{:<80} {:>12.1f} us  (min {:.1f} us, +/- {:.1f} us)'.format(id, result['median'] * 1e6, result['min'] * 1e6, result['stdev'] * 1e6), file=sys.stderr)
+
+	if args.profile:
+		print('inspect with: python -m pstats {}'.format(os.path.join(args.profile, '<case>.prof')), file=sys.stderr)
+		return 0
+
+	report = {'metadata': metadata(), 'results': results}
+	if args.output == '-':
+		json.dump(report, sys.stdout, indent=2)
+	elif args.output:
+		with open(args.output, 'w', encoding='utf8') as f:
+			json.dump(report, f, indent=2)
+
+	if args.compare:
+		with open(args.compare, encoding='utf8') as f:
+			regressions = compare(results, json.load(f), args.tolerance)
+		if len(regressions) > 0:
+			print('{} regressions over {:.0%}'.format(len(regressions), args.tolerance), file=sys.stderr)
+			return 1
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv[1:]))
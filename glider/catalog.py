@@ -0,0 +1,284 @@
+import json
+import os
+import sys
+from collections.abc import MutableSequence
+from contextlib import contextmanager
+
+import numpy as np
+
+# Compiled polars catalog: the entries of glider-polars-db.json as fixed width binary
+# records, memory mapped with numpy so that loading is near instant whatever the size of
+# the catalog and that the pages are shared by all the processes (gunicorn workers) reading
+# the same file.
+#
+# File layout, every section starting on a 8 bytes boundary:
+#	magic (8 bytes) | header length (uint32) | header (json) | records | samples | strings
+# records are RECORD_DTYPE items, samples the (speed, sink rate) points of the 3-points and
+# by-hand polars as float64 pairs, sample_flags which of these values were integers in the
+# json (one byte per point) and strings an utf-8 table of the names and sources.
+
+CATALOG_MAGIC = b'GPCAT\x00\x01\x00'
+CATALOG_VERSION = 1
+CATALOG_EXTENSION = '.gpcat'
+
+METHODS = ['3-points', 'ABC', 'by-hand']
+
+RECORD_DTYPE = np.dtype([
+	('name_offset', '<u4'), ('name_length', '<u4'),
+	('source_offset', '<u4'), ('source_length', '<u4'),
+	('method', 'u1'), ('reserved', 'u1'), ('flags', '<u2'),
+	('wing_area', '<f8'),
+	('max_ballast', '<f8'),
+	('wing_loading', '<f8'),
+	('weight', '<f8'),
+	('abc', '<f8', (3,)),
+	('samples_offset', '<u4'), ('samples_count', '<u4'),
+])
+
+# flags, which optional fields are set and which values were integers in the json
+HAS_WING_LOADING = 1 << 0
+HAS_WEIGHT = 1 << 1
+WEIGHT_FIRST = 1 << 2			# weight is before wing_loading in the json entry
+INT_FIELDS = ['max ballast', 'wing_area', 'wing_loading', 'weight', 'A', 'B', 'C']
+INT_FLAGS = {field: 1 << (i + 3) for i, field in enumerate(INT_FIELDS)}
+INT_SPEED = 1 << 0
+INT_SINK_RATE = 1 << 1
+
+ENTRY_KEYS = ['name', 'max ballast', 'wing_area', 'method', 'source', 'wing_loading', 'weight', 'speed', 'sink_rate', 'A', 'B', 'C']
+
+def is_catalog(filename):
+	try:
+		with open(filename, 'rb') as f:
+			return f.read(len(CATALOG_MAGIC)) == CATALOG_MAGIC
+	except OSError:
+		return False
+
+@contextmanager
+def atomic_open(filename, mode = 'w', **kwargs):
+	# write to a temporary file then rename it, readers (and memory mappings) of filename
+	# never see a partially written file
+	tmp = '{}.{}.tmp'.format(filename, os.getpid())
+	try:
+		with open(tmp, mode, **kwargs) as f:
+			yield f
+		os.replace(tmp, filename)
+	except BaseException:
+		if os.path.exists(tmp):
+			os.remove(tmp)
+		raise
+
+def _is_int(value):
+	return isinstance(value, int) and not isinstance(value, bool)
+
+def _align(offset):
+	return (offset + 7) & ~7
+
+def compile_entries(entries, filename):
+	strings = bytearray()
+	string_offsets = {}
+
+	def add_string(s):
+		if s not in string_offsets:
+			string_offsets[s] = len(strings)
+			strings.extend(s.encode('utf-8'))
+		return string_offsets[s], len(s.encode('utf-8'))
+
+	records = np.zeros(len(entries), dtype=RECORD_DTYPE)
+	samples = []
+	sample_flags = []
+	for i, entry in enumerate(entries):
+		unknown = set(entry.keys()) - set(ENTRY_KEYS)
+		if len(unknown) > 0:
+			raise ValueError('{} / {}, unsupported keys {} in a compiled catalog'.format(entry['name'], entry['source'], sorted(unknown)))
+		if entry['method'] not in METHODS:
+			raise ValueError('{} / {}, unknow method {}'.format(entry['name'], entry['source'], entry['method']))
+
+		record = records[i]
+		record['name_offset'], record['name_length'] = add_string(entry['name'])
+		record['source_offset'], record['source_length'] = add_string(entry['source'])
+		record['method'] = METHODS.index(entry['method'])
+		record['wing_area'] = entry['wing_area']
+		record['max_ballast'] = entry['max ballast']
+		record['wing_loading'] = entry.get('wing_loading', np.nan)
+		record['weight'] = entry.get('weight', np.nan)
+		record['abc'] = [entry.get(k, np.nan) for k in ['A', 'B', 'C']]
+
+		flags = 0
+		flags |= HAS_WING_LOADING if entry.get('wing_loading') is not None else 0
+		flags |= HAS_WEIGHT if entry.get('weight') is not None else 0
+		if 'weight' in entry and 'wing_loading' in entry and list(entry).index('weight') < list(entry).index('wing_loading'):
+			flags |= WEIGHT_FIRST
+		for field in INT_FIELDS:
+			if _is_int(entry.get(field)):
+				flags |= INT_FLAGS[field]
+		record['flags'] = flags
+
+		if 'speed' in entry:
+			if len(entry['speed']) != len(entry['sink_rate']):
+				raise ValueError('{} / {}, speed and sink_rate have different sizes'.format(entry['name'], entry['source']))
+			record['samples_offset'] = len(sample_flags)
+			record['samples_count'] = len(entry['speed'])
+			samples.append(np.column_stack((entry['speed'], entry['sink_rate'])).astype('<f8'))
+			sample_flags.extend((INT_SPEED if _is_int(v) else 0) | (INT_SINK_RATE if _is_int(vz) else 0) for v, vz in zip(entry['speed'], entry['sink_rate']))
+
+	samples = np.concatenate(samples) if len(samples) > 0 else np.zeros((0, 2), dtype='<f8')
+	sample_flags = np.array(sample_flags, dtype='u1')
+
+	header = {'version': CATALOG_VERSION, 'count': len(entries)}
+	offset = _align(len(CATALOG_MAGIC) + 4 + 4096)		# room for the header, fixed once sections are known
+	header['records'] = [offset, records.nbytes]
+	offset = _align(offset + records.nbytes)
+	header['samples'] = [offset, len(samples)]
+	offset = _align(offset + samples.nbytes)
+	header['sample_flags'] = [offset, len(sample_flags)]
+	offset = _align(offset + sample_flags.nbytes)
+	header['strings'] = [offset, len(strings)]
+
+	header_bytes = json.dumps(header).encode('utf-8')
+	if len(header_bytes) > 4096:
+		raise ValueError('catalog header too large')
+	with atomic_open(filename, 'wb') as f:
+		f.write(CATALOG_MAGIC)
+		f.write(np.uint32(len(header_bytes)).tobytes())
+		f.write(header_bytes)
+		for section, data in [('records', records.tobytes()), ('samples', samples.tobytes()), ('sample_flags', sample_flags.tobytes()), ('strings', bytes(strings))]:
+			f.write(b'\0' * (header[section][0] - f.tell()))
+			f.write(data)
+
+class Catalog:
+	def __init__(self, filename):
+		with open(filename, 'rb') as f:
+			if f.read(len(CATALOG_MAGIC)) != CATALOG_MAGIC:
+				raise ValueError('{} is not a compiled polars catalog'.format(filename))
+			header_length = int(np.frombuffer(f.read(4), dtype='<u4')[0])
+			header = json.loads(f.read(header_length).decode('utf-8'))
+
+		if header['version'] != CATALOG_VERSION:
+			raise ValueError('{}, unsupported catalog version {}'.format(filename, header['version']))
+
+		self.filename = filename
+		self.count = header['count']
+		self.records = self.__map(filename, RECORD_DTYPE, header['records'][0], (self.count,))
+		self.samples = self.__map(filename, '<f8', header['samples'][0], (header['samples'][1], 2))
+		self.sample_flags = self.__map(filename, 'u1', header['sample_flags'][0], (header['sample_flags'][1],))
+		self.strings = self.__map(filename, 'u1', header['strings'][0], (header['strings'][1],))
+
+	@staticmethod
+	def __map(filename, dtype, offset, shape):
+		# np.memmap refuses empty arrays
+		if np.prod(shape) == 0:
+			return np.zeros(shape, dtype=dtype)
+		# plain ndarray view on the mapping, slicing a np.memmap is much slower
+		return np.memmap(filename, dtype=dtype, mode='r', offset=offset, shape=shape).view(np.ndarray)
+
+	def __len__(self):
+		return self.count
+
+	def __string(self, offset, length):
+		return self.strings[offset:offset + length].tobytes().decode('utf-8')
+
+	def name(self, i):
+		record = self.records[i]
+		return self.__string(record['name_offset'], record['name_length'])
+
+	def source(self, i):
+		record = self.records[i]
+		return self.__string(record['source_offset'], record['source_length'])
+
+	def method(self, i):
+		return METHODS[self.records[i]['method']]
+
+	def keys(self):
+		# (name, source, method) of every entry, without building the entries
+		records = self.records
+		strings = self.strings.tobytes()
+		return [
+			(strings[no:no + nl].decode('utf-8'), strings[so:so + sl].decode('utf-8'), METHODS[m])
+			for no, nl, so, sl, m in zip(records['name_offset'].tolist(), records['name_length'].tolist(),
+				records['source_offset'].tolist(), records['source_length'].tolist(), records['method'].tolist())
+		]
+
+	def entry(self, i):
+		# the entry as it is in the json polars DB
+		(name_offset, name_length, source_offset, source_length, method, _, flags,
+			wing_area, max_ballast, wing_loading, weight, abc, samples_offset, samples_count) = self.records[i].item()
+		value = lambda field, v: int(v) if flags & INT_FLAGS[field] else v
+
+		entry = {
+			'name': self.__string(name_offset, name_length),
+			'max ballast': value('max ballast', max_ballast),
+			'wing_area': value('wing_area', wing_area),
+			'method': METHODS[method],
+			'source': self.__string(source_offset, source_length),
+		}
+		optionals = [('wing_loading', HAS_WING_LOADING, wing_loading), ('weight', HAS_WEIGHT, weight)]
+		for field, flag, v in (reversed(optionals) if flags & WEIGHT_FIRST else optionals):
+			if flags & flag:
+				entry[field] = value(field, v)
+		if samples_count > 0:
+			end = samples_offset + samples_count
+			points = self.samples[samples_offset:end].tolist()
+			points_flags = self.sample_flags[samples_offset:end].tolist()
+			entry['speed'] = [int(v) if f & INT_SPEED else v for (v, _), f in zip(points, points_flags)]
+			entry['sink_rate'] = [int(vz) if f & INT_SINK_RATE else vz for (_, vz), f in zip(points, points_flags)]
+		if entry['method'] == 'ABC':
+			for field, v in zip(['A', 'B', 'C'], abc):
+				entry[field] = value(field, v)
+		return entry
+
+class CatalogEntries(MutableSequence):
+	# list like view of a Catalog used as PolarsDB.polars_db, entries are decoded on access.
+	# The catalog file is read only, added entries are kept in memory until saved.
+	def __init__(self, catalog):
+		self.catalog = catalog
+		self.added = []
+
+	def __len__(self):
+		return len(self.catalog) + len(self.added)
+
+	def __getitem__(self, i):
+		if isinstance(i, slice):
+			return [self[j] for j in range(*i.indices(len(self)))]
+		if i < 0:
+			i += len(self)
+		if i < 0 or i >= len(self):
+			raise IndexError('catalog index out of range')
+		return self.catalog.entry(i) if i < len(self.catalog) else self.added[i - len(self.catalog)]
+
+	def __setitem__(self, i, entry):
+		raise TypeError('compiled catalog entries cannot be replaced')
+
+	def __delitem__(self, i):
+		raise TypeError('compiled catalog entries cannot be deleted')
+
+	def insert(self, i, entry):
+		if i < len(self):
+			raise TypeError('entries can only be added at the end of a compiled catalog')
+		self.added.append(entry)
+
+def load_json(filename):
+	with open(filename) as json_file:
+		return json.load(json_file)
+
+def save_json(entries, filename):
+	with atomic_open(filename, 'w', encoding ='utf8') as json_file:
+		json.dump(list(entries), json_file, indent = 2)
+
+def main(argv):
+	usage = 'usage: python -m glider.catalog (compile|decompile) source destination'
+	if len(argv) != 3 or argv[0] not in ['compile', 'decompile']:
+		print(usage)
+		return 2
+
+	command, source, destination = argv
+	if command == 'compile':
+		entries = load_json(source)
+		compile_entries(entries, destination)
+	else:
+		entries = CatalogEntries(Catalog(source))
+		save_json(entries, destination)
+	print('{} entries written to {}'.format(len(entries), destination))
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,117 @@
+from functools import lru_cache
+
+import numpy as np
+
+# Models for the polars given as many (speed, sink rate) samples, the 'by-hand' entries of
+# the polars DB. A quadratic cannot follow both the steep stall side and the high speed
+# side of these curves, every model here is fitted once on the samples then evaluated
+# vectorized on arrays of speeds:
+#	'polynomial'	least squares polynomial of a higher degree, the default (DEFAULT_MODEL):
+#					it smooths the noise of the samples
+#	'spline'		monotone cubic spline (PCHIP, Fritsch-Carlson) through the samples, it does
+#					not overshoot between samples but follows their noise, bumps included
+#	'piecewise'		least squares piecewise quadratic, continuous with a continuous slope at
+#					the knots, placed at quantiles of the speeds
+# Outside of the samples the models extend their first or last piece.
+
+DEFAULT_MODEL = 'polynomial'
+BY_HAND_FIT_CACHE_SIZE = 256
+POLYNOMIAL_DEGREE = 4
+PIECEWISE_PIECES = 3
+
+def samples(speed, sink_rate):
+	# sorted samples, the sink rates of duplicated speeds are averaged
+	x, inverse = np.unique(np.asarray(speed, dtype=float), return_inverse=True)
+	y = np.bincount(inverse, weights=np.asarray(sink_rate, dtype=float)) / np.bincount(inverse)
+	return x, y
+
+class PolynomialModel:
+	def __init__(self, x, y, degree = POLYNOMIAL_DEGREE):
+		if len(x) <= degree:
+			raise ValueError('{} samples are not enough for a polynomial of degree {}'.format(len(x), degree))
+		# Polynomial.fit maps the speeds to [-1, 1], the fit stays well conditioned at high degrees
+		self.polynomial = np.polynomial.Polynomial.fit(x, y, degree)
+
+	def __call__(self, x):
+		return self.polynomial(np.asarray(x, dtype=float))
+
+class MonotoneSplineModel:
+	def __init__(self, x, y):
+		if len(x) < 3:
+			raise ValueError('{} samples are not enough for a monotone spline'.format(len(x)))
+		h = np.diff(x)
+		delta = np.diff(y) / h
+
+		# slopes at the samples: weighted harmonic mean of the secants around them, 0 at the
+		# local extrema, non centered three points formula at the ends
+		d = np.zeros_like(x)
+		w1, w2 = 2 * h[1:] + h[:-1], h[1:] + 2 * h[:-1]
+		same_sign = delta[:-1] * delta[1:] > 0
+		with np.errstate(divide='ignore', invalid='ignore'):
+			d[1:-1] = np.where(same_sign, (w1 + w2) / (w1 / delta[:-1] + w2 / delta[1:]), 0)
+		d[0] = self.__end_slope(h[0], h[1], delta[0], delta[1])
+		d[-1] = self.__end_slope(h[-1], h[-2], delta[-1], delta[-2])
+
+		self.x = x
+		self.y = y
+		self.h = h
+		self.d = d
+
+	@staticmethod
+	def __end_slope(h0, h1, delta0, delta1):
+		d = ((2 * h0 + h1) * delta0 - h0 * delta1) / (h0 + h1)
+		if np.sign(d) != np.sign(delta0):
+			return 0.0
+		if np.sign(delta0) != np.sign(delta1) and abs(d) > 3 * abs(delta0):
+			return 3 * delta0
+		return d
+
+	def __call__(self, x):
+		x = np.asarray(x, dtype=float)
+		i = np.clip(np.searchsorted(self.x, x) - 1, 0, len(self.x) - 2)
+		h = self.h[i]
+		t = (x - self.x[i]) / h
+		# cubic Hermite basis
+		h00 = (1 + 2 * t) * (1 - t) ** 2
+		h10 = t * (1 - t) ** 2
+		h01 = t * t * (3 - 2 * t)
+		h11 = t * t * (t - 1)
+		return h00 * self.y[i] + h10 * h * self.d[i] + h01 * self.y[i + 1] + h11 * h * self.d[i + 1]
+
+class PiecewiseQuadraticModel:
+	def __init__(self, x, y, pieces = PIECEWISE_PIECES):
+		if len(x) < pieces + 3:
+			raise ValueError('{} samples are not enough for a piecewise quadratic of {} pieces'.format(len(x), pieces))
+		# speeds mapped to [0, 1], basis 1, u, u^2 and (u - knot)^2 on the right of each knot
+		self.offset = x[0]
+		self.scale = x[-1] - x[0]
+		self.knots = np.quantile(self.__u(x), np.arange(1, pieces) / pieces)
+		self.coefficients = np.linalg.lstsq(self.__basis(self.__u(x)), y, rcond=None)[0]
+
+	def __u(self, x):
+		return (np.asarray(x, dtype=float) - self.offset) / self.scale
+
+	def __basis(self, u):
+		u = u[..., np.newaxis]
+		return np.concatenate((np.ones_like(u), u, u * u, np.maximum(u - self.knots, 0) ** 2), axis=-1)
+
+	def __call__(self, x):
+		return self.__basis(self.__u(x)) @ self.coefficients
+
+MODELS = {
+	'polynomial': PolynomialModel,
+	'spline': MonotoneSplineModel,
+	'piecewise': PiecewiseQuadraticModel,
+}
+
+@lru_cache(maxsize=BY_HAND_FIT_CACHE_SIZE)
+def _fit(model, speed, sink_rate, options):
+	x, y = samples(speed, sink_rate)
+	return MODELS[model](x, y, **dict(options))
+
+def fit(model, speed, sink_rate, **options):
+	# fitted model for the samples, shared by all the polars built on the same samples so that
+	# a polar is not refitted at each wing loading or each new PolarGlider instance
+	if model not in MODELS:
+		raise ValueError('Unknow polar model {}, expected one of {}'.format(model, ', '.join(MODELS)))
+	return _fit(model, tuple(speed), tuple(sink_rate), tuple(sorted(options.items())))
@@ -0,0 +1,175 @@
+import re
+import sys
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import glider.polar as gp
+from glider import maccready
+from glider import validation
+
+# Fleet wide analytics from the command line: min sink rate, max glide ratio and MacCready
+# speeds to fly of every glider of the polars DB (or a filtered set of them), swept from
+# empty to full water ballast. Entries are analyzed by chunks in a process pool, the
+# quadratic polars of a chunk with one PolarBank, the by-hand ones polar by polar, and the
+# results are written as a pandas table, one row per (glider, ballast). The entries with a
+# glider.validation error (not a concave quadratic, min sink speed or best glide ratio out
+# of range...) are rejected.
+
+METHODS = ['3-points', 'ABC', 'by-hand']
+MAC_CREADY = [1, 2, 3, 4]				# m/s
+BALLAST_STEPS = 5						# 0%, 25%, 50%, 75% and 100% of the max ballast
+CHUNK_SIZE = 64
+
+def stf_column(mac_cready):
+	return 'stf_mc{:g}'.format(mac_cready)
+
+def _table(names, sources, methods, ballast, wing_loading, msr, mgr, stf, mac_cready):
+	columns = {
+		'name': names,
+		'source': sources,
+		'method': methods,
+		'ballast': ballast,
+		'wing_loading': wing_loading,
+		'min_sink_speed': msr[0],
+		'min_sink_vz': msr[1],
+		'min_sink_ld': msr[2],
+		'max_ld_speed': mgr[0],
+		'max_ld_vz': mgr[1],
+		'max_ld': mgr[2],
+	}
+	for i, mc in enumerate(mac_cready):
+		columns[stf_column(mc)] = stf[..., i]
+	return pd.DataFrame(columns)
+
+def _analyze_bank(bank, mac_cready, fractions):
+	frames = []
+	for fraction in fractions:
+		ballast = bank.max_ballast * fraction
+		wing_loading = bank.ballast_wing_loading(ballast)
+		stf = bank.speed_to_fly(mac_cready, 0, wing_loading)[0]
+		table = _table(bank.names, bank.sources, bank.methods, ballast, wing_loading,
+			bank.get_min_sink_rate(wing_loading), bank.get_max_glide_ratio(wing_loading), stf, mac_cready)
+		# gliders without water ballast have a single row
+		frames.append(table[(fraction == 0) | (bank.max_ballast > 0)])
+	return frames
+
+def _analyze_polar(entry, mac_cready, fractions):
+	polar = gp.PolarGlider.factory(entry)
+	frames = []
+	for fraction in (fractions if polar.max_ballast > 0 else fractions[:1]):
+		ballast = polar.max_ballast * fraction
+		polar.update_wing_loading(polar.init_wing_loading + ballast / polar.wing_area)
+		frames.append(_table([polar.name], [polar.source], [polar.method()], [ballast], [polar.wing_loading],
+			[[v] for v in polar.get_min_sink_rate()], [[v] for v in polar.get_max_glide_ratio()],
+			maccready.solve_curve(polar, mac_cready, polar.wing_loading)[maccready.SPEED][np.newaxis], mac_cready))
+	return frames
+
+def analyze(entries, mac_cready = MAC_CREADY, ballast_steps = BALLAST_STEPS):
+	# (table, rejected) for a list of polars DB entries, rejected being (label, reason) pairs
+	mac_cready = list(mac_cready)
+	fractions = np.linspace(0, 1, ballast_steps) if ballast_steps > 1 else np.zeros(1)
+
+	# entries that are not polars, the warnings of the validation do not reject them
+	errors = {}
+	for issue in validation.validate(entries):
+		if issue['severity'] == 'error':
+			errors.setdefault(issue['row'], []).append(issue['message'])
+	rejected = [(gp.PolarsDB.label(entries[row]), '; '.join(messages)) for row, messages in sorted(errors.items())]
+	entries = [entry for row, entry in enumerate(entries) if row not in errors]
+
+	frames = []
+	quadratic = [entry for entry in entries if entry['method'] in ['3-points', 'ABC']]
+	bank = gp.PolarBank(quadratic)
+	rejected += bank.rejected
+	if len(bank) > 0:
+		frames.extend(_analyze_bank(bank, mac_cready, fractions))
+
+	for entry in entries:
+		if entry['method'] in ['3-points', 'ABC']:
+			continue
+		try:
+			frames.extend(_analyze_polar(entry, mac_cready, fractions))
+		except Exception as e:
+			rejected.append((gp.PolarsDB.label(entry), repr(e)))
+
+	if len(frames) == 0:
+		return _table([], [], [], [], [], [[]] * 3, [[]] * 3, np.zeros((0, len(mac_cready))), mac_cready), rejected
+	return pd.concat(frames, ignore_index=True), rejected
+
+def _analyze_chunk(args):
+	return analyze(*args)
+
+def analyze_fleet(entries, mac_cready = MAC_CREADY, ballast_steps = BALLAST_STEPS, workers = None, chunk_size = CHUNK_SIZE):
+	# analyze() over a process pool, entries are sent by chunks and the rows are in the order
+	# of the entries whatever the chunk they were computed in
+	tasks = [(entries[i:i + chunk_size], mac_cready, ballast_steps) for i in range(0, len(entries), chunk_size)]
+	if workers == 1 or len(tasks) <= 1:
+		results = [_analyze_chunk(task) for task in tasks]
+	else:
+		with ProcessPoolExecutor(max_workers=workers) as executor:
+			results = list(executor.map(_analyze_chunk, tasks))
+
+	if len(results) == 0:
+		return analyze([], mac_cready, ballast_steps)
+	order = {(entry['name'], entry['source']): i for i, entry in reversed(list(enumerate(entries)))}
+	table = pd.concat([table for table, _ in results], ignore_index=True)
+	table = table.iloc[np.lexsort((table['ballast'].to_numpy(), [order[key] for key in zip(table['name'], table['source'])]))]
+	return table.reset_index(drop=True), [r for _, rejected in results for r in rejected]
+
+def select_entries(polars_db, methods = METHODS, sources = None, name_pattern = None):
+	# entries of polars_db, without the duplicates, filtered by method, source and a regex on the name
+	entries = []
+	regex = re.compile(name_pattern, re.IGNORECASE) if name_pattern else None
+	for label in polars_db.findByMethod(methods):
+		name, source = label.split(' / ', 1)
+		if sources and source not in sources:
+			continue
+		if regex and not regex.search(name):
+			continue
+		entries.append(polars_db.entryFromNameAndSource(name, source))
+	return entries
+
+def write_table(table, filename):
+	# format from the extension, parquet needs pyarrow or fastparquet
+	if filename.endswith('.parquet'):
+		table.to_parquet(filename, index=False)
+	else:
+		table.to_csv(filename, index=False)
+
+def main(argv):
+	parser = argparse.ArgumentParser(prog='python -m glider.fleet', description='Min sink rate, max glide ratio, speeds to fly and ballast sweeps of the polars DB.')
+	parser.add_argument('output', nargs='?', help='csv or parquet file (default: csv on the standard output)')
+	parser.add_argument('--db', default='./glider-polars-db.json', help='polars DB (json or compiled catalog)')
+	parser.add_argument('--method', action='append', choices=METHODS, help='only the polars of this method, can be repeated')
+	parser.add_argument('--source', action='append', help='only the polars of this source, can be repeated')
+	parser.add_argument('--name', help='only the gliders whose name matches this regex')
+	parser.add_argument('--mac-cready', type=float, nargs='+', default=MAC_CREADY, help='MacCready settings of the speeds to fly, m/s')
+	parser.add_argument('--ballast-steps', type=int, default=BALLAST_STEPS, help='number of ballast values from empty to max ballast')
+	parser.add_argument('--workers', type=int, default=None, help='number of processes')
+	parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='number of polars per task')
+	args = parser.parse_args(argv)
+
+	start = time.perf_counter()
+	polars_db = gp.PolarsDB(args.db)
+	entries = select_entries(polars_db, args.method or METHODS, args.source, args.name)
+	table, rejected = analyze_fleet(entries, args.mac_cready, args.ballast_steps, args.workers, args.chunk_size)
+
+	if args.output:
+		try:
+			write_table(table, args.output)
+		except ImportError as e:
+			parser.error('cannot write {}: {}'.format(args.output, e))
+	else:
+		table.to_csv(sys.stdout, index=False)
+
+	for label, reason in rejected:
+		print('rejected {} => {}'.format(label, reason), file=sys.stderr)
+	print('{} polars, {} rows, {} rejected in {:.2f} s'.format(len(entries), len(table), len(rejected), time.perf_counter() - start), file=sys.stderr)
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv[1:]))
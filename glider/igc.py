@@ -0,0 +1,207 @@
+import os
+import sys
+import math
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import glider.polar as gp
+
+# Flight logs (IGC files) replay to check a polar against real flights. Every stage is a
+# generator so memory stays constant whatever the length of the log:
+#	read_fixes()		B records of the file -> (time, latitude, longitude, altitude)
+#	samples()			consecutive fixes -> (time, speed, vario, turn rate)
+#	straight_glides()	samples -> mean (speed, vario) of the straight gliding windows
+# DegradationFit then fits, with running sums, the factor f of vario = f * polar(speed), f > 1
+# meaning the glider sinks more than its polar. Without an airspeed sensor in the log the
+# speed is the GPS ground speed, the wind and the airmass movements average out over many glides.
+
+EARTH_RADIUS = 6371000					# m
+MIN_GLIDE_DURATION = 20					# s, length of the windows averaged by straight_glides()
+MAX_TURN_RATE = 8						# deg/s, above the glider is considered turning (thermalling is 15-25 deg/s)
+GLIDE_SPEED_RANGE = (gp.POLAR_CURVE_START_KM, gp.POLAR_CURVE_END_KM)
+
+def read_fixes(filename):
+	# (seconds since the start of the day, latitude, longitude, altitude) of the B records,
+	# pressure altitude when recorded else gps altitude
+	day = 0
+	last_time = None
+	with open(filename, encoding='ascii', errors='replace') as f:
+		for line in f:
+			if not line.startswith('B') or len(line) < 35:
+				continue
+			try:
+				t = int(line[1:3]) * 3600 + int(line[3:5]) * 60 + int(line[5:7])
+				lat = int(line[7:9]) + int(line[9:14]) / 60000
+				lon = int(line[15:18]) + int(line[18:23]) / 60000
+				pressure_alt = int(line[25:30])
+				gps_alt = int(line[30:35])
+			except ValueError:
+				continue
+			if line[14] == 'S':
+				lat = -lat
+			if line[23] == 'W':
+				lon = -lon
+
+			# flights going past midnight UTC
+			if last_time is not None and t < last_time - 12 * 3600:
+				day += 86400
+			last_time = t
+			yield (t + day, lat, lon, pressure_alt if pressure_alt != 0 else gps_alt)
+
+def samples(fixes):
+	# (time, ground speed in km/h, vario in m/s, turn rate in deg/s) between consecutive fixes
+	previous = None
+	previous_heading = None
+	for fix in fixes:
+		if previous is not None:
+			dt = fix[0] - previous[0]
+			if dt <= 0:
+				continue
+			lat1, lon1, lat2, lon2 = map(math.radians, (previous[1], previous[2], fix[1], fix[2]))
+			dlat, dlon = lat2 - lat1, lon2 - lon1
+			h = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2) ** 2
+			distance = 2 * EARTH_RADIUS * math.asin(math.sqrt(h))
+			heading = math.degrees(math.atan2(math.sin(dlon) * math.cos(lat2), math.cos(lat1) * math.sin(lat2) - math.sin(lat1) * math.cos(lat2) * math.cos(dlon)))
+
+			turn_rate = 0.0
+			if previous_heading is not None:
+				turn_rate = ((heading - previous_heading + 180) % 360 - 180) / dt
+			previous_heading = heading
+			yield (fix[0], distance / dt * gp.KM_TO_MS, (fix[3] - previous[3]) / dt, turn_rate)
+		previous = fix
+
+def straight_glides(samples, min_duration = MIN_GLIDE_DURATION, max_turn_rate = MAX_TURN_RATE, speed_range = GLIDE_SPEED_RANGE):
+	# mean (speed, vario) of consecutive windows of min_duration seconds flown straight, in the
+	# speed range of the polars and without climbing. Only the current window is kept in memory.
+	window = deque()
+	for sample in samples:
+		t, speed, vario, turn_rate = sample
+		if abs(turn_rate) > max_turn_rate or not (speed_range[0] <= speed <= speed_range[1]):
+			window.clear()
+			continue
+
+		window.append(sample)
+		if window[-1][0] - window[0][0] >= min_duration:
+			mean_speed = sum(s[1] for s in window) / len(window)
+			mean_vario = sum(s[2] for s in window) / len(window)
+			window.clear()
+			if mean_vario < 0:
+				yield (mean_speed, mean_vario)
+
+class DegradationFit:
+	# least squares fit of vario = factor * polar(speed), accumulated with running sums so that
+	# it can be updated glide after glide and merged across processes
+	def __init__(self):
+		self.n = 0
+		self.sxx = 0.0			# sum of polar(speed)^2
+		self.sxy = 0.0			# sum of polar(speed) * vario
+		self.syy = 0.0			# sum of vario^2
+
+	def update(self, expected, measured):
+		expected = np.atleast_1d(np.asarray(expected, dtype=float))
+		measured = np.atleast_1d(np.asarray(measured, dtype=float))
+		self.n += len(expected)
+		self.sxx += float(np.dot(expected, expected))
+		self.sxy += float(np.dot(expected, measured))
+		self.syy += float(np.dot(measured, measured))
+		return self
+
+	def merge(self, other):
+		self.n += other.n
+		self.sxx += other.sxx
+		self.sxy += other.sxy
+		self.syy += other.syy
+		return self
+
+	def factor(self):
+		return self.sxy / self.sxx if self.sxx > 0 else float('nan')
+
+	def rms(self):
+		# root mean square of the residuals of the fit
+		if self.n == 0:
+			return float('nan')
+		residuals = self.syy - 2 * self.factor() * self.sxy + self.factor() ** 2 * self.sxx
+		return math.sqrt(max(residuals, 0) / self.n)
+
+	def result(self):
+		return {'glides': self.n, 'factor': self.factor(), 'rms': self.rms()}
+
+def fit_flight(filename, polar, fit = None, chunk_size = 256):
+	# feed the straight glides of a flight to fit (a new DegradationFit by default), by chunks
+	# so that the polar is evaluated vectorized
+	fit = DegradationFit() if fit is None else fit
+	chunk = []
+	for glide in straight_glides(samples(read_fixes(filename))):
+		chunk.append(glide)
+		if len(chunk) == chunk_size:
+			speeds, varios = zip(*chunk)
+			fit.update(polar.curve(np.array(speeds)), varios)
+			chunk = []
+	if len(chunk) > 0:
+		speeds, varios = zip(*chunk)
+		fit.update(polar.curve(np.array(speeds)), varios)
+	return fit
+
+def _fit_files(args):
+	# process pool task: a chunk of files for a polar given as its DB entry and wing loading
+	filenames, entry, wing_loading = args
+	polar = gp.PolarGlider.factory(entry)
+	if wing_loading is not None:
+		polar.update_wing_loading(wing_loading)
+
+	fit = DegradationFit()
+	per_file = []
+	for filename in filenames:
+		file_fit = fit_flight(filename, polar)
+		per_file.append(dict(file_fit.result(), file=filename))
+		fit.merge(file_fit)
+	return fit, per_file
+
+def fit_directory(directory, entry, wing_loading = None, workers = None, chunk_size = 16):
+	# fit all the .igc files of a directory with a process pool, files are sent by chunks
+	filenames = sorted(os.path.join(directory, f) for f in os.listdir(directory) if f.lower().endswith('.igc'))
+	tasks = [(filenames[i:i + chunk_size], entry, wing_loading) for i in range(0, len(filenames), chunk_size)]
+
+	fit = DegradationFit()
+	per_file = []
+	if workers == 1:
+		results = map(_fit_files, tasks)
+	else:
+		executor = ProcessPoolExecutor(max_workers=workers)
+		results = executor.map(_fit_files, tasks)
+	try:
+		for chunk_fit, chunk_per_file in results:
+			fit.merge(chunk_fit)
+			per_file.extend(chunk_per_file)
+	finally:
+		if workers != 1:
+			executor.shutdown()
+	return fit, per_file
+
+def main(argv):
+	parser = argparse.ArgumentParser(prog='python -m glider.igc', description='Fit the degradation of a polar against IGC flight logs.')
+	parser.add_argument('path', help='an IGC file or a directory of IGC files')
+	parser.add_argument('glider', help='"name / source" of the polar in the polars DB')
+	parser.add_argument('--wing-loading', type=float, help='wing loading of the flights, the one of the polar by default')
+	parser.add_argument('--db', default='./glider-polars-db.json', help='polars DB')
+	parser.add_argument('--workers', type=int, default=None, help='number of processes for a directory')
+	args = parser.parse_args(argv)
+
+	name, source = args.glider.split(' / ', 1)
+	entry = gp.PolarsDB(args.db).entryFromNameAndSource(name, source)
+	if os.path.isdir(args.path):
+		fit, per_file = fit_directory(args.path, entry, args.wing_loading, args.workers)
+	else:
+		fit, per_file = _fit_files(([args.path], entry, args.wing_loading))
+
+	for r in per_file:
+		print('{:<40} {:>6} glides, factor {:.3f}, rms {:.2f} m/s'.format(os.path.basename(r['file']), r['glides'], r['factor'], r['rms']))
+	r = fit.result()
+	print('{} files, {} glides, degradation factor {:.3f}, rms {:.2f} m/s'.format(len(per_file), r['glides'], r['factor'], r['rms']))
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv[1:]))
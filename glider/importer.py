@@ -0,0 +1,215 @@
+import re
+import sys
+import json
+import time
+import argparse
+from urllib import request
+from concurrent.futures import ProcessPoolExecutor
+
+import glider.polar as gp
+from glider import validation
+
+# Import of the polars published by other projects into the polars DB. Each source is a
+# PolarSource subclass (a regex over the source file and the conversion of one match into
+# a DB entry), registered in SOURCES. The sources are fetched and parsed in parallel, the
+# entries of all the sources are validated in one batch against the DB (see
+# glider.validation), those with errors are rejected, then the others are upserted by
+# (name, source): entries whose content did not change are skipped and the DB file is only
+# written when something was added or updated. It is then rewritten as a whole (atomically):
+# neither the json file nor the compiled catalog, with its string table and fixed size
+# arrays, can be patched in place. The delta alone (added and updated entries) is written
+# with --delta.
+
+SOURCES = {}
+
+def register_source(cls):
+	SOURCES[cls.key] = cls
+	return cls
+
+class PolarSource:
+	key = None				# name of the source on the command line
+	source = None			# 'source' of the DB entries
+	url = None				# default location
+	regex = None
+
+	def __init__(self, location = None):
+		self.location = location or self.url
+
+	def fetch(self):
+		# location is either an url or a local file
+		if re.match(r'^[a-z]+://', self.location):
+			return request.urlopen(self.location).read().decode('utf-8')
+		with open(self.location, encoding='utf-8') as f:
+			return f.read()
+
+	def to_entry(self, match):
+		# convert a regex match to a polars DB entry, None to skip it silently
+		raise NotImplementedError()
+
+	def parse(self, data):
+		entries = []
+		rejected = []
+		for match in re.finditer(self.regex, data, re.MULTILINE):
+			name = match.group('glider')
+			try:
+				entry = self.to_entry(match)
+				if entry is None:
+					continue
+				entries.append(entry)
+			except ZeroDivisionError as ze:
+				rejected.append({'name': name, 'reason': 'wing area is {} => {}'.format(match.group('wing_area'), ze)})
+			except Exception as e:
+				rejected.append({'name': name, 'reason': str(e)})
+		return entries, rejected
+
+@register_source
+class XCSoarSource(PolarSource):
+	key = 'xcsoar'
+	source = 'XCSoar'
+	url = 'https://raw.githubusercontent.com/XCSoar/XCSoar/master/src/Polar/PolarStore.cpp'
+	regex = r"_T\(\"(?P<glider>.*)\"\)[^,]*,\s*(?P<mass>[0-9-.]*)[^,]*,\s*(?P<max_ballast>[0-9-.]*)[^,]*,\s*(?P<speed1>[0-9-.]*)[^,]*,\s*(?P<sink_rate1>[0-9-.]*)[^,]*,\s*(?P<speed2>[0-9-.]*)[^,]*,\s*(?P<sink_rate2>[0-9-.]*)[^,]*,\s*(?P<speed3>[0-9-.]*)[^,]*,\s*(?P<sink_rate3>[0-9-.]*)[^,]*,\s*(?P<wing_area>[0-9-.]*)[^,]*,\s*(?P<max_speed>[0-9-.]*)[^,]*,"
+
+	def to_entry(self, match):
+		new_polar = dict()
+		new_polar['name'] = match.group('glider')
+		new_polar['max ballast'] = float(match.group('max_ballast'))
+		new_polar['wing_area'] = float(match.group('wing_area'))
+		new_polar['method'] = '3-points'
+		new_polar['source'] = self.source
+		new_polar['wing_loading'] = round(float(match.group('mass')) / float (match.group('wing_area')), 1)
+		new_polar['speed'] = [float(match.group('speed1')), float(match.group('speed2')), float(match.group('speed3'))]
+		new_polar['sink_rate'] = [float(match.group('sink_rate1')), float(match.group('sink_rate2')), float(match.group('sink_rate3'))]
+		return new_polar
+
+@register_source
+class XCVarioSource(PolarSource):
+	key = 'xcvario'
+	source = 'XCVario'
+	url = 'https://raw.githubusercontent.com/iltis42/XCVario/master/main/Polars.cpp'
+	regex = r"{\s*[0-9,]*\s*\"(?P<glider>.*)\"[^,]*,\s*(?P<wing_load>[0-9-.]*),\s*(?P<speed1>[0-9-.]*),\s*(?P<sink1>[0-9-.]*),\s*(?P<speed2>[0-9-.]*),\s*(?P<sink2>[0-9-.]*),\s*(?P<speed3>[0-9-.]*),\s*(?P<sink3>[0-9-.]*),\s*(?P<max_ballast>[0-9-.]*),\s*(?P<wing_area>[0-9-.]*)\s*}"
+
+	def to_entry(self, match):
+		if match.group('glider') == 'User Polar':
+			return None
+
+		new_polar = dict()
+		new_polar['name'] = match.group('glider').replace('/','-')
+		new_polar['max ballast'] = float(match.group('max_ballast'))
+		new_polar['wing_area'] = float(match.group('wing_area'))
+		new_polar['method'] = '3-points'
+		new_polar['source'] = self.source
+		new_polar['wing_loading'] = float(match.group('wing_load'))
+		new_polar['speed'] = [float(match.group('speed1')), float(match.group('speed2')), float(match.group('speed3'))]
+		new_polar['sink_rate'] = [float(match.group('sink1')), float(match.group('sink2')), float(match.group('sink3'))]
+		return new_polar
+
+def fetch_and_parse(polar_source):
+	start = time.perf_counter()
+	data = polar_source.fetch()
+	fetched = time.perf_counter()
+	entries, rejected = polar_source.parse(data)
+	parsed = time.perf_counter()
+
+	report = {
+		'source': polar_source.source,
+		'location': polar_source.location,
+		'fetch_time': fetched - start,
+		'parse_time': parsed - fetched,
+		'rows': len(entries) + len(rejected),
+		'accepted': len(entries),
+		'rejected': rejected,
+	}
+	return entries, report
+
+def import_polars(polars_db, polar_sources, workers = None):
+	# fetch and parse the sources in parallel, then upsert their entries in polars_db.
+	# Return the report of the run and the entries that were added or updated.
+	if workers == 1 or len(polar_sources) <= 1:
+		results = [fetch_and_parse(s) for s in polar_sources]
+	else:
+		with ProcessPoolExecutor(max_workers=workers) as executor:
+			results = list(executor.map(fetch_and_parse, polar_sources))
+
+	# validate the entries of all the sources at once, against the DB entries they do not replace
+	start = time.perf_counter()
+	entries = [entry for source_entries, _ in results for entry in source_entries]
+	keys = {(entry['name'], entry['source']) for entry in entries}
+	issues = validation.validate(entries, [e for e in polars_db.polars_db if (e['name'], e['source']) not in keys])
+	invalid = validation.invalid_rows(issues)
+	elapsed = time.perf_counter() - start
+
+	delta = []
+	reports = []
+	row = 0
+	for source_entries, report in results:
+		rows = range(row, row + len(source_entries))
+		row += len(source_entries)
+		source_issues = [issue for issue in issues if issue['row'] in rows]
+		report['validation_time'] = elapsed
+		report['rejected'] += [{'name': issue['glider'], 'reason': issue['message'], 'check': issue['check']} for issue in source_issues if issue['severity'] == 'error']
+		report['warnings'] = [{'name': issue['glider'], 'reason': issue['message'], 'check': issue['check']} for issue in source_issues if issue['severity'] == 'warning']
+		report['accepted'] -= sum(1 for i in rows if i in invalid)
+
+		counts = {'added': 0, 'updated': 0, 'unchanged': 0}
+		for entry in (entries[i] for i in rows if i not in invalid):
+			status = polars_db.upsert(entry)
+			counts[status] += 1
+			if status != 'unchanged':
+				delta.append(entry)
+		report.update(counts)
+		reports.append(report)
+	return reports, delta
+
+def print_report(reports, warnings = False):
+	print('{:<10} {:>10} {:>10} {:>13} {:>6} {:>8} {:>8} {:>9} {:>6} {:>8}'.format(
+		'source', 'fetch (ms)', 'parse (ms)', 'validate (ms)', 'rows', 'rejected', 'warnings', 'unchanged', 'added', 'updated'))
+	for r in reports:
+		print('{:<10} {:>10.1f} {:>10.1f} {:>13.1f} {:>6} {:>8} {:>8} {:>9} {:>6} {:>8}'.format(
+			r['source'], r['fetch_time'] * 1e3, r['parse_time'] * 1e3, r['validation_time'] * 1e3, r['rows'], len(r['rejected']), len(r['warnings']),
+			r['unchanged'], r['added'], r['updated']))
+		for rejected in r['rejected']:
+			print('    rejected {} => {}'.format(rejected['name'], rejected['reason']))
+		for warning in r['warnings'] if warnings else []:
+			print('    warning {} => {}'.format(warning['name'], warning['reason']))
+
+def main(argv):
+	parser = argparse.ArgumentParser(prog='python -m glider.importer', description='Import polars from other projects into the polars DB.')
+	parser.add_argument('sources', nargs='*', metavar='SOURCE[=LOCATION]',
+		help='source to import, among {}, optionally followed by a local file or an url (default: all from their url)'.format(', '.join(SOURCES)))
+	parser.add_argument('--db', default='./glider-polars-db.json', help='polars DB to update (json or compiled catalog)')
+	parser.add_argument('--workers', type=int, default=None, help='number of processes parsing the sources')
+	parser.add_argument('--dry-run', action='store_true', help='do not write the polars DB')
+	parser.add_argument('--report', help='write the report of the run to this json file')
+	parser.add_argument('--warnings', action='store_true', help='print the validation warnings (duplicates, disagreeing sources...)')
+	parser.add_argument('--delta', help='also write the added and updated entries alone to this json file')
+	args = parser.parse_args(argv)
+
+	polar_sources = []
+	for arg in args.sources or list(SOURCES):
+		key, _, location = arg.partition('=')
+		if key not in SOURCES:
+			parser.error('unknown source {}'.format(key))
+		polar_sources.append(SOURCES[key](location or None))
+
+	polars_db = gp.PolarsDB(args.db)
+	print('Size of the glide polars db is {}'.format(len(polars_db.polars_db)))
+
+	reports, delta = import_polars(polars_db, polar_sources, args.workers)
+	print_report(reports, args.warnings)
+
+	if len(delta) > 0 and not args.dry_run:
+		polars_db.save(args.db)
+		print('{} new or updated polars, size of the glide polars db is {}, saved to {}'.format(len(delta), len(polars_db.polars_db), args.db))
+	else:
+		print('Polars DB {} not written ({})'.format(args.db, 'dry run' if args.dry_run else 'no change'))
+
+	if args.report:
+		with open(args.report, 'w', encoding='utf8') as f:
+			json.dump(reports, f, indent=2)
+	if args.delta:
+		with open(args.delta, 'w', encoding='utf8') as f:
+			json.dump(delta, f, indent=2)
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv[1:]))
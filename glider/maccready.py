@@ -0,0 +1,182 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+import glider.polar as gp
+from glider import solvers
+
+# MacCready speed to fly. For a polar y = a.x^2 + b.x + c at the wing loading W and an
+# airmass moving vertically at netto (m/s, > 0 when rising), the speed to fly between two
+# thermals of strength mc is the tangent to the polar from (0, mc - netto):
+#	x = sqrt((c + netto - mc) / a), and never slower than the min sink speed -b / 2a,
+# see solvers.speed_to_fly(), also used by PolarBank. The polars that are not quadratic
+# (by-hand) are solved numerically by solve_curve(), used by glider.fleet and glider.xcspeed.
+# The wing loading scales the polar like in PolarGlider.update_wing_loading().
+#
+# MacCreadyGrid holds, for one glider, the speed to fly, the sink rate at this speed and the
+# resulting cross-country speed over a (mac cready x wing loading x netto) grid, computed on
+# the first lookup. Lookups are then trilinear interpolations done in O(1) per point and
+# vectorized. MacCreadyEngine keeps the grids of the last used gliders and answers batches
+# of conditions from the grid, or exactly without building it (the default for the
+# quadratic polars, whose closed form is cheaper than the lookup).
+
+MC_AXIS = np.arange(0, 5.01, 0.25)				# thermal strength, m/s
+WING_LOADING_AXIS = np.arange(20, 60.01, 1.0)	# kg/m2
+NETTO_AXIS = np.arange(-4, 2.01, 0.25)			# airmass vertical speed, m/s
+MACCREADY_CACHE_SIZE = 64
+
+SPEED = 0				# speed to fly (km/h)
+SINK_RATE = 1			# sink rate of the glider at this speed, in still air (m/s)
+XC_SPEED = 2			# cross-country speed, climbing at mc then gliding at the speed to fly (km/h)
+
+def solve(coefficients, wing_loading, mac_cready, new_wing_loadings, netto):
+	# exact speed to fly, sink rate and cross-country speed, broadcasted over the conditions
+	a, b, c = coefficients
+	mac_cready, new_wing_loadings, netto = np.broadcast_arrays(
+		np.asarray(mac_cready, dtype=float), np.asarray(new_wing_loadings, dtype=float), np.asarray(netto, dtype=float))
+
+	k = np.sqrt(new_wing_loadings / wing_loading)
+	a, c = a / k, c * k
+	speed = solvers.speed_to_fly(a, b, c, mac_cready - netto)
+	sink_rate = (a * speed + b) * speed + c
+	return np.stack((speed, sink_rate, _xc_speed(speed, sink_rate, mac_cready, netto)))
+
+def solve_curve(polar, mac_cready, new_wing_loadings, netto = 0):
+	# speed to fly, sink rate and cross-country speed of any polar (init_curve() and
+	# init_wing_loading), searched numerically. The tangent from (0, mc - netto) to k.f(x/k)
+	# is the tangent from (0, (mc - netto) / k) to the reference curve f(u), x = k.u, with u
+	# between the min sink speed of f and the end of its speed range.
+	mac_cready, new_wing_loadings, netto = np.broadcast_arrays(
+		np.asarray(mac_cready, dtype=float), np.asarray(new_wing_loadings, dtype=float), np.asarray(netto, dtype=float))
+
+	k = np.sqrt(new_wing_loadings / polar.init_wing_loading)
+	lo, hi = getattr(polar, 'speed_range', None) or (gp.POLAR_CURVE_START, gp.POLAR_CURVE_END)
+	ms_speed = solvers.maximize(polar.init_curve, lo, hi)[0]
+	offset = (netto - mac_cready) / k
+	slope = lambda u: (polar.init_curve(u) + offset.reshape(offset.shape + (1,) * (np.ndim(u) - offset.ndim))) / u
+	u = solvers.maximize(slope, np.full(offset.shape, ms_speed), np.full(offset.shape, hi))[0]
+	speed, sink_rate = k * u, k * polar.init_curve(u)
+	return np.stack((speed, sink_rate, _xc_speed(speed, sink_rate, mac_cready, netto)))
+
+def _xc_speed(speed, sink_rate, mac_cready, netto):
+	# fraction of the time spent gliding: climb at mac_cready, descend at -(sink_rate + netto)
+	descent = -(sink_rate + netto)
+	with np.errstate(divide='ignore', invalid='ignore'):
+		return np.where(descent > 0, speed * mac_cready / (mac_cready + descent), speed)
+
+class MacCreadyGrid:
+	# the by-hand polars keep their fitted curve and are solved with solve_curve()
+	def __init__(self, polar, mc_axis = MC_AXIS, wing_loading_axis = WING_LOADING_AXIS, netto_axis = NETTO_AXIS):
+		self.name = polar.name
+		self.source = polar.source
+		self.polar = polar if getattr(polar, 'fitted', None) is not None else None
+		self.coefficients = np.array(polar.speed_coefficients(), dtype=float)
+		self.wing_loading = polar.wing_loading
+		self.axes = [np.asarray(axis, dtype=float) for axis in (mc_axis, wing_loading_axis, netto_axis)]
+		for axis in self.axes:
+			steps = np.diff(axis)
+			if len(axis) < 2 or not np.allclose(steps, steps[0]):
+				raise ValueError('MacCready grid axes must be regular with at least 2 values')
+
+		self.__rows = None
+
+	def __table(self):
+		# one (speed, sink rate, xc speed) row per grid point, computed on first use. Threads
+		# racing on the first lookup compute the same rows.
+		rows = self.__rows
+		if rows is None:
+			mc, wl, netto = np.meshgrid(*self.axes, indexing='ij')
+			rows = self.__rows = np.ascontiguousarray(np.moveaxis(self.solve(mc, wl, netto), 0, -1).reshape(-1, 3))
+		return rows
+
+	@property
+	def values(self):
+		# (3, n_mc, n_wl, n_netto) speed, sink rate and cross-country speed of the grid
+		return np.moveaxis(self.__table().reshape(tuple(len(axis) for axis in self.axes) + (3,)), -1, 0)
+
+	def solve(self, mac_cready, wing_loading, netto = 0):
+		if self.polar is not None:
+			return solve_curve(self.polar, mac_cready, wing_loading, netto)
+		return solve(self.coefficients, self.wing_loading, mac_cready, wing_loading, netto)
+
+	def lookup(self, mac_cready, wing_loading, netto = 0):
+		# trilinear interpolation of the grid, values outside of the axes are clipped to them.
+		# Return an array (3, ...) of speed, sink rate and cross-country speed, see SPEED,
+		# SINK_RATE and XC_SPEED, the other dimensions being those of the broadcasted conditions.
+		conditions = np.broadcast_arrays(
+			np.asarray(mac_cready, dtype=float), np.asarray(wing_loading, dtype=float), np.asarray(netto, dtype=float))
+
+		rows = self.__table()
+		index = 0
+		corners = [(0, 1.0)]		# (offset in __rows, weight) of the corners of the grid cell
+		for axis, x in zip(self.axes, conditions):
+			f = np.clip((x - axis[0]) / (axis[1] - axis[0]), 0, len(axis) - 1)
+			i = np.minimum(f.astype(int), len(axis) - 2)
+			t = f - i
+			index = index * len(axis) + i
+			corners = [(offset * len(axis) + d, w * (t if d else 1 - t)) for offset, w in corners for d in (0, 1)]
+
+		result = 0
+		for offset, w in corners:
+			result = result + rows[index + offset] * w[..., np.newaxis]
+		return np.moveaxis(result, -1, 0)
+
+class MacCreadyEngine:
+	def __init__(self, maxsize = MACCREADY_CACHE_SIZE, mc_axis = MC_AXIS, wing_loading_axis = WING_LOADING_AXIS, netto_axis = NETTO_AXIS):
+		self.maxsize = maxsize
+		self.axes = (mc_axis, wing_loading_axis, netto_axis)
+		self.__grids = OrderedDict()
+		self.__lock = threading.Lock()
+		self.hits = 0
+		self.misses = 0
+
+	def grid(self, glider_name, source, polars_db = None):
+		polars_db = polars_db or gp.PolarsDB.get_instance()
+		key = (glider_name, source, polars_db.version)
+		with self.__lock:
+			grid = self.__grids.get(key)
+			if grid is not None:
+				self.__grids.move_to_end(key)
+				self.hits += 1
+				return grid
+			self.misses += 1
+
+		grid = MacCreadyGrid(polars_db.cachedPolar(glider_name, source), *self.axes)
+		with self.__lock:
+			self.__grids[key] = grid
+			while len(self.__grids) > self.maxsize:
+				self.__grids.popitem(last=False)
+		return grid
+
+	def clear(self):
+		with self.__lock:
+			self.__grids.clear()
+			self.hits = 0
+			self.misses = 0
+
+	def cache_info(self):
+		with self.__lock:
+			return gp.CacheInfo(self.hits, self.misses, self.maxsize, len(self.__grids))
+
+	def speed_to_fly(self, glider_name, source, mac_cready, wing_loading = None, netto = 0, interpolate = None, polars_db = None):
+		# (speed, sink rate, cross-country speed) for arrays of conditions, at the reference wing
+		# loading of the glider by default. They are interpolated in the grid of the glider, built
+		# on the first lookup, or solved exactly when interpolate is False, without the grid. By
+		# default the polars solved numerically use the grid, the quadratic ones the closed form,
+		# exact and about 6 times faster than the interpolation.
+		grid = self.grid(glider_name, source, polars_db)
+		wing_loading = grid.wing_loading if wing_loading is None else wing_loading
+		if interpolate is None:
+			interpolate = grid.polar is not None
+		if interpolate:
+			return grid.lookup(mac_cready, wing_loading, netto)
+		return grid.solve(mac_cready, wing_loading, netto)
+
+	def table(self, glider_name, source, wing_loading = None, netto = 0, mc_axis = None, polars_db = None):
+		# speed to fly table as a pandas DataFrame, one row per mac cready setting (flight computer
+		# export), solved exactly
+		import pandas as pd		# not needed by the Dash app, keep it out of its startup
+		mc_axis = self.axes[0] if mc_axis is None else np.asarray(mc_axis, dtype=float)
+		values = self.speed_to_fly(glider_name, source, mc_axis, wing_loading, netto, interpolate=False, polars_db=polars_db)
+		return pd.DataFrame({'mac_cready': mc_axis, 'speed': values[SPEED], 'sink_rate': values[SINK_RATE], 'xc_speed': values[XC_SPEED]})
@@ -1,10 +1,20 @@
 import numpy as np
-from scipy.optimize import fsolve
-import json
 import math
-import pandas as pd
+import json
+import hashlib
+import bisect
+import warnings
+import threading
+import os
+import time
+from collections import OrderedDict, namedtuple
 from abc import ABC, abstractmethod
 
+from glider import solvers
+from glider import catalog
+from glider import fitting
+from glider.search import GliderIndex, SEARCH_LIMIT
+
 KM_TO_MS = 3.6				# factor to convert km/h in m/s
 CONVERT_TO_MS = False		# True if we want to convert speed from km/h to m/s
 
@@ -20,7 +30,34 @@ POLAR_CURVE_NBR_SAMPLE =  int(((POLAR_CURVE_END - POLAR_CURVE_START) // 5) +1)
 # to convert speed from km/h to m/s
 xaxis_unit = lambda x: x / (KM_TO_MS if CONVERT_TO_MS else 1)
 
+POLARS_DB_CHECK_INTERVAL = 2		# in seconds, how often PolarsRegistry looks for a new polars file
+POLAR_CACHE_SIZE = 512				# max number of fitted polars kept by PolarCache
+POLAR_CACHE_WL_DECIMALS = 1		# wing loading rounding for the PolarCache key (slider step is 0.1 kg/m2)
+
+def wing_loading_coefficients(coefficients, wing_loading, new_wing_loadings):
+	# Changing the wing loading from W to W' scales both speed and sink rate by k = sqrt(W'/W),
+	# the point (x, y) of the polar moving to (k.x, k.y). For y = a.x^2 + b.x + c the new polar
+	# is then exactly y = a/k.x^2 + b.x + c.k. It works the same for the ABC polars, their
+	# speed being only divided by 100. Return a (n,3) matrix, one row per new wing loading.
+	a, b, c = coefficients
+	k = np.sqrt(np.divide(np.atleast_1d(np.asarray(new_wing_loadings, dtype=float)), wing_loading))
+	return np.column_stack((a / k, np.full_like(k, b), c * k))
+
+def quadratic_min_sink_rate(coefficients, speed_scale = 1):
+	# (speed, sink rate, L/D) at the min sink rate of a quadratic polar taking the speed divided by speed_scale
+	msr_speed, msr_vz = solvers.vertex(*coefficients)
+	msr_speed = msr_speed * speed_scale
+	return msr_speed, msr_vz, -msr_speed/(KM_TO_MS*msr_vz)
+
+def quadratic_max_glide_ratio(coefficients, speed_scale = 1):
+	# (speed, sink rate, L/D) at the max glide ratio of a quadratic polar, see quadratic_min_sink_rate()
+	mgr_speed, mgr_vz, _ = solvers.tangent_through_origin(*coefficients)
+	mgr_speed = mgr_speed * speed_scale
+	return mgr_speed, mgr_vz, -mgr_speed/(KM_TO_MS*mgr_vz)
+
 class PolarGlider(ABC):
+	speed_scale = 1			# the polynomial takes the speed divided by speed_scale
+
 	def __init__(self, name, source, wing_area, max_ballast, wing_loading = None, weight = None):
 		if (wing_area <= 0): 
 			raise ValueError('Invalide wing area, value (must be  > 0)')
@@ -51,28 +88,20 @@ class PolarGlider(ABC):
 		self.init_wing_loading = self.wing_loading
 
 	def update_wing_loading(self, new_wing_loading):
-		# if self.spec['method'] == 'ABC':
-		# 	x = [self.spec["A"],self.spec["B"], self.spec["C"]]
-		# 	y = self.polynomial(x)
-		# elif self.spec['method'] == '3-points':
-		# 	x = [xaxis_unit(s) for s in self.spec['speed']]
-		# 	y = self.spec['sink_rate']
-		# else:
-		# 	raise Exception('Unknow glider polar method: {}'.format(self.spec['method']))
-
-		x = np.linspace(POLAR_CURVE_START,POLAR_CURVE_END,POLAR_CURVE_NBR_SAMPLE)
-		y = self.curve(x)
-
-		new_x = [ vi * math.sqrt(new_wing_loading/self.wing_loading) for vi in x]
-		new_y = [ vz * math.sqrt(new_wing_loading/self.wing_loading) for vz in y]
-		
-		# update the polynomial
+		self.polynomial = np.poly1d(self.coefficients_at_wing_loadings(new_wing_loading)[0])
 		self.wing_loading = new_wing_loading
-		self.polynomial = np.poly1d(np.polyfit(new_x, new_y, 2))
-		
+
+	def coefficients_at_wing_loadings(self, wing_loadings):
+		# one row of polynomial coefficients per wing loading, see wing_loading_coefficients()
+		return wing_loading_coefficients(self.polynomial.coefficients, self.wing_loading, wing_loadings)
+
 	def curve(self,x):
 		return self.polynomial(x)
 
+	def speed_coefficients(self):
+		# coefficients of the polar for a speed in xaxis_unit, whatever the method
+		return self.polynomial.coefficients
+
 	@abstractmethod
 	def method(self):
 		pass
@@ -81,68 +110,18 @@ class PolarGlider(ABC):
 		return self.init_polynomial(x)
 
 	def get_min_sink_rate(self):
-		a = self.polynomial.coefficients[0]
-		b = self.polynomial.coefficients[1]
-		c = self.polynomial.coefficients[2]
-
-		msr_speed = -b/(2*a) 
-		msr_vz = a * np.power(msr_speed,2) +b* msr_speed + c
-		msr_ld = -msr_speed/(KM_TO_MS*msr_vz)
-
-		return msr_speed, msr_vz, msr_ld
+		return quadratic_min_sink_rate(self.polynomial.coefficients, self.speed_scale)
 
 	def get_max_glide_ratio(self):
-		a = self.polynomial.coefficients[0]
-		b = self.polynomial.coefficients[1]
-		c = self.polynomial.coefficients[2]
-
-		k = b - np.sqrt(4 * a * c)
-		mgr_speed = -(b - k) / (2 * a)
-		mgr_vz = a * np.power(mgr_speed,2) + b * mgr_speed + c
-		mgr_ld = -mgr_speed/(KM_TO_MS*mgr_vz)
-
-		return mgr_speed, mgr_vz, mgr_ld
+		return quadratic_max_glide_ratio(self.polynomial.coefficients, self.speed_scale)
 	
-	def __tangent_horizontal(self, f,fprime,x):
-		roots = fsolve(lambda x: fprime(x), x)
-		y = f(roots)
-		m = fprime(roots)
-		return y - m * (x - roots)
-
-	def __tangent_at_origin(self, f, fprime, x):
-		roots_estimate = 100,
-		roots =fsolve(lambda u: f(u) - fprime(u)*u, roots_estimate)
-		return fprime(roots)*x 
-
-	def __intersection(self, x, tangent, f, df):
-		roots = fsolve(lambda x: tangent(f,df,x) - f(x), x)
-		return roots, f(roots)
-
 	def tangent_horizontal(self, tg_x):
-		a = self.polynomial.coefficients[0]
-		b = self.polynomial.coefficients[1]
-		c = self.polynomial.coefficients[2]
-		
-		f = lambda x: a*np.power(x,2) + b*x + c
-		df = lambda x: 2*a*x + b
-
-		tgh_y = self.__tangent_horizontal(f, df, tg_x)
-		x_int, y_int = self.__intersection(100,self.__tangent_horizontal,f,df)
-
-		return tgh_y, x_int, y_int
+		a, b, c = self.polynomial.coefficients
+		return solvers.tangent_horizontal(a, b, c, tg_x)
 
 	def tangent_at_origin(self, tg_x):
-		a = self.polynomial.coefficients[0]
-		b = self.polynomial.coefficients[1]
-		c = self.polynomial.coefficients[2]
-		
-		f = lambda x: a*np.power(x,2) + b*x + c
-		df = lambda x: 2*a*x + b
-
-		tgao_y = self.__tangent_at_origin(f, df, tg_x)
-		x_int, y_int = self.__intersection(100,self.__tangent_at_origin,f,df)
-
-		return tgao_y, x_int, y_int
+		a, b, c = self.polynomial.coefficients
+		return solvers.tangent_at_origin(a, b, c, tg_x)
 
 	@staticmethod
 	def factory(config):
@@ -169,6 +148,17 @@ class PolarGlider(ABC):
 				config['wing_loading'] if 'wing_loading' in config else None,
 				config['weight'] if 'weight' in config else None 
 			)
+		elif (config['method'] =='by-hand'):
+			return PolarGliderByHand(
+				config['name'],
+				config['source'],
+				config['wing_area'],
+				config['max ballast'],
+				config['speed'],
+				config['sink_rate'],
+				config['wing_loading'] if 'wing_loading' in config else None,
+				config['weight'] if 'weight' in config else None
+			)
 		else:
 			raise Exception("Unkknow method {}.".format(config['method']))
 
@@ -185,7 +175,11 @@ class PolarGlider3Points(PolarGlider):
 	def method(self):
 		return '3-points'
 
+ABC_SPEED_SCALING = np.array([1e-4, 1e-2, 1])		# ABC polars take a speed divided by 100
+
 class PolarGliderABC(PolarGlider):
+	speed_scale = 100
+
 	def __init__(self, name, source, wing_area, max_ballast, a, b, c, wing_loading = None, weight = None ):
 		PolarGlider.__init__(self, name, source, wing_area, max_ballast, wing_loading , weight )
 		self.A = a
@@ -197,6 +191,9 @@ class PolarGliderABC(PolarGlider):
 
 	def curve(self,x):
 		return self.polynomial(np.divide(x,100))
+
+	def speed_coefficients(self):
+		return self.polynomial.coefficients * ABC_SPEED_SCALING
 	
 	def init_curve(self,x):
 		return self.init_polynomial(np.divide(x,100))
@@ -209,89 +206,641 @@ class PolarGliderABC(PolarGlider):
 		tgh_y, x_int, y_int = super().tangent_horizontal(np.divide(tg_x,100))
 		return tgh_y, x_int*100, y_int
 
-	def get_min_sink_rate(self):
-		a = self.polynomial.coefficients[0]
-		b = self.polynomial.coefficients[1]
-		c = self.polynomial.coefficients[2]
+	def method(self):
+		return 'ABC'
+
+BY_HAND_MODEL = fitting.DEFAULT_MODEL		# see glider.fitting.MODELS
 
-		msr_speed = -b/(2*a) * 100
-		msr_vz = a * np.power(msr_speed/100,2) +b*msr_speed/100 + c
+class PolarGliderByHand(PolarGlider):
+	# Polar given by many samples, fitted by one of the glider.fitting models. At the wing
+	# loading W' the curve is k.f(x/k), k = sqrt(W'/W), the same scaling as the quadratic
+	# polars, so the fitted model is shared by all the wing loadings. Min sink rate and max
+	# glide ratio are searched numerically over the speeds of the samples.
+	# polynomial is a least squares quadratic of the samples, for the features that only
+	# work with quadratic polars (speed_coefficients(), PolarBank, MacCready).
+	def __init__(self, name, source, wing_area, max_ballast, speed, sink_rate, wing_loading = None, weight = None, model = BY_HAND_MODEL, **options):
+		PolarGlider.__init__(self, name, source, wing_area, max_ballast, wing_loading , weight )
+		self.speed = speed
+		self.sink_rate = sink_rate
+		self.model = model
+
+		speeds_converted = [xaxis_unit(x) for x in speed]
+		self.fitted = fitting.fit(model, speeds_converted, sink_rate, **options)
+		self.speed_range = (min(speeds_converted), max(speeds_converted))
+
+		self.polynomial = np.poly1d(np.polyfit(speeds_converted, sink_rate, 2))
+		self.init_polynomial = self.polynomial
+
+	def scale(self):
+		return np.sqrt(self.wing_loading / self.init_wing_loading)
+
+	def curve(self, x):
+		k = self.scale()
+		return k * self.fitted(np.divide(x, k))
+
+	def init_curve(self, x):
+		return self.fitted(x)
+
+	def get_min_sink_rate(self):
+		k = self.scale()
+		msr_speed, msr_vz = solvers.maximize(self.curve, self.speed_range[0] * k, self.speed_range[1] * k)
 		msr_ld = -msr_speed/(KM_TO_MS*msr_vz)
 
 		return msr_speed, msr_vz, msr_ld
 
 	def get_max_glide_ratio(self):
-		a = self.polynomial.coefficients[0]
-		b = self.polynomial.coefficients[1]
-		c = self.polynomial.coefficients[2]
-
-		k = b - np.sqrt(4 * a * c)
-		mgr_speed = -(b - k) / (2 * a) * 100
-		mgr_vz = a * np.power(mgr_speed/100,2) + b * mgr_speed/100 + c
-		mgr_ld = -mgr_speed/(KM_TO_MS*mgr_vz)
+		k = self.scale()
+		glide_ratio = lambda x: np.divide(x, -KM_TO_MS * np.minimum(self.curve(x), -1e-9))
+		mgr_speed, mgr_ld = solvers.maximize(glide_ratio, self.speed_range[0] * k, self.speed_range[1] * k)
+		mgr_vz = self.curve(mgr_speed)
 
 		return mgr_speed, mgr_vz, mgr_ld
 
-	def update_wing_loading(self, new_wing_loading):
-		x = np.linspace(POLAR_CURVE_START,POLAR_CURVE_END,POLAR_CURVE_NBR_SAMPLE)
-		y = self.curve(x)
+	def tangent_horizontal(self, tg_x):
+		msr_speed, msr_vz, _ = self.get_min_sink_rate()
+		return np.full(np.shape(tg_x), msr_vz, dtype=float), np.array([msr_speed]), np.array([msr_vz])
 
-		new_x = [ vi/100 * math.sqrt(new_wing_loading/self.wing_loading) for vi in x]
-		new_y = [ vz * math.sqrt(new_wing_loading/self.wing_loading) for vz in y]
+	def tangent_at_origin(self, tg_x):
+		mgr_speed, mgr_vz, _ = self.get_max_glide_ratio()
+		return mgr_vz / mgr_speed * np.asarray(tg_x, dtype=float), np.array([mgr_speed]), np.array([mgr_vz])
 
-		# update the polynomial
-		self.wing_loading = new_wing_loading
-		self.polynomial = np.poly1d(np.polyfit(new_x, new_y, 2))
+	def method(self):
+		return 'by-hand'
+
+class PolarRecord:
+	# Immutable polar of a glider at one wing loading, the polars shared by the PolarCache
+	# between the threads of a worker. The polynomial is a plain (a, b, c) tuple of floats for
+	# a speed divided by speed_scale, like PolarGlider.polynomial, at_wing_loading() returns a
+	# new record. Min sink, max glide ratio and the tangent points are computed on first use
+	# and kept in their slot: threads racing on the first call compute the same value.
+	# The by-hand polars keep their fitted model (shared, read only), and are solved like
+	# PolarGliderByHand.
+	__slots__ = ('name', 'source', 'wing_area', 'max_ballast', 'init_wing_loading', 'wing_loading', 'speed_scale',
+		'init_coefficients', 'coefficients', 'fitted', 'speed_range', 'points',
+		'__method', '__min_sink_rate', '__max_glide_ratio', '__tangent_horizontal', '__tangent_at_origin')
+
+	def __init__(self, name, source, method, wing_area, max_ballast, init_wing_loading, wing_loading, speed_scale,
+			init_coefficients, coefficients, fitted = None, speed_range = None, points = None):
+		for slot, value in [('name', name), ('source', source), ('_PolarRecord__method', method), ('wing_area', wing_area),
+				('max_ballast', max_ballast), ('init_wing_loading', init_wing_loading), ('wing_loading', wing_loading),
+				('speed_scale', speed_scale), ('init_coefficients', init_coefficients), ('coefficients', coefficients),
+				('fitted', fitted), ('speed_range', speed_range), ('points', points)]:
+			object.__setattr__(self, slot, value)
+
+	@staticmethod
+	def from_polar(polar):
+		# record of a PolarGlider at its current wing loading
+		coefficients = tuple(float(c) for c in polar.polynomial.coefficients)
+		init_coefficients = tuple(float(c) for c in polar.init_polynomial.coefficients)
+		if init_coefficients == coefficients:
+			init_coefficients = coefficients
+		if len(coefficients) != 3 or len(init_coefficients) != 3:
+			raise ValueError('{} - {}, the polar is not a quadratic: {}'.format(polar.name, polar.source, coefficients))
+		points = (tuple(polar.speed), tuple(polar.sink_rate)) if hasattr(polar, 'speed') else None
+		return PolarRecord(polar.name, polar.source, polar.method(), polar.wing_area, polar.max_ballast,
+			polar.init_wing_loading, polar.wing_loading, polar.speed_scale, init_coefficients, coefficients,
+			getattr(polar, 'fitted', None), getattr(polar, 'speed_range', None), points)
+
+	@staticmethod
+	def from_entry(entry):
+		return PolarRecord.from_polar(PolarGlider.factory(entry))
+
+	def at_wing_loading(self, wing_loading):
+		# the same polar at another wing loading, scaled from the reference one like
+		# wing_loading_coefficients(), without numpy for a single wing loading
+		if wing_loading == self.init_wing_loading:
+			coefficients = self.init_coefficients
+		else:
+			a, b, c = self.init_coefficients
+			k = math.sqrt(wing_loading / self.init_wing_loading)
+			coefficients = (a / k, b, c * k)
+		return PolarRecord(self.name, self.source, self.__method, self.wing_area, self.max_ballast, self.init_wing_loading,
+			wing_loading, self.speed_scale, self.init_coefficients, coefficients, self.fitted, self.speed_range, self.points)
+
+	def __setattr__(self, name, value):
+		raise AttributeError('PolarRecord {} - {} is immutable'.format(self.name, self.source))
+
+	def __delattr__(self, name):
+		raise AttributeError('PolarRecord {} - {} is immutable'.format(self.name, self.source))
+
+	def __reduce__(self):
+		return (PolarRecord, (self.name, self.source, self.__method, self.wing_area, self.max_ballast, self.init_wing_loading,
+			self.wing_loading, self.speed_scale, self.init_coefficients, self.coefficients, self.fitted, self.speed_range, self.points))
+
+	def __key(self):
+		return (self.name, self.source, self.__method, self.wing_loading, self.coefficients)
+
+	def __eq__(self, other):
+		return isinstance(other, PolarRecord) and self.__key() == other.__key()
+
+	def __hash__(self):
+		return hash(self.__key())
+
+	def __repr__(self):
+		return 'PolarRecord({!r}, {!r}, {}, wing_loading={}, coefficients={})'.format(self.name, self.source, self.__method, self.wing_loading, self.coefficients)
 
 	def method(self):
-		return 'ABC'
+		return self.__method
+
+	def scale(self):
+		return np.sqrt(self.wing_loading / self.init_wing_loading)
+
+	def __polynomial(self, coefficients, x):
+		a, b, c = coefficients
+		x = np.divide(x, self.speed_scale) if self.speed_scale != 1 else np.asarray(x)
+		return (a * x + b) * x + c
+
+	def curve(self, x):
+		if self.fitted is not None:
+			k = self.scale()
+			return k * self.fitted(np.divide(x, k))
+		return self.__polynomial(self.coefficients, x)
+
+	def init_curve(self, x):
+		if self.fitted is not None:
+			return self.fitted(x)
+		return self.__polynomial(self.init_coefficients, x)
+
+	def speed_coefficients(self):
+		return np.array(self.coefficients) * ABC_SPEED_SCALING if self.speed_scale == 100 else np.array(self.coefficients)
+
+	def coefficients_at_wing_loadings(self, wing_loadings):
+		return wing_loading_coefficients(self.coefficients, self.wing_loading, wing_loadings)
+
+	def get_min_sink_rate(self):
+		try:
+			return self.__min_sink_rate
+		except AttributeError:
+			pass
+
+		if self.fitted is not None:
+			k = self.scale()
+			msr_speed, msr_vz = solvers.maximize(self.curve, self.speed_range[0] * k, self.speed_range[1] * k)
+			value = (float(msr_speed), float(msr_vz), float(-msr_speed/(KM_TO_MS*msr_vz)))
+		else:
+			value = tuple(float(v) for v in quadratic_min_sink_rate(self.coefficients, self.speed_scale))
+		object.__setattr__(self, '_PolarRecord__min_sink_rate', value)
+		return value
+
+	def get_max_glide_ratio(self):
+		try:
+			return self.__max_glide_ratio
+		except AttributeError:
+			pass
+
+		if self.fitted is not None:
+			k = self.scale()
+			glide_ratio = lambda x: np.divide(x, -KM_TO_MS * np.minimum(self.curve(x), -1e-9))
+			mgr_speed, mgr_ld = solvers.maximize(glide_ratio, self.speed_range[0] * k, self.speed_range[1] * k)
+			value = (float(mgr_speed), float(self.curve(mgr_speed)), float(mgr_ld))
+		else:
+			value = tuple(float(v) for v in quadratic_max_glide_ratio(self.coefficients, self.speed_scale))
+		object.__setattr__(self, '_PolarRecord__max_glide_ratio', value)
+		return value
+
+	def tangent_horizontal(self, tg_x):
+		try:
+			x_int, y_int = self.__tangent_horizontal
+		except AttributeError:
+			if self.fitted is not None:
+				x_int, y_int, _ = self.get_min_sink_rate()
+			else:
+				x_int, y_int = solvers.vertex(*self.coefficients)
+				x_int = x_int * self.speed_scale
+			object.__setattr__(self, '_PolarRecord__tangent_horizontal', (float(x_int), float(y_int)))
+		return np.full(np.shape(tg_x), y_int, dtype=float), np.array([x_int]), np.array([y_int])
+
+	def tangent_at_origin(self, tg_x):
+		try:
+			x_int, y_int, slope = self.__tangent_at_origin
+		except AttributeError:
+			if self.fitted is not None:
+				x_int, y_int, _ = self.get_max_glide_ratio()
+				slope = y_int / x_int
+			else:
+				x_int, y_int, slope = solvers.tangent_through_origin(*self.coefficients)
+				x_int, slope = x_int * self.speed_scale, slope / self.speed_scale
+			object.__setattr__(self, '_PolarRecord__tangent_at_origin', (float(x_int), float(y_int), float(slope)))
+		return slope * np.asarray(tg_x, dtype=float), np.array([x_int]), np.array([y_int])
+
+class PolarBank:
+	# Structure of arrays holding the polars of many gliders, to evaluate all of them in one
+	# broadcasted NumPy call. Coefficients are stored for a speed in xaxis_unit, the ABC
+	# polars being normalized like the 3-points ones. Row i of every array is glider i.
+	def __init__(self, entries, methods = ['3-points', 'ABC']):
+		self.rejected = []		# (label, reason) of the entries that cannot be used
+		valid = []
+		for entry in entries:
+			if entry['method'] not in methods:
+				continue
+			try:
+				if entry['wing_area'] <= 0:
+					raise ValueError('invalide wing area {}'.format(entry['wing_area']))
+				wing_loading = entry.get('wing_loading')
+				if wing_loading is None:
+					wing_loading = round(entry['weight'] / entry['wing_area'], 2)
+				if entry['method'] == '3-points':
+					# one bad system would make the batched solve below fail for all the polars
+					speeds, sink_rates = entry['speed'], entry['sink_rate']
+					if len(speeds) != 3 or len(sink_rates) != 3:
+						raise ValueError('{} speeds and {} sink rates instead of 3'.format(len(speeds), len(sink_rates)))
+					if len(set(speeds)) != 3:
+						raise ValueError('duplicate speeds {}'.format(speeds))
+				valid.append((entry, wing_loading))
+			except Exception as e:
+				self.rejected.append((PolarsDB.label(entry), repr(e)))
+
+		self.names = [entry['name'] for entry, _ in valid]
+		self.sources = [entry['source'] for entry, _ in valid]
+		self.methods = [entry['method'] for entry, _ in valid]
+		self.wing_area = np.array([entry['wing_area'] for entry, _ in valid], dtype=float)
+		self.max_ballast = np.array([entry['max ballast'] for entry, _ in valid], dtype=float)
+		self.wing_loading = np.array([wing_loading for _, wing_loading in valid], dtype=float)
+		self.coefficients = np.zeros((len(valid), 3))
+
+		abc = np.array([m == 'ABC' for m in self.methods], dtype=bool)
+		if abc.any():
+			self.coefficients[abc] = -np.array([[e['A'], e['B'], e['C']] for (e, _), is_abc in zip(valid, abc) if is_abc]) * ABC_SPEED_SCALING
+
+		# 3-points polars: solve all the Vandermonde systems at once instead of one np.polyfit each
+		points = ~abc
+		if points.any():
+			x = xaxis_unit(np.array([e['speed'] for (e, _), p in zip(valid, points) if p], dtype=float))
+			y = np.array([e['sink_rate'] for (e, _), p in zip(valid, points) if p], dtype=float)
+			self.coefficients[points] = np.linalg.solve(np.stack((x * x, x, np.ones_like(x)), axis=-1), y[..., None])[..., 0]
+
+		self.__index = {key: i for i, key in reversed(list(enumerate(zip(self.names, self.sources))))}
+
+	@staticmethod
+	def fromPolarsDB(polars_db, methods = ['3-points', 'ABC']):
+		return PolarBank(polars_db.polars_db, methods)
+
+	def __len__(self):
+		return len(self.names)
+
+	def index(self, glider_name, source):
+		return self.__index[(glider_name, source)]
+
+	def labels(self):
+		return ['{} / {}'.format(name, source) for name, source in zip(self.names, self.sources)]
+
+	def ballast_wing_loading(self, ballast = None):
+		# wing loading with the given ballast in kg (scalar or one per glider), max ballast by default
+		ballast = self.max_ballast if ballast is None else ballast
+		return self.wing_loading + np.divide(ballast, self.wing_area)
+
+	def coefficients_at(self, wing_loadings = None):
+		# (n,3) coefficients for a wing loading per glider (or the same for all), see wing_loading_coefficients()
+		if wing_loadings is None:
+			return self.coefficients
+		k = np.sqrt(np.divide(wing_loadings, self.wing_loading))
+		return np.column_stack((self.coefficients[:,0] / k, self.coefficients[:,1], self.coefficients[:,2] * k))
+
+	def __split(self, wing_loadings, ndim = 0):
+		# columns a, b, c reshaped to broadcast against ndim trailing dimensions
+		coefficients = self.coefficients_at(wing_loadings)
+		shape = (len(self),) + (1,) * ndim
+		return [coefficients[:,i].reshape(shape) for i in range(3)]
+
+	def sink_rate(self, speeds, wing_loadings = None):
+		# (n_gliders, n_speeds) sink rates
+		speeds = np.asarray(speeds, dtype=float)
+		a, b, c = self.__split(wing_loadings, speeds.ndim)
+		return (a * speeds + b) * speeds + c
+
+	def get_min_sink_rate(self, wing_loadings = None):
+		a, b, c = self.__split(wing_loadings)
+		msr_speed, msr_vz = solvers.vertex(a, b, c)
+		return msr_speed, msr_vz, -msr_speed/(KM_TO_MS*msr_vz)
+
+	def get_max_glide_ratio(self, wing_loadings = None):
+		a, b, c = self.__split(wing_loadings)
+		with np.errstate(invalid='ignore'):
+			mgr_speed, mgr_vz, _ = solvers.tangent_through_origin(a, b, c)
+		return mgr_speed, mgr_vz, -mgr_speed/(KM_TO_MS*mgr_vz)
+
+	def speed_to_fly(self, mac_cready = 0, netto = 0, wing_loadings = None):
+		# MacCready speed to fly: tangent to the polar moved by the airmass vertical speed
+		# netto (m/s, > 0 when rising) from the point (0, mac_cready), never slower than the
+		# min sink speed, see solvers.speed_to_fly(). mac_cready and netto broadcast against
+		# each other, the result has an extra leading glider dimension. The glide ratio over
+		# the ground is NaN when the glider does not descend (stf_vz + netto >= 0).
+		mc, netto = np.broadcast_arrays(np.asarray(mac_cready, dtype=float), np.asarray(netto, dtype=float))
+		a, b, c = self.__split(wing_loadings, mc.ndim)
+		stf_speed = solvers.speed_to_fly(a, b, c, mc - netto)
+		stf_vz = (a * stf_speed + b) * stf_speed + c
+		with np.errstate(divide='ignore', invalid='ignore'):
+			stf_ld = np.where(stf_vz + netto < 0, -stf_speed/(KM_TO_MS*(stf_vz + netto)), np.nan)
+		return stf_speed, stf_vz, stf_ld
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+class PolarCache:
+	def __init__(self, maxsize = POLAR_CACHE_SIZE, wing_loading_decimals = POLAR_CACHE_WL_DECIMALS):
+		if maxsize <= 0:
+			raise ValueError('Invalide cache size {} (must be > 0)'.format(maxsize))
+
+		self.maxsize = maxsize
+		self.wing_loading_decimals = wing_loading_decimals
+		self.__polars = OrderedDict()
+		self.__lock = threading.Lock()
+		self.hits = 0
+		self.misses = 0
+
+	def key(self, entry, wing_loading = None):
+		if wing_loading is not None:
+			wing_loading = round(wing_loading, self.wing_loading_decimals)
+		return (entry['name'], entry['source'], wing_loading)
+
+	def get(self, entry, wing_loading = None):
+		return self.__get(entry, self.key(entry, wing_loading), True)
+
+	def __get(self, entry, key, count):
+		# only the public get counts, the reference polar fetched for another wing loading doesn't
+		with self.__lock:
+			polar = self.__polars.get(key)
+			if polar is not None:
+				self.__polars.move_to_end(key)
+				if count:
+					self.hits += 1
+				return polar
+			if count:
+				self.misses += 1
+
+		# build outside of the lock, at worst two threads fit the same polar. The other wing
+		# loadings are derived from the record of the reference wing loading, never refitted
+		if key[2] is None:
+			polar = PolarRecord.from_entry(entry)
+		else:
+			polar = self.__get(entry, self.key(entry), False).at_wing_loading(key[2])
+
+		with self.__lock:
+			self.__polars[key] = polar
+			self.__polars.move_to_end(key)
+			while len(self.__polars) > self.maxsize:
+				self.__polars.popitem(last=False)
+		return polar
+
+	def resize(self, maxsize):
+		if maxsize <= 0:
+			raise ValueError('Invalide cache size {} (must be > 0)'.format(maxsize))
+		with self.__lock:
+			self.maxsize = maxsize
+			while len(self.__polars) > self.maxsize:
+				self.__polars.popitem(last=False)
+
+	def invalidate(self, glider_name, source):
+		# drop the polars of a glider, whatever their wing loading
+		with self.__lock:
+			for key in [k for k in self.__polars if k[0] == glider_name and k[1] == source]:
+				del self.__polars[key]
+
+	def clear(self):
+		with self.__lock:
+			self.__polars.clear()
+			self.hits = 0
+			self.misses = 0
+
+	def cache_info(self):
+		with self.__lock:
+			return CacheInfo(self.hits, self.misses, self.maxsize, len(self.__polars))
 
 class PolarsDB:
-	__instance = None
+	__registry = None
+
+	def __init__(self, json_file, version = 0):
+		self.filename = json_file
+		self.version = version			# incremented by PolarsRegistry at each reload, for the caches built on top of a DB
+
+		# either the json polars DB or a compiled catalog (see glider.catalog), memory mapped
+		if catalog.is_catalog(json_file):
+			self.polars_db = catalog.CatalogEntries(catalog.Catalog(json_file))
+			keys = self.polars_db.catalog.keys()
+		else:
+			with open(json_file) as json_file:
+				self.polars_db = json.load(json_file)
+			keys = [(entry['name'], entry['source'], entry['method']) for entry in self.polars_db]
+
+		self.polar_cache = PolarCache()
+		self.__build_indexes(keys)
+
+	def __build_indexes(self, keys):
+		self.__keys = []				# (name, source) of the entries in polars_db
+		self.__index_by_key = {}		# (name, source) -> position in polars_db
+		self.__index_by_method = {}		# method -> positions in polars_db
+		self.__index_by_name = {}		# name -> positions in polars_db
+		self.__search_index = None		# built on the first search()
+		self.duplicates = []
+
+		for position, (name, source, method) in enumerate(keys):
+			self.__index_entry(position, name, source, method)
+
+		if len(self.duplicates) > 0:
+			warnings.warn('{} duplicated entries in the polars DB, only the first one is used: {}'.format(
+				len(self.duplicates), ', '.join('{} / {}'.format(name, source) for name, source in self.duplicates)))
+
+	def __index_entry(self, position, name, source, method):
+		key = (name, source)
+		self.__keys.append(key)
+		if key in self.__index_by_key:
+			self.duplicates.append(key)
+			return False
+
+		self.__index_by_key[key] = position
+		self.__index_by_method.setdefault(method, []).append(position)
+		self.__index_by_name.setdefault(name, []).append(position)
+		return True
 
-	def __init__(self, json_file):
-		if PolarsDB.__instance is not None :
-			raise Exception("get_instance() has to be call to return an object.")
+	@staticmethod
+	def label(entry):
+		return '{} / {}'.format(entry['name'], entry['source'])
 
-		with open(json_file) as json_file:
-			self.polars_db = json.load(json_file)
+	def __label(self, position):
+		return '{} / {}'.format(*self.__keys[position])
 
 	def findByMethod(self, methods = ['3-points', 'ABC', 'by-hand']):
-		res= []
-		for x in self.polars_db:
-			if  x['method'] in methods:
-				res.append('{} / {}'.format(x['name'], x['source']))
-		return res
+		return [self.__label(p) for p in self.findIdsByMethod(methods)]
+
+	def findByName(self, glider_name):
+		return [self.__label(p) for p in self.__index_by_name.get(glider_name, [])]
+
+	def search(self, query, methods = None, limit = SEARCH_LIMIT):
+		# glider ids whose 'name / source' matches query, see glider.search
+		index = self.__search_index
+		if index is None:
+			labels = [None] * len(self.__keys)
+			methods_by_id = [None] * len(self.__keys)
+			for method, positions in self.__index_by_method.items():
+				for p in positions:
+					labels[p] = self.__label(p)
+					methods_by_id[p] = method
+			index = self.__search_index = GliderIndex(labels, methods_by_id)
+		return index.search(query, limit, methods)
+
+	def findIdsByMethod(self, methods = ['3-points', 'ABC', 'by-hand']):
+		# like findByMethod() but the glider ids, positions of the entries in polars_db that
+		# stay valid for this instance (a reloaded DB is a new PolarsDB, see PolarsRegistry)
+		return sorted(p for method in set(methods) for p in self.__index_by_method.get(method, []))
+
+	def gliderId(self, glider_name, source):
+		position = self.__index_by_key.get((glider_name, source))
+		if position is None:
+			raise Exception('No entry with glider name {} and source {}'.format(glider_name, source) )
+		return position
 
-	def fromNameAndSource(self, glider_name, source):
-		filtered_db = []
+	def isGliderId(self, glider_id):
+		# ids of duplicated entries are not valid, only the first entry of a key is indexed
+		return isinstance(glider_id, int) and 0 <= glider_id < len(self.__keys) and self.__index_by_key.get(self.__keys[glider_id]) == glider_id
 
-		# Iterate over all the items in dictionary
-		for elem in self.polars_db:
-			# Check if item satisfy the given condition then add to new dict
-			if elem['name'] == glider_name and elem['source'] == source:
-				filtered_db.append(elem)
+	def labelFromId(self, glider_id):
+		if not self.isGliderId(glider_id):
+			raise Exception('No entry with glider id {}'.format(glider_id))
+		return self.__label(glider_id)
 
-		if len(filtered_db) > 1:
-			raise Exception('More than one entry with glider name {} and source {}'.format(glider_name, source) )
-	
-		if len(filtered_db) == 0:
+	def entryFromId(self, glider_id):
+		if not self.isGliderId(glider_id):
+			raise Exception('No entry with glider id {}'.format(glider_id))
+		return self.polars_db[glider_id]
+
+	def entryFromNameAndSource(self, glider_name, source):
+		position = self.__index_by_key.get((glider_name, source))
+		if position is None:
 			raise Exception('No entry with glider name {} and source {}'.format(glider_name, source) )
+		return self.polars_db[position]
 
-		return PolarGlider.factory(filtered_db[0])
+	def fromNameAndSource(self, glider_name, source):
+		return PolarGlider.factory(self.entryFromNameAndSource(glider_name, source))
+
+	def cachedPolar(self, glider_name, source, wing_loading = None):
+		# shared read only polar, wing loading is rounded to POLAR_CACHE_WL_DECIMALS
+		return self.polar_cache.get(self.entryFromNameAndSource(glider_name, source), wing_loading)
+
+	def __writable_entries(self):
+		# compiled catalogs are read only: the first replacement of an entry decodes them into
+		# a list, with the same positions, that save() writes back in either format
+		if isinstance(self.polars_db, catalog.CatalogEntries):
+			self.polars_db = list(self.polars_db)
+		return self.polars_db
 
 	def add(self, new_polar):
 		self.polars_db.append(new_polar)
+		self.__search_index = None
+		if not self.__index_entry(len(self.polars_db) - 1, new_polar['name'], new_polar['source'], new_polar['method']):
+			warnings.warn('Duplicated entry {} in the polars DB, only the first one is used'.format(PolarsDB.label(new_polar)))
+
+	@staticmethod
+	def entry_hash(entry):
+		return hashlib.sha1(json.dumps(entry, sort_keys=True).encode('utf-8')).hexdigest()
+
+	def upsert(self, new_polar):
+		# add or replace the entry with the same name and source, return 'added', 'updated' or 'unchanged'
+		key = (new_polar['name'], new_polar['source'])
+		position = self.__index_by_key.get(key)
+		if position is None:
+			self.add(new_polar)
+			return 'added'
+
+		old_polar = self.polars_db[position]
+		if PolarsDB.entry_hash(old_polar) == PolarsDB.entry_hash(new_polar):
+			return 'unchanged'
+
+		self.__writable_entries()[position] = new_polar
+		if old_polar['method'] != new_polar['method']:
+			self.__index_by_method[old_polar['method']].remove(position)
+			bisect.insort(self.__index_by_method.setdefault(new_polar['method'], []), position)
+			self.__search_index = None
+		self.polar_cache.invalidate(*key)
+		return 'updated'
 	
 	def save (self, filename):
-		with open(filename, 'w', encoding ='utf8') as json_file:
-			json.dump(self.polars_db, json_file, indent = 2)
+		if filename.endswith(catalog.CATALOG_EXTENSION):
+			catalog.compile_entries(list(self.polars_db), filename)
+		else:
+			catalog.save_json(self.polars_db, filename)
 
 	@staticmethod
-	def get_instance(json_file = None):
-		if PolarsDB.__instance is None :
+	def get_registry(json_file = None, preload = True):
+		# with preload False the file is only loaded by the first get_instance()
+		if PolarsDB.__registry is None :
 			if (json_file is None):
 				raise ValueError('json file name cannot be null')
 
-			PolarsDB.__instance = PolarsDB(json_file)
-		return PolarsDB.__instance
+			PolarsDB.__registry = PolarsRegistry(json_file, preload = preload)
+		return PolarsDB.__registry
+
+	@staticmethod
+	def get_instance(json_file = None):
+		# the polars DB currently loaded, reloaded when the file changes (see PolarsRegistry)
+		return PolarsDB.get_registry(json_file).current()
+
+class PolarsRegistry:
+	# Holds the PolarsDB of a polars file and reloads it when the file is replaced (mtime,
+	# size or inode change, the writers use glider.catalog.atomic_open). Load it before the
+	# gunicorn workers are forked (gunicorn --preload), they then share the DB pages copy on
+	# write. The new DB is built aside and swapped in with a single assignment, callbacks
+	# running with the previous one keep it until they return, and they never wait on a reload.
+	# Without preload the file is loaded by the first call to current(), in each worker.
+	def __init__(self, filename, check_interval = POLARS_DB_CHECK_INTERVAL, preload = True):
+		self.filename = filename
+		self.check_interval = check_interval
+		self.reloads = 0
+		self.__signature = None
+		self.__db = None
+		self.__next_check = 0
+		self.__lock = threading.Lock()
+		os.register_at_fork(after_in_child=self.__after_fork)
+		if preload:
+			self.load()
+
+	def load(self):
+		# the DB, loaded now if it is not yet, the first requests wait for it
+		with self.__lock:
+			if self.__db is None:
+				self.__signature = self.__stat()
+				self.__db = PolarsDB(self.filename)
+				self.__next_check = time.monotonic() + self.check_interval
+		return self.__db
+
+	def __after_fork(self):
+		# the lock could have been held by another thread of the parent when it forked
+		self.__lock = threading.Lock()
+
+	def __stat(self):
+		st = os.stat(self.filename)
+		return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+	def current(self):
+		if self.__db is None:
+			return self.load()
+		if time.monotonic() >= self.__next_check:
+			self.check()
+		return self.__db
+
+	def check(self):
+		# reload the DB if the file has changed, return True when a new DB is in place
+		if not self.__lock.acquire(blocking=False):
+			return False		# another thread is already checking, keep serving the current DB
+
+		try:
+			if self.__db is None:
+				return False		# not loaded yet, load() reads the current file
+			self.__next_check = time.monotonic() + self.check_interval
+			try:
+				signature = self.__stat()
+			except OSError:
+				return False
+			if signature == self.__signature:
+				return False
+
+			self.__signature = signature
+			try:
+				db = PolarsDB(self.filename, self.__db.version + 1)
+			except Exception as e:
+				warnings.warn('Cannot reload the polars DB {}, keep the current one => {}'.format(self.filename, e))
+				return False
+
+			self.__db = db
+			self.reloads += 1
+			return True
+		finally:
+			self.__lock.release()
@@ -0,0 +1,227 @@
+import os
+import sys
+import time
+import hashlib
+import argparse
+import threading
+
+import numpy as np
+
+import glider.polar as gp
+from glider import catalog
+from glider import validation
+
+# Fleet comparison matrix: the sink rate of every glider of the polars DB over a grid of
+# (wing loading x speed), precomputed once and saved next to the polars DB, so that "which
+# glider is best at 140 km/h with 40 kg/m2" is a slice of the matrix instead of a polar
+# built per glider and per request.
+#
+# - the quadratic polars are scaled to all the wing loadings at once with the sqrt scaling
+#   of update_wing_loading(), y = a/k.x^2 + b.x + c.k, k = sqrt(W'/W)
+# - the by-hand polars are k.f(x/k), NaN outside of their samples scaled by k
+# - at a given speed the glide ratio is -speed / (3.6 x sink rate): ranking by glide ratio
+#   or by sink rate is the same order, only the sink rate is stored (float32)
+# - the wing loadings a glider can fly are from its reference wing loading to the one with
+#   its max ballast, ranks only keep these gliders unless reachable is False
+# - the entries with a glider.validation error (not a concave quadratic, min sink speed or
+#   best glide ratio out of range...) are not in the matrix
+#
+# The file is a .npz (uncompressed) with the axes, the glider ids (positions in the polars
+# DB) and a digest of the entries it was built from, a file that does not match the polars
+# DB is ignored and the matrix is built in memory. Build it with python -m glider.ranking.
+
+SPEED_AXIS = np.arange(60, 250.1, 5)			# km/h
+WING_LOADING_AXIS = np.arange(20, 65.1, 1)		# kg/m2
+MATRIX_EXTENSION = '.fleet.npz'
+MATRIX_VERSION = 2			# rows kept in the matrix, in the digest with the by-hand model so that older files are rebuilt
+RANK_LIMIT = 10
+
+def matrix_filename(polars_db_file):
+	# glider-polars-db.json -> glider-polars-db.fleet.npz
+	return os.path.splitext(polars_db_file)[0] + MATRIX_EXTENSION
+
+def digest(polars_db):
+	# sha1 of the entries of the polars DB, in their order
+	h = hashlib.sha1('{} {}'.format(MATRIX_VERSION, gp.BY_HAND_MODEL).encode('ascii'))
+	for glider_id in polars_db.findIdsByMethod():
+		h.update(gp.PolarsDB.entry_hash(polars_db.entryFromId(glider_id)).encode('ascii'))
+	return h.hexdigest()
+
+class FleetMatrix:
+	def __init__(self, ids, methods, speeds, wing_loadings, sink_rate, wing_loading_range, digest = None):
+		self.ids = np.asarray(ids, dtype=np.int64)								# glider ids of the rows
+		self.methods = np.asarray(methods, dtype=np.uint8)						# index in catalog.METHODS
+		self.speeds = np.asarray(speeds, dtype=float)
+		self.wing_loadings = np.asarray(wing_loadings, dtype=float)
+		self.sink_rate = np.asarray(sink_rate, dtype=np.float32)				# (glider, wing loading, speed), m/s
+		self.wing_loading_range = np.asarray(wing_loading_range, dtype=float)	# (glider, 2), kg/m2
+		self.digest = digest
+		if self.sink_rate.shape != (len(self.ids), len(self.wing_loadings), len(self.speeds)):
+			raise ValueError('Fleet matrix of shape {} for {} gliders, {} wing loadings and {} speeds'.format(
+				self.sink_rate.shape, len(self.ids), len(self.wing_loadings), len(self.speeds)))
+
+	@staticmethod
+	def build(polars_db, speeds = SPEED_AXIS, wing_loadings = WING_LOADING_AXIS):
+		# matrix of all the gliders of the polars DB, the entries that are not valid polars are left out
+		speeds = np.asarray(speeds, dtype=float)
+		wing_loadings = np.asarray(wing_loadings, dtype=float)
+		glider_ids = polars_db.findIdsByMethod()
+		entries = [polars_db.entryFromId(glider_id) for glider_id in glider_ids]
+		invalid = validation.invalid_rows(validation.validate(entries))
+		glider_ids = [glider_id for row, glider_id in enumerate(glider_ids) if row not in invalid]
+		entries = [entry for row, entry in enumerate(entries) if row not in invalid]
+		positions = {(entry['name'], entry['source']): glider_id for entry, glider_id in zip(entries, glider_ids)}
+
+		rows = []		# (glider id, method, sink rates, wing loading range)
+		bank = gp.PolarBank(entries)
+		if len(bank) > 0:
+			# (glider, wing loading, 1) scaling factors against (1, 1, speed)
+			k = np.sqrt(wing_loadings[np.newaxis, :] / bank.wing_loading[:, np.newaxis])[..., np.newaxis]
+			a, b, c = (bank.coefficients[:, i, np.newaxis, np.newaxis] for i in range(3))
+			sink_rate = a / k * speeds * speeds + b * speeds + c * k
+			ranges = np.column_stack((bank.wing_loading, bank.ballast_wing_loading()))
+			for i, key in enumerate(zip(bank.names, bank.sources)):
+				rows.append((positions[key], catalog.METHODS.index(bank.methods[i]), sink_rate[i], ranges[i]))
+
+		for entry in entries:
+			if entry['method'] != 'by-hand':
+				continue
+			try:
+				record = gp.PolarRecord.from_entry(entry)
+			except Exception:
+				continue
+			k = np.sqrt(wing_loadings / record.init_wing_loading)[:, np.newaxis]
+			u = speeds / k
+			with np.errstate(invalid='ignore'):
+				sink_rate = np.where((u >= record.speed_range[0]) & (u <= record.speed_range[1]), k * record.fitted(u), np.nan)
+			max_wing_loading = record.init_wing_loading + record.max_ballast / record.wing_area
+			rows.append((positions[(entry['name'], entry['source'])], catalog.METHODS.index('by-hand'), sink_rate, (record.init_wing_loading, max_wing_loading)))
+
+		rows.sort(key=lambda row: row[0])
+		ids = [row[0] for row in rows]
+		return FleetMatrix(ids, [row[1] for row in rows], speeds, wing_loadings,
+			np.array([row[2] for row in rows], dtype=np.float32).reshape(len(rows), len(wing_loadings), len(speeds)),
+			np.array([row[3] for row in rows], dtype=float).reshape(len(rows), 2),
+			digest(polars_db))
+
+	def save(self, filename):
+		with catalog.atomic_open(filename, 'wb') as f:
+			np.savez(f, ids=self.ids, methods=self.methods, speeds=self.speeds, wing_loadings=self.wing_loadings,
+				sink_rate=self.sink_rate, wing_loading_range=self.wing_loading_range, digest=np.array(self.digest or ''))
+
+	@staticmethod
+	def load(filename):
+		with np.load(filename) as data:
+			return FleetMatrix(data['ids'], data['methods'], data['speeds'], data['wing_loadings'], data['sink_rate'],
+				data['wing_loading_range'], str(data['digest']) or None)
+
+	def __len__(self):
+		return len(self.ids)
+
+	def nearest(self, axis, value):
+		# index of the value of an axis (0 wing loading, 1 speed) nearest to value
+		values = self.wing_loadings if axis == 0 else self.speeds
+		return int(np.argmin(np.abs(values - value)))
+
+	def rank(self, speed, wing_loading, limit = RANK_LIMIT, methods = None, reachable = True):
+		# (glider ids, sink rates, glide ratios) of the limit best gliders at the nearest speed
+		# and wing loading of the axes, best first
+		sink_rate = self.sink_rate[:, self.nearest(0, wing_loading), self.nearest(1, speed)]
+		# NaN out of the samples of a by-hand polar, >= 0 for the polars that are not valid there
+		keep = sink_rate < 0
+		if methods is not None:
+			keep &= np.isin(self.methods, [catalog.METHODS.index(m) for m in methods])
+		if reachable:
+			keep &= (self.wing_loading_range[:, 0] <= wing_loading) & (wing_loading <= self.wing_loading_range[:, 1])
+		rows = np.flatnonzero(keep)
+
+		# sink rates are < 0, the best are the highest ones
+		if len(rows) > limit:
+			rows = rows[np.argpartition(-sink_rate[rows], limit)[:limit]]
+		rows = rows[np.argsort(-sink_rate[rows], kind='stable')]
+		speed = self.speeds[self.nearest(1, speed)]
+		with np.errstate(divide='ignore'):
+			glide_ratio = -speed / (gp.KM_TO_MS * sink_rate[rows].astype(float))
+		return self.ids[rows], sink_rate[rows].astype(float), glide_ratio
+
+class FleetRanking:
+	# fleet matrix of the current polars DB, reloaded when the polars DB is: from the file
+	# next to the polars DB when it matches it, built in memory otherwise
+	def __init__(self):
+		self.__key = None
+		self.__matrix = None
+		self.__lock = threading.Lock()
+		self.hits = 0
+		self.misses = 0
+
+	def matrix(self, polars_db = None):
+		polars_db = polars_db or gp.PolarsDB.get_instance()
+		key = (polars_db.filename, polars_db.version)
+		with self.__lock:
+			if self.__key == key:
+				self.hits += 1
+				return self.__matrix
+			self.misses += 1
+
+		# load or build outside of the lock, the requests on the current matrix are not blocked
+		# meanwhile. At worst two threads build the same matrix, the first one is kept.
+		matrix = None
+		filename = matrix_filename(polars_db.filename)
+		if os.path.exists(filename):
+			try:
+				matrix = FleetMatrix.load(filename)
+				if matrix.digest != digest(polars_db):
+					matrix = None
+			except Exception:
+				matrix = None
+		if matrix is None:
+			matrix = FleetMatrix.build(polars_db)
+		with self.__lock:
+			if self.__key == key:
+				return self.__matrix
+			# a slow build of an older version does not replace the matrix of a newer one
+			if self.__key is None or self.__key[0] != key[0] or self.__key[1] < key[1]:
+				self.__key, self.__matrix = key, matrix
+		return matrix
+
+	def rank(self, speed, wing_loading, limit = RANK_LIMIT, methods = None, reachable = True, polars_db = None):
+		return self.matrix(polars_db).rank(speed, wing_loading, limit, methods, reachable)
+
+	def clear(self):
+		with self.__lock:
+			self.__key = None
+			self.__matrix = None
+			self.hits = 0
+			self.misses = 0
+
+	def cache_info(self):
+		with self.__lock:
+			return gp.CacheInfo(self.hits, self.misses, 1, 0 if self.__matrix is None else 1)
+
+def main(argv):
+	parser = argparse.ArgumentParser(prog='python -m glider.ranking', description='Build the fleet comparison matrix of a polars DB, or rank its gliders.')
+	parser.add_argument('--db', default='./glider-polars-db.json', help='polars DB (json or compiled catalog)')
+	parser.add_argument('--output', help='matrix file (default: next to the polars DB, {})'.format(MATRIX_EXTENSION))
+	parser.add_argument('--speed', type=float, help='rank the gliders at this speed (km/h) instead of building the matrix')
+	parser.add_argument('--wing-loading', type=float, default=40, help='wing loading of the ranking, kg/m2')
+	parser.add_argument('--limit', type=int, default=RANK_LIMIT, help='number of gliders ranked')
+	parser.add_argument('--all', action='store_true', help='also rank the gliders that cannot fly at this wing loading')
+	args = parser.parse_args(argv)
+
+	start = time.perf_counter()
+	polars_db = gp.PolarsDB(args.db)
+	if args.speed is not None:
+		ids, sink_rate, glide_ratio = FleetRanking().rank(args.speed, args.wing_loading, args.limit, reachable=not args.all, polars_db=polars_db)
+		for i, (glider_id, vz, ld) in enumerate(zip(ids, sink_rate, glide_ratio)):
+			print('{:>3}. {:<40} {:>7.2f} m/s {:>6.1f}'.format(i + 1, polars_db.labelFromId(int(glider_id)), vz, ld))
+		return 0
+
+	matrix = FleetMatrix.build(polars_db)
+	output = args.output or matrix_filename(args.db)
+	matrix.save(output)
+	print('{}: {} gliders x {} wing loadings x {} speeds, {} bytes in {:.2f} s'.format(output, len(matrix), len(matrix.wing_loadings),
+		len(matrix.speeds), os.path.getsize(output), time.perf_counter() - start), file=sys.stderr)
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv[1:]))
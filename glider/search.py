@@ -0,0 +1,142 @@
+import re
+import bisect
+import unicodedata
+
+import numpy as np
+
+# Search of the gliders of the polars DB by name and source, for the dropdowns that load
+# their options as the user types. Labels ('name / source') are normalized (lower case,
+# without accents and punctuation) then indexed two ways:
+# - the sorted labels, the labels starting with the query are a bisect range of it
+# - the trigrams of the labels without their spaces ('ls8' finds 'LS-8'), a word of the query
+#   of 3 characters or more only checks the labels that have all its trigrams, shorter words
+#   check the labels with a word starting with them.
+# Results are the labels starting with the query, then the others containing all the words
+# of the query, in alphabetical order and capped to limit.
+
+SEARCH_LIMIT = 50
+CHECK_CHUNK = 256				# candidates checked at once
+
+_SEPARATORS = re.compile(r'[\W_]+')
+
+def normalize(text):
+	if not text.isascii():
+		text = ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+	return _SEPARATORS.sub(' ', text.lower()).strip()
+
+def trigrams(text):
+	# codes of the trigrams of the utf-8 bytes of text, substrings of text have a subset of them
+	data = np.frombuffer(text.encode('utf-8'), dtype=np.uint8).astype(np.int64)
+	return np.unique((data[:-2] << 16) | (data[1:-1] << 8) | data[2:])
+
+class GliderIndex:
+	def __init__(self, labels, methods):
+		# labels and methods are lists indexed by glider id, None for the ids that are not valid
+		ids = [i for i, label in enumerate(labels) if label is not None]
+		texts = [normalize(labels[i]) for i in ids]
+		order = sorted(range(len(ids)), key=lambda r: (texts[r], ids[r]))
+
+		# entries are numbered by rank, their position in alphabetical order
+		self.ids = np.array([ids[r] for r in order], dtype=np.int64)
+		self.methods = np.array([methods[ids[r]] for r in order], dtype=object)
+		self.__method_masks = {method: self.methods == method for method in set(self.methods)}
+		self.__texts = [texts[r] for r in order]
+		self.__compact = [text.replace(' ', '') for text in self.__texts]
+
+		# words of the labels, sorted, for the prefix search of the short words
+		words = [text.split() for text in self.__texts]
+		word_ranks = np.repeat(np.arange(len(words), dtype=np.int64), [len(w) for w in words])
+		words = np.array([w for text_words in words for w in text_words], dtype=str)
+		order = np.argsort(words, kind='stable')
+		self.__words = words[order].tolist()
+		self.__word_ranks = word_ranks[order]
+
+		# trigram postings of all the labels at once: trigram codes of the concatenated compact
+		# labels, without the ones that span two labels, then the sorted unique (code, rank) pairs
+		encoded = [text.encode('utf-8') for text in self.__compact]
+		lengths = np.array([len(e) for e in encoded], dtype=np.int64)
+		data = np.frombuffer(b''.join(encoded), dtype=np.uint8).astype(np.int64)
+		ranks = np.repeat(np.arange(len(encoded), dtype=np.int64), lengths)
+		offset = np.arange(len(data)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+		i = np.flatnonzero(offset < np.repeat(lengths, lengths) - 2)
+		keys = np.sort((((data[i] << 16) | (data[i + 1] << 8) | data[i + 2]) << 32) | ranks[i])
+		keys = keys[np.append(True, keys[1:] != keys[:-1])]
+		codes = keys >> 32
+		self.__trigram_starts = np.flatnonzero(np.append(True, codes[1:] != codes[:-1]))
+		self.__trigram_ends = np.append(self.__trigram_starts[1:], len(keys))
+		self.__trigram_codes = codes[self.__trigram_starts]
+		self.__trigram_ranks = keys & 0xffffffff
+
+	def __postings(self, code):
+		# ranks of the labels with this trigram, in increasing order
+		i = np.searchsorted(self.__trigram_codes, code)
+		if i == len(self.__trigram_codes) or self.__trigram_codes[i] != code:
+			return np.array([], dtype=np.int64)
+		return self.__trigram_ranks[self.__trigram_starts[i]:self.__trigram_ends[i]]
+
+	def __len__(self):
+		return len(self.ids)
+
+	def __prefix_ranks(self, word):
+		# ranks of the entries with a word starting with word
+		lo = bisect.bisect_left(self.__words, word)
+		hi = bisect.bisect_left(self.__words, word + '\uffff')
+		return np.unique(self.__word_ranks[lo:hi])
+
+	def __word_candidates(self, word):
+		# ranks that may contain word, in increasing order: the labels with a word starting with
+		# a short word, or the rarest trigram of a longer one
+		if len(word) < 3:
+			return self.__prefix_ranks(word)
+		return min((self.__postings(code) for code in trigrams(word)), key=len)
+
+	def __matches(self, rank, words):
+		text = self.__texts[rank]
+		for word in words:
+			if len(word) < 3:
+				if not (text.startswith(word) or (' ' + word) in text):
+					return False
+			elif word not in self.__compact[rank]:
+				return False
+		return True
+
+	def search(self, query, limit = SEARCH_LIMIT, methods = None):
+		# glider ids matching query, at most limit of them, all the gliders for an empty query
+		query = normalize(query or '')
+		allowed = None
+		if methods is not None:
+			allowed = np.zeros(len(self.ids), dtype=bool)
+			for method in methods:
+				if method in self.__method_masks:
+					allowed |= self.__method_masks[method]
+
+		if query == '':
+			ranks = np.arange(len(self.ids))
+			if allowed is not None:
+				ranks = ranks[allowed]
+			return self.ids[ranks[:limit]].tolist()
+
+		# labels starting with the query
+		lo = bisect.bisect_left(self.__texts, query)
+		hi = bisect.bisect_left(self.__texts, query + '\uffff')
+		first = np.arange(lo, hi)
+		if allowed is not None:
+			first = first[allowed[first]]
+		if len(first) >= limit:
+			return self.ids[first[:limit]].tolist()
+
+		# then the labels containing all the words of the query, the candidates of the most
+		# selective word are checked in order until there are enough results
+		words = query.split()
+		candidates = min((self.__word_candidates(word) for word in words), key=len)
+		others = []
+		for start in range(0, len(candidates), CHECK_CHUNK):
+			for rank in candidates[start:start + CHECK_CHUNK].tolist():
+				if (lo <= rank < hi) or (allowed is not None and not allowed[rank]):
+					continue
+				if self.__matches(rank, words):
+					others.append(rank)
+			if len(first) + len(others) >= limit:
+				others = others[:limit - len(first)]
+				break
+		return self.ids[np.concatenate((first, np.array(others, dtype=np.int64)))].tolist()
@@ -0,0 +1,75 @@
+import numpy as np
+
+# Closed-form solvers for a speed polar modeled as a quadratic y = a*x^2 + b*x + c
+# (a < 0 for a physically sensible polar). They replace the iterative root finding
+# previously done with scipy fsolve and are shared by all PolarGlider classes.
+# maximize() is the generic numeric counterpart, for the polars that are not quadratic.
+
+def vertex(a, b, c):
+	# point where the tangent is horizontal (min sink rate)
+	x = -b / (2 * a)
+	return x, c - b * b / (4 * a)
+
+def tangent_through_origin(a, b, c):
+	# tangent point u solves f(u) = f'(u) * u  <=>  a*u^2 = c, keep the positive speed
+	u = np.sqrt(c / a)
+	return u, a * u * u + b * u + c, 2 * a * u + b
+
+def speed_to_fly(a, b, c, lift):
+	# MacCready speed to fly: tangent point u of the polar from (0, lift), lift being the
+	# MacCready setting minus the airmass vertical speed, a*u^2 = c - lift. When (0, lift) is
+	# under the polar (c - lift > 0 for a < 0, the airmass rises faster than the glider sinks
+	# plus lift) there is no tangent, and the tangent point is never slower than the min sink
+	# speed: the speed is clamped to the vertex in both cases. NaN when a >= 0 (not a polar).
+	with np.errstate(divide='ignore', invalid='ignore'):
+		u = np.sqrt(np.maximum((c - lift) / a, 0))
+		return np.where(a < 0, np.maximum(u, -b / (2 * a)), np.nan)
+
+def tangent_horizontal(a, b, c, x):
+	x_int, y_int = vertex(a, b, c)
+	return np.full(np.shape(x), y_int, dtype=float), np.array([x_int]), np.array([y_int])
+
+def tangent_at_origin(a, b, c, x):
+	x_int, y_int, slope = tangent_through_origin(a, b, c)
+	return slope * np.asarray(x, dtype=float), np.array([x_int]), np.array([y_int])
+
+def fit_quadratics(x, y, scale = 100):
+	# (n,3) coefficients of the least squares quadratics of n sets of points. x is (points,),
+	# shared by all the sets, or (n, points), y is (n, points). The quadratics are fitted in
+	# u = (x - center) / scale to keep the systems well conditioned, then expanded.
+	x = np.asarray(x, dtype=float)
+	center = x.mean()
+	u = (x - center) / scale
+	y = np.asarray(y, dtype=float)
+	if u.ndim == 1:
+		# one design matrix for all the sets: a single product with its pseudo inverse
+		design = np.column_stack((u * u, u, np.ones_like(u)))
+		A, B, C = (y @ np.linalg.pinv(design).T).T
+	else:
+		# normal equations of all the sets, solved with the cofactors of their symmetric
+		# matrix [[s4, s3, s2], [s3, s2, s1], [s2, s1, s0]], points on the first axis
+		u, y = u.T, y.T
+		u2 = u * u
+		s0, s1, s2, s3, s4 = len(u), u.sum(axis=0), u2.sum(axis=0), (u2 * u).sum(axis=0), (u2 * u2).sum(axis=0)
+		t0, t1, t2 = y.sum(axis=0), (u * y).sum(axis=0), (u2 * y).sum(axis=0)
+		m00, m01, m02 = s2 * s0 - s1 * s1, s2 * s1 - s3 * s0, s3 * s1 - s2 * s2
+		m11, m12, m22 = s4 * s0 - s2 * s2, s2 * s3 - s4 * s1, s4 * s2 - s3 * s3
+		det = s4 * m00 + s3 * m01 + s2 * m02
+		A, B, C = (m00 * t2 + m01 * t1 + m02 * t0) / det, (m01 * t2 + m11 * t1 + m12 * t0) / det, (m02 * t2 + m12 * t1 + m22 * t0) / det
+	x0 = center / scale
+	return np.column_stack((A / scale ** 2, (B - 2 * A * x0) / scale, C - B * x0 + A * x0 * x0))
+
+def maximize(f, lo, hi, samples = 64, iterations = 4):
+	# (x, f(x)) at the max of f over [lo, hi], for any curve and not only the quadratic ones.
+	# f must be vectorized: a grid of samples points is evaluated in one call, then a finer
+	# grid around the best point, iterations times. lo and hi can be arrays, to solve many
+	# problems at once, f receiving then arrays with an extra trailing dimension.
+	lo, hi = np.broadcast_arrays(np.asarray(lo, dtype=float), np.asarray(hi, dtype=float))
+	t = np.linspace(0, 1, samples)
+	for _ in range(iterations):
+		x = lo[..., np.newaxis] + (hi - lo)[..., np.newaxis] * t
+		best = np.take_along_axis(x, np.argmax(f(x), axis=-1)[..., np.newaxis], axis=-1)[..., 0]
+		step = (hi - lo) / (samples - 1)
+		lo, hi = np.maximum(best - step, lo), np.minimum(best + step, hi)
+	x = (lo + hi) / 2
+	return x, f(x)
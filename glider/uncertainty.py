@@ -0,0 +1,228 @@
+import os
+import sys
+import time
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import glider.polar as gp
+from glider import solvers
+
+# Uncertainty of the polars: Monte Carlo on the points they are built from. The sink rates
+# (and optionally the speeds) of the points are perturbed by a gaussian error, a quadratic
+# is refitted to each perturbed set of points, and the spread of the min sink and best
+# glide of these quadratics gives their confidence intervals.
+#
+# - 3-points polars use their 3 points, by-hand polars their samples (least squares, like
+#   PolarGliderByHand.polynomial), ABC polars have no measured points and use the sink rates
+#   of their quadratic at REFERENCE_SPEEDS, the 3-points polar through them being the ABC one.
+# - all the refits are one vectorized solve: when only the sink rates are perturbed the
+#   design matrix is the same for all the samples and the coefficients are the product of
+#   its pseudo inverse with the (samples x points) matrix of sink rates, with perturbed
+#   speeds the 3x3 normal equations of all the samples are solved at once from their
+#   cofactors (see solvers.fit_quadratics).
+# - the polar at another wing loading W' is a/k.x^2 + b.x + c.k, k = sqrt(W'/W).
+# - samples are drawn in chunks of CHUNK_SIZE, each chunk with its own seed spawned from the
+#   seed of the run, so the result does not depend on the number of workers. A run of more
+#   than one chunk is computed by a process pool: its own one for the command line, the
+#   shared_executor() of the process for the Dash app, whose runs are capped at
+#   INTERACTIVE_SAMPLES so that each gunicorn worker runs at most SHARED_POOL_WORKERS
+#   processes whatever the number of users.
+#
+# Quadratics that are not polars (a >= 0, or no tangent from the origin) are not valid, their
+# fraction is reported and they are left out of the intervals.
+
+SINK_RATE_SIGMA = 0.05				# m/s, standard deviation of the error on the sink rates
+SPEED_SIGMA = 0.0					# km/h, standard deviation of the error on the speeds
+SAMPLES = 20000
+CHUNK_SIZE = 50000
+BAND_SAMPLES = 20000				# samples of the sink rate bands, more do not change them visibly
+CONFIDENCE = 0.9					# the intervals are the central CONFIDENCE of the samples
+INTERACTIVE_SAMPLES = 100000		# max samples of a run of the Dash app
+SHARED_POOL_WORKERS = 4				# processes of the pool shared by the runs of the Dash app
+REFERENCE_SPEEDS = [80, 120, 160]	# km/h, points of the ABC polars
+METRICS = ['min_sink_speed', 'min_sink_rate', 'min_sink_ld', 'best_glide_speed', 'best_glide_rate', 'best_glide_ratio']
+
+def polar_points(entry):
+	# (speeds, sink rates) the polar of entry is fitted to
+	if entry['method'] in ['3-points', 'by-hand']:
+		speeds = gp.xaxis_unit(np.array(entry['speed'], dtype=float))
+		return speeds, np.array(entry['sink_rate'], dtype=float)
+	polar = gp.PolarGlider.factory(entry)
+	speeds = np.array(REFERENCE_SPEEDS, dtype=float)
+	return speeds, polar.curve(speeds)
+
+def polar_metrics(coefficients):
+	# (n,6) min sink (speed, sink rate, L/D) and best glide (speed, sink rate, L/D), NaN for the
+	# quadratics that are not polars
+	a, b, c = coefficients.T
+	with np.errstate(divide='ignore', invalid='ignore'):
+		valid = a < 0
+		msr_speed, msr_vz = solvers.vertex(a, b, c)
+		mgr_speed, mgr_vz, _ = solvers.tangent_through_origin(a, b, c)
+		values = np.column_stack((msr_speed, msr_vz, -msr_speed / (gp.KM_TO_MS * msr_vz),
+			mgr_speed, mgr_vz, -mgr_speed / (gp.KM_TO_MS * mgr_vz)))
+	values[~valid | ~np.isfinite(values).all(axis=1) | (values[:, 5] <= 0)] = np.nan
+	return values
+
+def _monte_carlo_chunk(args):
+	# coefficients and metrics of a chunk of perturbed polars at the wing loading of the analysis
+	speeds, sink_rates, samples, sink_rate_sigma, speed_sigma, scale, seed = args
+	rng = np.random.default_rng(seed)
+	y = sink_rates + rng.normal(0, sink_rate_sigma, (samples, len(sink_rates))) if sink_rate_sigma > 0 else np.tile(sink_rates, (samples, 1))
+	x = speeds + rng.normal(0, speed_sigma, (samples, len(speeds))) if speed_sigma > 0 else speeds
+	coefficients = solvers.fit_quadratics(x, y) * scale
+	return coefficients, polar_metrics(coefficients)
+
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+def shared_executor():
+	# process pool shared by the runs of this process, created on first use
+	global _shared_pool
+	with _shared_pool_lock:
+		if _shared_pool is None:
+			_shared_pool = ProcessPoolExecutor(max_workers=SHARED_POOL_WORKERS)
+		return _shared_pool
+
+def _after_fork():
+	# a forked process (gunicorn worker) cannot use the pool of its parent, it creates its own
+	global _shared_pool, _shared_pool_lock
+	_shared_pool, _shared_pool_lock = None, threading.Lock()
+
+os.register_at_fork(after_in_child=_after_fork)
+
+class PolarUncertainty:
+	def __init__(self, entry, samples = SAMPLES, sink_rate_sigma = SINK_RATE_SIGMA, speed_sigma = SPEED_SIGMA, wing_loading = None,
+			seed = 0, workers = None, chunk_size = CHUNK_SIZE, executor = None):
+		if samples <= 0:
+			raise ValueError('Invalide number of samples {} (must be > 0)'.format(samples))
+		self.name = entry['name']
+		self.source = entry['source']
+		self.method = entry['method']
+		polar = gp.PolarGlider.factory(entry)
+		self.init_wing_loading = polar.init_wing_loading
+		self.wing_loading = polar.init_wing_loading if wing_loading is None else wing_loading
+		self.speeds, self.sink_rates = polar_points(entry)
+		if len(self.speeds) < 3:
+			raise ValueError('{} - {}, {} points, at least 3 are needed'.format(self.name, self.source, len(self.speeds)))
+
+		# the polar without error, then the perturbed ones
+		k = self.k = np.sqrt(self.wing_loading / polar.init_wing_loading)
+		self.__scale = np.array([1 / k, 1, k])
+		self.coefficients = solvers.fit_quadratics(self.speeds, self.sink_rates[np.newaxis])[0] * self.__scale
+		seeds = np.random.SeedSequence(seed).spawn((samples + chunk_size - 1) // chunk_size)
+		tasks = [(self.speeds, self.sink_rates, min(chunk_size, samples - i * chunk_size), sink_rate_sigma, speed_sigma, self.__scale, s)
+			for i, s in enumerate(seeds)]
+		if workers == 1 or len(tasks) <= 1:
+			chunks = [_monte_carlo_chunk(task) for task in tasks]
+		elif executor is not None:
+			chunks = list(executor.map(_monte_carlo_chunk, tasks))
+		else:
+			with ProcessPoolExecutor(max_workers=workers) as executor:
+				chunks = list(executor.map(_monte_carlo_chunk, tasks))
+		self.samples = np.concatenate([chunk[0] for chunk in chunks])		# (samples, 3) coefficients
+		self.metrics = np.concatenate([chunk[1] for chunk in chunks])		# (samples, 6), see METRICS
+		self.valid = ~np.isnan(self.metrics[:, 0])
+		self.nominal = polar_metrics(self.coefficients[np.newaxis])[0]
+
+	def points(self):
+		# the points at the wing loading of the analysis
+		return self.speeds * self.k, self.sink_rates * self.k
+
+	def invalid_fraction(self):
+		return 1 - np.count_nonzero(self.valid) / len(self.valid)
+
+	def interval(self, metric, confidence = CONFIDENCE):
+		# (low, median, high) of a metric of METRICS over the valid samples
+		values = self.metrics[self.valid, METRICS.index(metric)]
+		if len(values) == 0:
+			return (np.nan, np.nan, np.nan)
+		low, median, high = np.percentile(values, [50 * (1 - confidence), 50, 50 * (1 + confidence)])
+		return low, median, high
+
+	def summary(self, confidence = CONFIDENCE):
+		return {metric: self.interval(metric, confidence) for metric in METRICS}
+
+	def band(self, x, confidence = CONFIDENCE, max_samples = BAND_SAMPLES, chunk_size = CHUNK_SIZE):
+		# (low, median, high) sink rates at the speeds x over the first max_samples valid samples
+		# (the samples are independent, so they are a random subset), a block of speeds at a time
+		# so that the sampled curves stay within about chunk_size x 16 values
+		x = np.asarray(x, dtype=float)
+		samples = self.samples[self.valid][:max_samples]
+		bands = np.full((3, len(x)), np.nan)
+		if len(samples) == 0:
+			return tuple(bands)
+		a, b, c = (samples[:, i, np.newaxis] for i in range(3))
+		block = max(1, chunk_size * 16 // len(samples))
+		for start in range(0, len(x), block):
+			xs = x[start:start + block]
+			bands[:, start:start + block] = np.percentile((a * xs + b) * xs + c, [50 * (1 - confidence), 50, 50 * (1 + confidence)], axis=0)
+		return tuple(bands)
+
+def glider_uncertainties(polars_db, glider_name, wing_loading = None, executor = None, **options):
+	# uncertainty of all the sources of a glider, at the same wing loading when it is given. The
+	# sources share one process pool when their samples take more than one chunk: executor when
+	# it is given (left running), else one created for the call.
+	results, rejected = [], []
+	owned = executor is None and options.get('workers') != 1 and options.get('samples', SAMPLES) > options.get('chunk_size', CHUNK_SIZE)
+	if owned:
+		executor = ProcessPoolExecutor(max_workers=options.get('workers'))
+	try:
+		for label in polars_db.findByName(glider_name):
+			entry = polars_db.entryFromNameAndSource(*label.split(' / ', 1))
+			try:
+				results.append(PolarUncertainty(entry, wing_loading=wing_loading, executor=executor, **options))
+			except Exception as e:
+				rejected.append((label, repr(e)))
+	finally:
+		if owned:
+			executor.shutdown()
+	return results, rejected
+
+def main(argv):
+	parser = argparse.ArgumentParser(prog='python -m glider.uncertainty', description='Confidence intervals of the min sink and best glide of the polars of a glider.')
+	parser.add_argument('name', help='glider name, all its sources are analyzed')
+	parser.add_argument('--db', default='./glider-polars-db.json', help='polars DB (json or compiled catalog)')
+	parser.add_argument('--samples', type=int, default=SAMPLES, help='number of perturbed polars per source')
+	parser.add_argument('--sink-rate-sigma', type=float, default=SINK_RATE_SIGMA, help='error on the sink rates, m/s')
+	parser.add_argument('--speed-sigma', type=float, default=SPEED_SIGMA, help='error on the speeds, km/h')
+	parser.add_argument('--wing-loading', type=float, help='compare the sources at this wing loading, kg/m2')
+	parser.add_argument('--confidence', type=float, default=CONFIDENCE, help='confidence of the intervals')
+	parser.add_argument('--seed', type=int, default=0)
+	parser.add_argument('--workers', type=int, default=None, help='number of processes')
+	parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='number of samples per task')
+	args = parser.parse_args(argv)
+	if args.samples <= 0:
+		parser.error('--samples must be > 0')
+	if args.chunk_size <= 0:
+		parser.error('--chunk-size must be > 0')
+	if args.sink_rate_sigma < 0 or args.speed_sigma < 0:
+		parser.error('--sink-rate-sigma and --speed-sigma must be >= 0')
+	if args.wing_loading is not None and args.wing_loading <= 0:
+		parser.error('--wing-loading must be > 0')
+	if not 0 < args.confidence < 1:
+		parser.error('--confidence must be between 0 and 1')
+
+	start = time.perf_counter()
+	polars_db = gp.PolarsDB(args.db)
+	results, rejected = glider_uncertainties(polars_db, args.name, args.wing_loading, samples=args.samples, sink_rate_sigma=args.sink_rate_sigma,
+		speed_sigma=args.speed_sigma, seed=args.seed, workers=args.workers, chunk_size=args.chunk_size)
+	if len(results) == 0 and len(rejected) == 0:
+		parser.error('no polar of {} in {}'.format(args.name, args.db))
+
+	print('{:<28} {:>8} {:>26} {:>26} {:>26} {:>8}'.format('source', 'kg/m2', 'min sink (m/s)', 'best L/D', 'best L/D speed (km/h)', 'invalid'))
+	for result in results:
+		summary = result.summary(args.confidence)
+		cell = lambda metric, fmt: '{} [{} - {}]'.format(*(fmt.format(v) for v in (summary[metric][1], summary[metric][0], summary[metric][2])))
+		print('{:<28} {:>8.1f} {:>26} {:>26} {:>26} {:>7.1%}'.format(result.source, result.wing_loading, cell('min_sink_rate', '{:.3f}'),
+			cell('best_glide_ratio', '{:.1f}'), cell('best_glide_speed', '{:.0f}'), result.invalid_fraction()))
+	for label, reason in rejected:
+		print('rejected {} => {}'.format(label, reason), file=sys.stderr)
+	print('{} sources x {} samples in {:.2f} s'.format(len(results), args.samples, time.perf_counter() - start), file=sys.stderr)
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,293 @@
+import re
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+import glider.polar as gp
+from glider import catalog
+from glider import solvers
+
+# Validation of polars DB entries, in one batch: the schema is checked row by row, then the
+# quadratic of every row (the fitted one for the 3-points and by-hand polars, see
+# solvers.fit_quadratics) is checked for all of them at once:
+#
+#	schema			required fields and types, wing area, wing loading / weight, points
+#	concavity		the polar must be a concave quadratic (a < 0)
+#	vertex			min sink speed within MIN_SINK_SPEED_RANGE and below the fastest point
+#	min_sink		min sink rate within MIN_SINK_RATE_RANGE
+#	glide_ratio		best glide ratio within GLIDE_RATIO_RANGE
+#	duplicate		same curve (within DUPLICATE_TOLERANCE at REFERENCE_WING_LOADING) as
+#					another row, or same name (ignoring case and punctuation) and source
+#	disagreement	best glide ratio or min sink of a source far from the median of the
+#					sources of the same glider (same name ignoring case and punctuation)
+#
+# Rows with an error cannot be used and must not reach the DB, warnings are reported only.
+# Rows of the reference entries (e.g. the DB an import goes to) take part in the duplicate
+# and disagreement checks but their own issues are not reported. Duplicates are found by
+# hashing the curves rounded to DUPLICATE_TOLERANCE and disagreements with a median per
+# group of names, so the run stays linear in the number of rows.
+
+MIN_SINK_SPEED_RANGE = (25, 150)		# km/h
+MIN_SINK_RATE_RANGE = (-1.5, -0.3)		# m/s
+GLIDE_RATIO_RANGE = (10, 75)
+REFERENCE_WING_LOADING = 40				# kg/m2, wing loading of the duplicate and disagreement checks
+DUPLICATE_SPEEDS = np.arange(70, 181, 10)	# km/h
+DUPLICATE_TOLERANCE = 0.01				# m/s
+DISAGREEMENT_GLIDE_RATIO = 0.15			# relative to the median of the sources
+DISAGREEMENT_MIN_SINK = 0.15			# m/s
+SEVERITIES = {
+	'schema': 'error',
+	'concavity': 'error',
+	'vertex': 'error',
+	'min_sink': 'warning',
+	'glide_ratio': 'error',
+	'duplicate': 'warning',
+	'disagreement': 'warning',
+}
+
+_NUMBER_TYPES = {int, float, np.float64, np.float32, np.int64, np.int32}
+_PUNCTUATION = re.compile(r'[^0-9a-z]')
+
+def normalized_name(name):
+	return _PUNCTUATION.sub('', name.lower())
+
+def _number(entry, key, positive = True):
+	value = entry.get(key)
+	if type(value) not in _NUMBER_TYPES or not np.isfinite(value):
+		raise ValueError('{} is {!r}, expecting a number'.format(key, value))
+	if positive and value <= 0:
+		raise ValueError('{} is {} (must be > 0)'.format(key, value))
+	return float(value)
+
+def check_schema(entry):
+	# (wing loading, speeds, sink rates) of a row, speeds and sink rates being None for the ABC
+	# polars. Raise ValueError on the first problem, the same ones PolarGlider would hit. The
+	# values of the points are checked by check_points(), for all the rows at once.
+	if not isinstance(entry, dict):
+		raise ValueError('expecting an object, got {!r}'.format(entry))
+	for key in ['name', 'source']:
+		if not isinstance(entry.get(key), str) or entry[key].strip() == '':
+			raise ValueError('{} is {!r}, expecting a non empty string'.format(key, entry.get(key)))
+	if entry.get('method') not in catalog.METHODS:
+		raise ValueError('method is {!r}, expecting one of {}'.format(entry.get('method'), ', '.join(catalog.METHODS)))
+	wing_area = _number(entry, 'wing_area')
+	if _number(entry, 'max ballast', positive=False) < 0:
+		raise ValueError('max ballast is {} (must be >= 0)'.format(entry['max ballast']))
+
+	wing_loading = _number(entry, 'wing_loading') if 'wing_loading' in entry else None
+	weight = _number(entry, 'weight') if 'weight' in entry else None
+	if wing_loading is None and weight is None:
+		raise ValueError('wing_loading or weight is needed')
+	if wing_loading is not None and weight is not None and weight / wing_area != wing_loading:
+		raise ValueError('wing loading is {}kg/m2 instead of {:0.2f}kg/m2 for a weight of {}kg'.format(wing_loading, weight / wing_area, weight))
+	if wing_loading is None:
+		wing_loading = round(weight / wing_area, 2)
+
+	if entry['method'] == 'ABC':
+		for key in ['A', 'B', 'C']:
+			_number(entry, key, positive=False)
+		return wing_loading, None, None
+
+	speeds, sink_rates = entry.get('speed'), entry.get('sink_rate')
+	if not isinstance(speeds, list) or not isinstance(sink_rates, list) or len(speeds) != len(sink_rates):
+		raise ValueError('speed and sink_rate must be lists of the same length')
+	if (entry['method'] == '3-points' and len(speeds) != 3) or len(speeds) < 3:
+		raise ValueError('{} points for a {} polar'.format(len(speeds), entry['method']))
+	if not all(type(v) in _NUMBER_TYPES for v in speeds) or not all(type(v) in _NUMBER_TYPES for v in sink_rates):
+		raise ValueError('speed and sink_rate must be numbers')
+	return wing_loading, speeds, sink_rates
+
+def check_points(speeds, sink_rates):
+	# (rows,) messages of the problems of (rows, points) speeds and sink rates, '' when none
+	messages = np.full(len(speeds), '', dtype=object)
+	finite = np.isfinite(speeds).all(axis=1) & np.isfinite(sink_rates).all(axis=1)
+	increasing = (speeds[:, 0] > 0) & (np.diff(speeds, axis=1) > 0).all(axis=1)
+	sinking = (sink_rates < 0).all(axis=1)
+	messages[~sinking] = 'sink rates must be < 0'
+	messages[~increasing] = 'speeds must be > 0 and increasing'
+	messages[~finite] = 'speed and sink_rate must be finite'
+	return messages
+
+def coefficients(rows):
+	# (n,3) quadratics of the rows (entry, speeds, sink rates), for a speed in xaxis_unit
+	result = np.zeros((len(rows), 3))
+	abc = np.array([speeds is None for _, speeds, _ in rows], dtype=bool)
+	if abc.any():
+		result[abc] = -np.array([[e['A'], e['B'], e['C']] for (e, _, _), is_abc in zip(rows, abc) if is_abc], dtype=float) * gp.ABC_SPEED_SCALING
+	# one least squares solve per number of points
+	points = np.array([0 if speeds is None else len(speeds) for _, speeds, _ in rows])
+	for n in np.unique(points[points > 0]):
+		group = np.flatnonzero(points == n)
+		x = gp.xaxis_unit(np.array([rows[i][1] for i in group], dtype=float))
+		y = np.array([rows[i][2] for i in group], dtype=float)
+		result[group] = solvers.fit_quadratics(x, y)
+	return result
+
+def _issue(row, entry, check, message, value = None):
+	return {'row': row, 'glider': gp.PolarsDB.label(entry) if isinstance(entry, dict) and 'name' in entry and 'source' in entry else None,
+		'check': check, 'severity': SEVERITIES[check], 'message': message, 'value': value}
+
+def _group_median(groups, values):
+	# median of values per group (groups are 0..n-1), NaN values left out
+	ok = ~np.isnan(values)
+	order = np.lexsort((values[ok], groups[ok]))
+	sorted_groups, sorted_values = groups[ok][order], values[ok][order]
+	medians = np.full(groups.max() + 1 if len(groups) else 0, np.nan)
+	starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]]) if len(sorted_groups) else np.array([], dtype=int)
+	counts = np.diff(np.r_[starts, len(sorted_groups)])
+	low, high = sorted_values[starts + (counts - 1) // 2], sorted_values[starts + counts // 2]
+	medians[sorted_groups[starts]] = (low + high) / 2
+	return medians
+
+def validate(entries, references = ()):
+	# issues of the rows of entries, in the order of the checks then of the rows
+	entries = list(entries)
+	rows = list(entries) + list(references)
+	issues = []
+
+	valid, parsed = [], []
+	for i, entry in enumerate(rows):
+		try:
+			wing_loading, speeds, sink_rates = check_schema(entry)
+			valid.append(i)
+			parsed.append((entry, speeds, sink_rates, wing_loading))
+		except ValueError as e:
+			if i < len(entries):
+				issues.append(_issue(i, entry, 'schema', str(e)))
+	if len(valid) == 0:
+		return issues
+
+	# values of the points, one array per number of points
+	points = np.array([0 if p[1] is None else len(p[1]) for p in parsed])
+	rejected = np.zeros(len(parsed), dtype=bool)
+	for n in np.unique(points[points > 0]):
+		group = np.flatnonzero(points == n)
+		messages = check_points(np.array([parsed[j][1] for j in group], dtype=float), np.array([parsed[j][2] for j in group], dtype=float))
+		for j, message in zip(group, messages):
+			if message != '':
+				rejected[j] = True
+				if valid[j] < len(entries):
+					issues.append(_issue(valid[j], parsed[j][0], 'schema', '{}: {} {}'.format(message, parsed[j][1], parsed[j][2])))
+	valid = [i for i, r in zip(valid, rejected) if not r]
+	parsed = [p for p, r in zip(parsed, rejected) if not r]
+	if len(valid) == 0:
+		return issues
+
+	valid = np.array(valid)
+	reported = valid < len(entries)
+	quadratics = coefficients([p[:3] for p in parsed])
+	a, b, c = quadratics.T
+	wing_loading = np.array([p[3] for p in parsed])
+	max_speed = np.array([np.inf if p[1] is None else max(p[1]) for p in parsed])
+
+	with np.errstate(divide='ignore', invalid='ignore'):
+		msr_speed, msr_vz = solvers.vertex(a, b, c)
+		mgr_speed, mgr_vz, _ = solvers.tangent_through_origin(a, b, c)
+		glide_ratio = -mgr_speed / (gp.KM_TO_MS * mgr_vz)
+
+	# physical sanity, in vectorized masks
+	concave = a < 0
+	checks = [
+		('concavity', ~concave, lambda j: ('not a concave quadratic, a = {:.3g}'.format(a[j]), float(a[j]))),
+		('vertex', concave & ~((msr_speed >= MIN_SINK_SPEED_RANGE[0]) & (msr_speed <= np.minimum(MIN_SINK_SPEED_RANGE[1], max_speed))),
+			lambda j: ('min sink speed {:.1f}km/h outside {}-{}km/h'.format(msr_speed[j], MIN_SINK_SPEED_RANGE[0], min(MIN_SINK_SPEED_RANGE[1], max_speed[j])), float(msr_speed[j]))),
+		('min_sink', concave & ~((msr_vz >= MIN_SINK_RATE_RANGE[0]) & (msr_vz <= MIN_SINK_RATE_RANGE[1])),
+			lambda j: ('min sink rate {:.2f}m/s outside {} to {}m/s'.format(msr_vz[j], *MIN_SINK_RATE_RANGE), float(msr_vz[j]))),
+		('glide_ratio', concave & ~((glide_ratio >= GLIDE_RATIO_RANGE[0]) & (glide_ratio <= GLIDE_RATIO_RANGE[1])),
+			lambda j: ('best glide ratio {:.1f} outside {}-{}'.format(glide_ratio[j], *GLIDE_RATIO_RANGE), None if np.isnan(glide_ratio[j]) else float(glide_ratio[j]))),
+	]
+	for check, failed, details in checks:
+		for j in np.flatnonzero(failed & reported):
+			message, value = details(j)
+			issues.append(_issue(int(valid[j]), parsed[j][0], check, message, value))
+	sane = concave & ~checks[1][1] & ~checks[3][1]
+
+	# near duplicates: curves at the same wing loading hashed on a grid of DUPLICATE_TOLERANCE,
+	# then compared to the first row of their bucket; and same normalized name and source
+	k = np.sqrt(REFERENCE_WING_LOADING / wing_loading)
+	curves = (a[:, None] / k[:, None] * DUPLICATE_SPEEDS + b[:, None]) * DUPLICATE_SPEEDS + c[:, None] * k[:, None]
+	sane_rows = np.flatnonzero(sane)
+	names = [normalized_name(p[0]['name']) for p in parsed]
+	if len(sane_rows) > 1:
+		_, buckets = np.unique(np.round(curves[sane_rows] / DUPLICATE_TOLERANCE).astype(np.int64), axis=0, return_inverse=True)
+		buckets = buckets.ravel()
+		order = np.lexsort((reported[sane_rows], buckets))		# reference rows lead their bucket
+		first = np.flatnonzero(np.r_[True, buckets[order][1:] != buckets[order][:-1]])
+		members, leaders = sane_rows[order], sane_rows[np.repeat(order[first], np.diff(np.r_[first, len(order)]))]
+		duplicate = (members != leaders) & reported[members] & (np.abs(curves[members] - curves[leaders]).max(axis=1) <= DUPLICATE_TOLERANCE)
+		for j, leader in zip(members[duplicate], leaders[duplicate]):
+			label = gp.PolarsDB.label(parsed[leader][0])
+			issues.append(_issue(int(valid[j]), parsed[j][0], 'duplicate', 'same polar as {}'.format(label), label))
+	seen = {}
+	for j in np.argsort(reported, kind='stable'):
+		entry = parsed[j][0]
+		leader = seen.setdefault((names[j], normalized_name(entry['source'])), j)
+		if leader != j and reported[j]:
+			label = gp.PolarsDB.label(parsed[leader][0])
+			issues.append(_issue(int(valid[j]), entry, 'duplicate', 'same glider and source as {}'.format(label), label))
+
+	# cross source disagreement, the best glide ratio does not depend on the wing loading
+	if len(sane_rows) > 1:
+		_, groups, sizes = np.unique(np.array(names, dtype=object)[sane_rows].astype(str), return_inverse=True, return_counts=True)
+		groups = groups.ravel()
+		ld_median = _group_median(groups, glide_ratio[sane_rows])
+		min_sink = msr_vz[sane_rows] * k[sane_rows]
+		sink_median = _group_median(groups, min_sink)
+		ld_gap = glide_ratio[sane_rows] / ld_median[groups] - 1
+		sink_gap = min_sink - sink_median[groups]
+		disagree = (sizes[groups] > 1) & ((np.abs(ld_gap) > DISAGREEMENT_GLIDE_RATIO) | (np.abs(sink_gap) > DISAGREEMENT_MIN_SINK))
+		for i in np.flatnonzero(disagree & reported[sane_rows]):
+			j, g = sane_rows[i], groups[i]
+			issues.append(_issue(int(valid[j]), parsed[j][0], 'disagreement',
+				'best glide ratio {:.1f} ({:+.0%}) and min sink {:.2f}m/s ({:+.2f}) at {}kg/m2 against the median of {} sources'.format(
+					glide_ratio[j], ld_gap[i], min_sink[i], sink_gap[i], REFERENCE_WING_LOADING, sizes[g]),
+				{'glide_ratio': float(ld_gap[i]), 'min_sink': float(sink_gap[i])}))
+	return issues
+
+def invalid_rows(issues):
+	# rows with at least one error
+	return {issue['row'] for issue in issues if issue['severity'] == 'error'}
+
+def report(issues, rows, elapsed = None):
+	# machine readable report of a validation run
+	counts = {check: 0 for check in SEVERITIES}
+	for issue in issues:
+		counts[issue['check']] += 1
+	invalid = invalid_rows(issues)
+	return {
+		'rows': rows,
+		'valid': rows - len(invalid),
+		'invalid': len(invalid),
+		'errors': sum(1 for issue in issues if issue['severity'] == 'error'),
+		'warnings': sum(1 for issue in issues if issue['severity'] == 'warning'),
+		'checks': counts,
+		'time': elapsed,
+		'issues': issues,
+	}
+
+def main(argv):
+	parser = argparse.ArgumentParser(prog='python -m glider.validation', description='Check the entries of a polars DB.')
+	parser.add_argument('--db', default='./glider-polars-db.json', help='polars DB (json or compiled catalog)')
+	parser.add_argument('--report', help='write the report to this json file')
+	parser.add_argument('--warnings', action='store_true', help='also print the warnings')
+	args = parser.parse_args(argv)
+
+	entries = list(catalog.CatalogEntries(catalog.Catalog(args.db))) if catalog.is_catalog(args.db) else catalog.load_json(args.db)
+	start = time.perf_counter()
+	issues = validate(entries)
+	result = report(issues, len(entries), time.perf_counter() - start)
+
+	for issue in issues:
+		if issue['severity'] == 'error' or args.warnings:
+			print('{:<7} {:<12} {} => {}'.format(issue['severity'], issue['check'], issue['glider'] or 'row {}'.format(issue['row']), issue['message']))
+	print('{} rows, {} invalid, {} errors, {} warnings in {:.1f} ms'.format(result['rows'], result['invalid'], result['errors'], result['warnings'], result['time'] * 1e3))
+	if args.report:
+		with open(args.report, 'w', encoding='utf8') as f:
+			json.dump(result, f, indent=2)
+	return 1 if result['errors'] > 0 else 0
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv[1:]))
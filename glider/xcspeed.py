@@ -0,0 +1,208 @@
+import sys
+import time
+import argparse
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import glider.polar as gp
+from glider import solvers
+from glider import maccready
+
+# Cross-country task speed simulator: the average speed over a task flown by climbing in
+# thermals and gliding between them at the speed to fly of a MacCready setting, over a grid
+# of (thermal strength x ballast x MacCready setting x inter-thermal airmass).
+#
+# - thermal strength is the rising speed of the air in the thermal, the glider climbs slower
+#   by its circling sink rate: its min sink rate at the wing loading divided by
+#   cos(bank)^1.5, so ballast costs climb rate.
+# - the glide between the thermals is flown at the speed of the tangent to the polar from
+#   (0, mc - netto), never slower than the min sink speed, netto being the vertical speed of
+#   the airmass (< 0 in sinking air), see maccready.solve_curve().
+# - task speed = V.climb / (climb + descent), descent = -(sink rate(V) + netto), 0 when the
+#   glider cannot climb and V when it does not need to.
+#
+# Any PolarGlider works: at the wing loading W' its curve is k.f(x/k), k = sqrt(W'/W), the
+# scaling of update_wing_loading(), so all the ballasts are solved at once with the
+# reference curve f. The speeds to fly do not depend on the thermal strength, they are
+# computed over (ballast x mc x netto) and broadcasted. TaskSpeedEngine keeps the grids of
+# the last used gliders, sweep() computes the grids of many gliders in a process pool.
+
+THERMAL_AXIS = np.arange(0.5, 5.01, 0.25)		# rising speed of the air in the thermals, m/s
+BALLAST_AXIS = np.linspace(0, 1, 11)				# fraction of the max ballast
+MC_AXIS = np.arange(0, 5.01, 0.25)				# MacCready setting, m/s
+NETTO_AXIS = np.arange(-2, 1.01, 0.25)			# airmass vertical speed between the thermals, m/s
+BANK_ANGLE = 40									# degrees, when circling in the thermals
+TASK_SPEED_CACHE_SIZE = 64
+CHUNK_SIZE = 16
+
+def circling_factor(bank_angle = BANK_ANGLE):
+	return np.cos(np.radians(bank_angle)) ** -1.5
+
+class TaskSpeedGrid:
+	def __init__(self, polar, thermal_axis = THERMAL_AXIS, ballast_axis = BALLAST_AXIS, mc_axis = MC_AXIS, netto_axis = NETTO_AXIS, bank_angle = BANK_ANGLE):
+		self.name = polar.name
+		self.source = polar.source
+		self.axes = [np.asarray(axis, dtype=float) for axis in (thermal_axis, ballast_axis, mc_axis, netto_axis)]
+		for axis in self.axes:
+			if len(axis) < 1 or np.any(np.diff(axis) <= 0):
+				raise ValueError('Task speed grid axes must be increasing with at least 1 value')
+		thermal, fraction, mc, netto = self.axes
+
+		self.ballast = polar.max_ballast * fraction											# kg
+		self.wing_loading = polar.init_wing_loading + self.ballast / polar.wing_area		# kg/m2
+		k = np.sqrt(self.wing_loading / polar.init_wing_loading)
+
+		# min sink of the reference curve, for the climb rate
+		lo, hi = getattr(polar, 'speed_range', None) or (gp.POLAR_CURVE_START, gp.POLAR_CURVE_END)
+		ms_vz = solvers.maximize(polar.init_curve, lo, hi)[1]
+
+		# speeds to fly over (ballast, mc, netto), km/h, and their sink rates in still air, m/s
+		self.speed, self.sink_rate = maccready.solve_curve(polar, mc[np.newaxis, :, np.newaxis],
+			self.wing_loading[:, np.newaxis, np.newaxis], netto[np.newaxis, np.newaxis, :])[:2]
+
+		self.climb_rate = thermal[:, np.newaxis] + circling_factor(bank_angle) * ms_vz * k	# (thermal, ballast), m/s
+		climb = self.climb_rate[:, :, np.newaxis, np.newaxis]
+		descent = -(self.sink_rate + netto)
+		with np.errstate(divide='ignore', invalid='ignore'):
+			xc_speed = np.where(descent > 0, self.speed * climb / (climb + descent), self.speed)
+		self.xc_speed = np.where(climb > 0, xc_speed, 0.0)								# (thermal, ballast, mc, netto), km/h
+
+	def nearest(self, axis, value):
+		# index of the value of an axis (0 thermal, 1 ballast, 2 mc, 3 netto) nearest to value
+		return int(np.argmin(np.abs(self.axes[axis] - value)))
+
+	def at(self, mac_cready, netto = 0):
+		# task speeds over (thermal, ballast) at the nearest MacCready setting and netto of the axes
+		return self.xc_speed[:, :, self.nearest(2, mac_cready), self.nearest(3, netto)]
+
+	def best(self, netto = 0):
+		# (task speed, mac cready) over (thermal, ballast) with the best MacCready setting of the axis
+		values = self.xc_speed[..., self.nearest(3, netto)]
+		i = np.argmax(values, axis=2)
+		return np.take_along_axis(values, i[..., np.newaxis], axis=2)[..., 0], self.axes[2][i]
+
+	def best_ballast(self, netto = 0):
+		# (ballast in kg, climb rate, task speed, mac cready) per thermal strength, with the best
+		# MacCready setting
+		values, mc = self.best(netto)
+		i = np.argmax(values, axis=1)
+		rows = np.arange(len(i))
+		return self.ballast[i], self.climb_rate[rows, i], values[rows, i], mc[rows, i]
+
+class TaskSpeedEngine:
+	def __init__(self, maxsize = TASK_SPEED_CACHE_SIZE, **axes):
+		if maxsize <= 0:
+			raise ValueError('Invalide cache size {} (must be > 0)'.format(maxsize))
+		self.maxsize = maxsize
+		self.axes = axes
+		self.__grids = OrderedDict()
+		self.__lock = threading.Lock()
+		self.hits = 0
+		self.misses = 0
+
+	def grid(self, glider_name, source, polars_db = None):
+		polars_db = polars_db or gp.PolarsDB.get_instance()
+		key = (glider_name, source, polars_db.version)
+		with self.__lock:
+			grid = self.__grids.get(key)
+			if grid is not None:
+				self.__grids.move_to_end(key)
+				self.hits += 1
+				return grid
+			self.misses += 1
+
+		grid = TaskSpeedGrid(polars_db.cachedPolar(glider_name, source), **self.axes)
+		with self.__lock:
+			self.__grids[key] = grid
+			while len(self.__grids) > self.maxsize:
+				self.__grids.popitem(last=False)
+		return grid
+
+	def clear(self):
+		with self.__lock:
+			self.__grids.clear()
+			self.hits = 0
+			self.misses = 0
+
+	def cache_info(self):
+		with self.__lock:
+			return gp.CacheInfo(self.hits, self.misses, self.maxsize, len(self.__grids))
+
+def _sweep_chunk(args):
+	entries, axes = args
+	grids, rejected = [], []
+	for entry in entries:
+		try:
+			grids.append(TaskSpeedGrid(gp.PolarGlider.factory(entry), **axes))
+		except Exception as e:
+			rejected.append((gp.PolarsDB.label(entry), repr(e)))
+	return grids, rejected
+
+def sweep(entries, workers = None, chunk_size = CHUNK_SIZE, **axes):
+	# (grids, rejected) of a list of polars DB entries, in their order, over a process pool
+	tasks = [(entries[i:i + chunk_size], axes) for i in range(0, len(entries), chunk_size)]
+	if workers == 1 or len(tasks) <= 1:
+		results = [_sweep_chunk(task) for task in tasks]
+	else:
+		with ProcessPoolExecutor(max_workers=workers) as executor:
+			results = list(executor.map(_sweep_chunk, tasks))
+	return [g for grids, _ in results for g in grids], [r for _, rejected in results for r in rejected]
+
+def best_ballast_table(grids, netto = 0):
+	# one row per (glider, thermal strength): the ballast and MacCready setting of the best task speed
+	import pandas as pd		# not needed by the Dash app, keep it out of its startup
+	frames = []
+	for grid in grids:
+		ballast, climb_rate, xc_speed, mc = grid.best_ballast(netto)
+		frames.append(pd.DataFrame({
+			'name': grid.name,
+			'source': grid.source,
+			'thermal': grid.axes[0],
+			'climb_rate': climb_rate,
+			'ballast': ballast,
+			'mac_cready': mc,
+			'xc_speed': xc_speed,
+			'xc_speed_empty': grid.best(netto)[0][:, 0],
+		}))
+	if len(frames) == 0:
+		return pd.DataFrame(columns=['name', 'source', 'thermal', 'climb_rate', 'ballast', 'mac_cready', 'xc_speed', 'xc_speed_empty'])
+	return pd.concat(frames, ignore_index=True)
+
+def main(argv):
+	from glider import fleet
+	parser = argparse.ArgumentParser(prog='python -m glider.xcspeed', description='Best ballast and MacCready setting per thermal strength, from simulated task speeds.')
+	parser.add_argument('output', nargs='?', help='csv or parquet file (default: csv on the standard output)')
+	parser.add_argument('--db', default='./glider-polars-db.json', help='polars DB (json or compiled catalog)')
+	parser.add_argument('--method', action='append', choices=fleet.METHODS, help='only the polars of this method, can be repeated')
+	parser.add_argument('--source', action='append', help='only the polars of this source, can be repeated')
+	parser.add_argument('--name', help='only the gliders whose name matches this regex')
+	parser.add_argument('--netto', type=float, default=0, help='airmass vertical speed between the thermals, m/s')
+	parser.add_argument('--bank-angle', type=float, default=BANK_ANGLE, help='bank angle in the thermals, degrees')
+	parser.add_argument('--workers', type=int, default=None, help='number of processes')
+	parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='number of polars per task')
+	args = parser.parse_args(argv)
+
+	start = time.perf_counter()
+	polars_db = gp.PolarsDB(args.db)
+	entries = fleet.select_entries(polars_db, args.method or fleet.METHODS, args.source, args.name)
+	grids, rejected = sweep(entries, args.workers, args.chunk_size, netto_axis=[args.netto], bank_angle=args.bank_angle)
+	table = best_ballast_table(grids, args.netto)
+
+	if args.output:
+		try:
+			fleet.write_table(table, args.output)
+		except ImportError as e:
+			parser.error('cannot write {}: {}'.format(args.output, e))
+	else:
+		table.to_csv(sys.stdout, index=False)
+
+	for label, reason in rejected:
+		print('rejected {} => {}'.format(label, reason), file=sys.stderr)
+	print('{} polars, {} rows, {} rejected in {:.2f} s'.format(len(entries), len(table), len(rejected), time.perf_counter() - start), file=sys.stderr)
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv[1:]))
@@ -1,43 +1,7 @@
-from urllib import request
-import re
-import glider.polar as gp
+import sys
+from glider import importer
 
-XCSOAR_POLARS_DATA_URL = 'https://raw.githubusercontent.com/XCSoar/XCSoar/master/src/Polar/PolarStore.cpp'
-
-# Load polars from json file
-polars_db = gp.PolarsDB.get_instance('./glider-polars-db.json')
-
-# Load XCSoar Polar Store
-data = request.urlopen(XCSOAR_POLARS_DATA_URL).read().decode('utf-8')
-print('Size of the glide polars db is {}'.format(len(polars_db.polars_db)))
-
-# regex_1 = r"({.*},)+"
-regex = r"_T\(\"(?P<glider>.*)\"\)[^,]*,\s*(?P<mass>[0-9-.]*)[^,]*,\s*(?P<max_ballast>[0-9-.]*)[^,]*,\s*(?P<speed1>[0-9-.]*)[^,]*,\s*(?P<sink_rate1>[0-9-.]*)[^,]*,\s*(?P<speed2>[0-9-.]*)[^,]*,\s*(?P<sink_rate2>[0-9-.]*)[^,]*,\s*(?P<speed3>[0-9-.]*)[^,]*,\s*(?P<sink_rate3>[0-9-.]*)[^,]*,\s*(?P<wing_area>[0-9-.]*)[^,]*,\s*(?P<max_speed>[0-9-.]*)[^,]*,"
-
-# Add xcsoar polars to the DB
-matches = re.finditer(regex, data, re.MULTILINE)
-for match in matches:
-	new_polar = dict()
-	try:
-		new_polar['name'] = match.group('glider')
-		new_polar['max ballast'] = float(match.group('max_ballast'))
-		new_polar['wing_area'] = float(match.group('wing_area'))
-		new_polar['method'] = '3-points'
-		new_polar['source'] = 'XCSoar'
-		new_polar['wing_loading'] = round(float(match.group('mass')) / float (match.group('wing_area')), 1)
-		new_polar['speed'] = [float(match.group('speed1')), float(match.group('speed2')), float(match.group('speed3'))]
-		new_polar['sink_rate'] = [float(match.group('sink_rate1')), float(match.group('sink_rate2')), float(match.group('sink_rate3'))]
-
-		# polars_db.polars_db.append(new_polar)
-		polars_db.add(new_polar)
-		print('Adding {}'.format(new_polar['name']))
-	except ZeroDivisionError as ze:
-		print('Error for {}, wing area is {} => {}'.format(new_polar['name'], match.group('wing_area'),ze))
-	except Exception as e:
-		print('Error for {} => {}'.format(new_polar['name'], e))
-	
-print('Size of the glide polars db is {}'.format(len(polars_db.polars_db)))
-
-# Save the polars db to json
-polars_db.save('./glider-polars-db.json')
-print('New Polars DB save to file xx')
+# Upsert the XCSoar polars into ./glider-polars-db.json, same as `python -m glider.importer xcsoar`.
+# A local copy of PolarStore.cpp can be given as argument.
+location = ['xcsoar={}'.format(sys.argv[1])] if len(sys.argv) > 1 else ['xcsoar']
+sys.exit(importer.main(location + sys.argv[2:]))
@@ -0,0 +1,72 @@
+import os
+import sys
+import shutil
+import warnings
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+import glider.polar as gp
+import ui.wl_effect as wl
+import check_clientside_parity as parity
+
+# assets/wl_effect.js against the python side over all the polars of the DB, see
+# benchmarks/check_clientside_parity.py. Needs node.js, skipped without it.
+#
+# usage: python -m pytest tests
+
+pytestmark = pytest.mark.skipif(shutil.which('node') is None, reason='node.js is not installed')
+
+METHODS = ['3-points', 'ABC', 'by-hand']
+COEFFICIENTS_AND_METRICS = """(wl_effect, c) => {
+	const p = wl_effect.coefficients_at(c.polar, c.wing_loading);
+	const m = wl_effect.metrics(c.polar, p);
+	return {coefficients: p, min_sink_rate: m.min_sink_rate, max_glide_ratio: m.max_glide_ratio};
+}"""
+
+@pytest.fixture(scope='module')
+def polars_db():
+	with warnings.catch_warnings():
+		warnings.simplefilter('ignore')
+		return gp.PolarsDB.get_instance(parity.DB_FILE)
+
+@pytest.mark.parametrize('method', wl.WL_EFFECT_METHODS)
+def test_wing_loading_mode(polars_db, method):
+	# traces, annotations and label of the slider moves, against the server side callback
+	with warnings.catch_warnings():
+		warnings.simplefilter('ignore')
+		checked, failures = parity.parity_failures(polars_db, [method])
+	assert checked > 0
+	assert failures == []
+
+@pytest.mark.parametrize('method', METHODS)
+def test_polar_glider(polars_db, method):
+	# coefficients, min sink and max glide ratio at each wing loading, against the PolarGlider
+	# classes. The by-hand ones search their fitted curve, the javascript has their least
+	# squares quadratic (PolarGliderByHand.polynomial) and is checked against it.
+	cases, expected = [], []
+	with warnings.catch_warnings():
+		warnings.simplefilter('ignore')		# the polars that are not concave have no max glide ratio
+		for label in polars_db.findByMethod([method]):
+			polar = gp.PolarGlider.factory(polars_db.entryFromNameAndSource(*label.split(' / ', 1)))
+			store = dict(coefficients=list(polar.init_polynomial.coefficients), wing_loading=polar.init_wing_loading, speed_scale=polar.speed_scale)
+			for wing_loading in parity.WING_LOADINGS:
+				polar.update_wing_loading(wing_loading)
+				coefficients = polar.polynomial.coefficients
+				if method == 'by-hand':
+					metrics = gp.quadratic_min_sink_rate(coefficients), gp.quadratic_max_glide_ratio(coefficients)
+				else:
+					metrics = polar.get_min_sink_rate(), polar.get_max_glide_ratio()
+				cases.append(dict(polar=store, wing_loading=wing_loading))
+				expected.append((label, wing_loading, coefficients) + metrics)
+	assert len(cases) > 0
+
+	failures = []
+	results = parity.run_node(COEFFICIENTS_AND_METRICS, cases)
+	for (label, wing_loading, coefficients, min_sink_rate, max_glide_ratio), result in zip(expected, results):
+		for key, values in [('coefficients', coefficients), ('min_sink_rate', min_sink_rate), ('max_glide_ratio', max_glide_ratio)]:
+			if not parity.same_numbers(values, result[key]):
+				failures.append('{} at {} kg/m2: {} {} != {}'.format(label, wing_loading, key, list(values), result[key]))
+	assert failures == []
@@ -0,0 +1,28 @@
+import os
+import sys
+import json
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+from glider import catalog
+from glider import validation
+
+# python -m glider.validation on the shipped polars DB and on its compiled catalog
+
+DB_FILE = os.path.join(ROOT, 'glider-polars-db.json')
+
+def run(db_file, report_file):
+	status = validation.main(['--db', db_file, '--report', str(report_file)])
+	with open(report_file, encoding='utf8') as f:
+		return status, json.load(f)
+
+def test_catalog_round_trip(tmp_path):
+	catalog_file = str(tmp_path / ('polars' + catalog.CATALOG_EXTENSION))
+	catalog.compile_entries(catalog.load_json(DB_FILE), catalog_file)
+
+	json_status, json_report = run(DB_FILE, tmp_path / 'json.report')
+	catalog_status, catalog_report = run(catalog_file, tmp_path / 'catalog.report')
+	assert catalog_report['rows'] == json_report['rows'] > 0
+	assert catalog_status == json_status
+	for key in ('valid', 'invalid', 'errors', 'warnings', 'checks', 'issues'):
+		assert catalog_report[key] == json_report[key]
@@ -0,0 +1,257 @@
+import json
+import math
+import hashlib
+import threading
+from collections import OrderedDict
+
+import flask
+import numpy as np
+
+import glider.polar as gp
+from ui import instrumentation
+from ui.instrumentation import section
+
+# JSON/HTTP API of the polars, on the flask server of the Dash app:
+#
+#	GET  /api/v1/gliders?q=ventus&method=ABC&limit=20
+#		[{'id', 'glider', 'method'}] matching q, see PolarsDB.search()
+#	POST /api/v1/polars
+#		{'queries': [{'glider': id or 'name / source', 'wing_loading': kg/m2 (optional, the
+#		reference one by default), 'speeds': [km/h, ...] (optional)}, ...]}
+#		-> {'version', 'results': [...]}, one result per query in their order: min sink and best
+#		glide of the polar at the wing loading and its sink rate and glide ratio at the speeds,
+#		or {'error'} for a query that cannot be answered.
+#
+# The queries of a batch are grouped by glider, each glider using its reference record of
+# the PolarCache: any polar at the wing loading W' is k.f(x/k) with k = sqrt(W'/W), f the
+# reference polar. The speeds of all the queries of the quadratic polars are evaluated in
+# one NumPy call, those of a by-hand polar in one call of its fitted model, and the min
+# sink and best glide, computed once per record, are only scaled by k. Sink rates and glide
+# ratios are rounded (SINK_RATE_DECIMALS, GLIDE_RATIO_DECIMALS). Responses are cached by
+# content of the batch and version of the polars DB. Flask views are synchronous,
+# concurrency comes from the gunicorn workers and threads.
+
+API_PREFIX = '/api/v1'
+API_MAX_QUERIES = 1000				# per batch
+API_MAX_SPEEDS = 1000				# per query
+API_SEARCH_LIMIT = 50
+API_CACHE_SIZE = 1024				# cached responses
+API_CACHE_MAX_BYTES = 1 << 20		# responses larger than this are not cached
+
+class ApiError(Exception):
+	def __init__(self, message, status = 400):
+		Exception.__init__(self, message)
+		self.status = status
+
+class ResponseCache:
+	def __init__(self, maxsize = API_CACHE_SIZE, max_bytes = API_CACHE_MAX_BYTES):
+		if maxsize <= 0:
+			raise ValueError('Invalide cache size {} (must be > 0)'.format(maxsize))
+		self.maxsize = maxsize
+		self.max_bytes = max_bytes
+		self.__responses = OrderedDict()
+		self.__lock = threading.Lock()
+		self.hits = 0
+		self.misses = 0
+
+	@staticmethod
+	def key(queries, version):
+		return (version, hashlib.sha1(json.dumps(queries, sort_keys=True).encode('utf-8')).digest())
+
+	def get(self, key):
+		with self.__lock:
+			body = self.__responses.get(key)
+			if body is None:
+				self.misses += 1
+				return None
+			self.__responses.move_to_end(key)
+			self.hits += 1
+			return body
+
+	def put(self, key, body):
+		if len(body) > self.max_bytes:
+			return
+		with self.__lock:
+			self.__responses[key] = body
+			self.__responses.move_to_end(key)
+			while len(self.__responses) > self.maxsize:
+				self.__responses.popitem(last=False)
+
+	def clear(self):
+		with self.__lock:
+			self.__responses.clear()
+			self.hits = 0
+			self.misses = 0
+
+	def cache_info(self):
+		with self.__lock:
+			return gp.CacheInfo(self.hits, self.misses, self.maxsize, len(self.__responses))
+
+response_cache = ResponseCache()
+
+def glider_id(polars_db, glider):
+	# glider id of a query, from an id or a 'name / source' label
+	if isinstance(glider, bool):
+		raise ApiError('Invalid glider {!r}'.format(glider))
+	if isinstance(glider, int):
+		if not polars_db.isGliderId(glider):
+			raise ApiError('No glider with id {}'.format(glider))
+		return glider
+	if isinstance(glider, str) and ' / ' in glider:
+		try:
+			return polars_db.gliderId(*glider.split(' / ', 1))
+		except Exception as e:
+			raise ApiError(str(e))
+	raise ApiError('Invalid glider {!r}, expecting an id or a "name / source" label'.format(glider))
+
+def _finite_number(value):
+	# json numbers, python's json also reads NaN and Infinity that are rejected here
+	return not isinstance(value, bool) and isinstance(value, (int, float)) and math.isfinite(value)
+
+def parse_query(polars_db, query):
+	# (glider id, wing loading or None, speeds array) of a query
+	if not isinstance(query, dict):
+		raise ApiError('Invalid query {!r}, expecting an object'.format(query))
+	unknown = set(query) - {'glider', 'wing_loading', 'speeds'}
+	if len(unknown) > 0:
+		raise ApiError('Unknown fields {}'.format(', '.join(sorted(unknown))))
+
+	wing_loading = query.get('wing_loading')
+	if wing_loading is not None and (not _finite_number(wing_loading) or not wing_loading > 0):
+		raise ApiError('Invalid wing loading {!r} (must be a finite number > 0)'.format(wing_loading))
+
+	speeds = query.get('speeds', [])
+	if not isinstance(speeds, list) or not all(_finite_number(s) for s in speeds):
+		raise ApiError('Invalid speeds, expecting a list of finite numbers')
+	if len(speeds) > API_MAX_SPEEDS:
+		raise ApiError('Too many speeds {} (max {})'.format(len(speeds), API_MAX_SPEEDS))
+	return glider_id(polars_db, query.get('glider')), wing_loading, np.asarray(speeds, dtype=float)
+
+SINK_RATE_DECIMALS = 4				# m/s
+GLIDE_RATIO_DECIMALS = 2
+SPEED_DECIMALS = 2					# km/h
+
+def json_values(values, decimals):
+	# list of rounded values, None for NaN and infinity that json does not have
+	values = np.round(values, decimals)
+	return np.where(np.isfinite(values), values, None).tolist()
+
+def evaluate(polars_db, queries):
+	# results of a batch of queries, in their order
+	results = [None] * len(queries)
+	groups = OrderedDict()		# glider id -> [(position, wing loading, speeds)]
+	for position, query in enumerate(queries):
+		try:
+			glider, wing_loading, speeds = parse_query(polars_db, query)
+			groups.setdefault(glider, []).append((position, wing_loading, speeds))
+		except ApiError as e:
+			results[position] = {'error': str(e)}
+
+	# one row per valid query, grouped by glider
+	rows = []		# (position, glider id, record, wing loading, speeds)
+	for glider, group in groups.items():
+		try:
+			record = polars_db.polar_cache.get(polars_db.entryFromId(glider))
+		except Exception as e:
+			for position, _, _ in group:
+				results[position] = {'error': 'Invalid polar: {}'.format(e)}
+			continue
+		for position, wing_loading, speeds in group:
+			rows.append((position, glider, record, record.init_wing_loading if wing_loading is None else wing_loading, speeds))
+	if len(rows) == 0:
+		return results
+
+	wing_loadings = np.array([row[3] for row in rows], dtype=float)
+	k = np.sqrt(wing_loadings / np.array([row[2].init_wing_loading for row in rows], dtype=float))
+	lengths = np.array([len(row[4]) for row in rows], dtype=np.int64)
+	ends = np.cumsum(lengths)
+	x = np.concatenate([row[4] for row in rows])
+	kx = np.repeat(k, lengths)
+
+	# the quadratic polars all at once: a/k.x^2 + b.x + c.k with the coefficients of each
+	# query, the by-hand ones with k.f(x/k) for all the speeds of each glider
+	sink_rate = np.empty(len(x))
+	coefficients = np.array([row[2].speed_coefficients() if row[2].fitted is None else (np.nan, np.nan, np.nan) for row in rows], dtype=float)
+	a, b, c = (np.repeat(coefficients[:, i], lengths) for i in range(3))
+	quadratic = ~np.isnan(a)
+	sink_rate[quadratic] = (a[quadratic] / kx[quadratic] * x[quadratic] + b[quadratic]) * x[quadratic] + c[quadratic] * kx[quadratic]
+	for glider in {row[1] for row in rows if row[2].fitted is not None}:
+		speeds = np.concatenate([np.arange(end - length, end) for row, end, length in zip(rows, ends, lengths) if row[1] == glider])
+		record = polars_db.polar_cache.get(polars_db.entryFromId(glider))
+		sink_rate[speeds] = kx[speeds] * record.init_curve(x[speeds] / kx[speeds])
+	with np.errstate(divide='ignore', invalid='ignore'):
+		glide_ratio = -x / (gp.KM_TO_MS * sink_rate)
+	sink_rate = json_values(sink_rate, SINK_RATE_DECIMALS)
+	glide_ratio = json_values(glide_ratio, GLIDE_RATIO_DECIMALS)
+
+	# min sink and best glide of the reference records (computed once per record), scaled by
+	# k: speeds and sink rates move with k, the glide ratio does not change
+	scale = np.array([k, k, np.ones_like(k)]).T
+	min_sink = np.array([row[2].get_min_sink_rate() for row in rows], dtype=float) * scale
+	best_glide = np.array([row[2].get_max_glide_ratio() for row in rows], dtype=float) * scale
+	decimals = [SPEED_DECIMALS, SINK_RATE_DECIMALS, GLIDE_RATIO_DECIMALS]
+	min_sink = list(zip(*(json_values(min_sink[:, i], decimals[i]) for i in range(3))))
+	best_glide = list(zip(*(json_values(best_glide[:, i], decimals[i]) for i in range(3))))
+
+	labels = {glider: polars_db.labelFromId(glider) for glider in groups}
+	for i, ((position, glider, record, _, speeds), wing_loading, end, length) in enumerate(zip(rows, wing_loadings.tolist(), ends.tolist(), lengths.tolist())):
+		results[position] = {
+			'id': glider,
+			'glider': labels[glider],
+			'method': record.method(),
+			'wing_loading': wing_loading,
+			'min_sink': dict(zip(('speed', 'sink_rate', 'glide_ratio'), min_sink[i])),
+			'best_glide': dict(zip(('speed', 'sink_rate', 'glide_ratio'), best_glide[i])),
+			'speeds': speeds.tolist(),
+			'sink_rate': sink_rate[end - length:end],
+			'glide_ratio': glide_ratio[end - length:end],
+		}
+	return results
+
+def json_response(data, status = 200):
+	return flask.Response(json.dumps(data, allow_nan=False), status=status, mimetype='application/json')
+
+def _api_error(e):
+	return json_response({'error': str(e)}, e.status)
+
+@instrumentation.instrument
+def api_gliders():
+	polars_db = gp.PolarsDB.get_instance()
+	try:
+		limit = int(flask.request.args.get('limit', API_SEARCH_LIMIT))
+	except ValueError:
+		raise ApiError('Invalid limit {!r}'.format(flask.request.args.get('limit')))
+	if limit < 1:
+		raise ApiError('Invalid limit {} (must be >= 1)'.format(limit))
+	limit = min(limit, API_SEARCH_LIMIT)
+	methods = flask.request.args.getlist('method') or None
+	with section('polar'):
+		ids = polars_db.search(flask.request.args.get('q', ''), methods, limit)
+		gliders = [{'id': i, 'glider': polars_db.labelFromId(i), 'method': polars_db.entryFromId(i)['method']} for i in ids]
+	return json_response({'version': polars_db.version, 'gliders': gliders})
+
+@instrumentation.instrument
+def api_polars():
+	body = flask.request.get_json(silent=True)
+	if not isinstance(body, dict) or not isinstance(body.get('queries'), list):
+		raise ApiError('Expecting a json object {"queries": [...]}')
+	queries = body['queries']
+	if len(queries) > API_MAX_QUERIES:
+		raise ApiError('Too many queries {} (max {})'.format(len(queries), API_MAX_QUERIES), 413)
+
+	polars_db = gp.PolarsDB.get_instance()
+	key = ResponseCache.key(queries, polars_db.version)
+	response = response_cache.get(key)
+	if response is None:
+		with section('polar'):
+			response = json.dumps({'version': polars_db.version, 'results': evaluate(polars_db, queries)}, allow_nan=False)
+		response_cache.put(key, response)
+	return flask.Response(response, mimetype='application/json')
+
+def init_app(server, prefix = API_PREFIX):
+	# add the API routes to the flask server of the Dash app
+	blueprint = flask.Blueprint('api', __name__, url_prefix=prefix)
+	blueprint.add_url_rule('/gliders', 'gliders', api_gliders, methods=['GET'])
+	blueprint.add_url_rule('/polars', 'polars', api_polars, methods=['POST'])
+	blueprint.register_error_handler(ApiError, _api_error)
+	server.register_blueprint(blueprint)
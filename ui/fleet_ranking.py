@@ -0,0 +1,72 @@
+from dash import html, dcc
+import dash_bootstrap_components as dbc
+
+import numpy as np
+import glider.polar as gp
+from glider import ranking
+from ui.instrumentation import section
+
+# fleet comparison matrix of the current polars DB, see glider.ranking
+fleet_ranking = ranking.FleetRanking()
+
+RANK_LIMITS = [5, 10, 20, 50]
+BAR_HOVER_TEMPLATE = '<extra></extra><b>%{y}</b><br>Glide ratio: %{x:.1f}<br>Sink rate: %{customdata:.2f}m/s'
+
+def render_tab_fleet_ranking():
+	speeds, wing_loadings = ranking.SPEED_AXIS, ranking.WING_LOADING_AXIS
+	return html.Div(className='mx-5', children = [
+		dbc.Row(className='my-4', children= [
+			dbc.Col(
+				html.Div([
+					"Speed (km/h)",
+					dcc.Slider(speeds[0], speeds[-1], speeds[1] - speeds[0], value=140, id='ranking-speed-slider', persistence=True, persistence_type='session',
+						marks={int(speed): '{}'.format(int(speed)) for speed in speeds[::4]}),
+				]),
+				width={"size": 4, "offset": 1}
+			),
+			dbc.Col(
+				html.Div([
+					"Wing loading (kg/m2)",
+					dcc.Slider(wing_loadings[0], wing_loadings[-1], wing_loadings[1] - wing_loadings[0], value=40, id='ranking-wing-loading-slider',
+						persistence=True, persistence_type='session', marks={int(wl): '{}'.format(int(wl)) for wl in wing_loadings[::5]}),
+				]),
+				width=4
+			),
+			dbc.Col(
+				html.Div([
+					dbc.Label("Gliders"),
+					dcc.Dropdown(options=RANK_LIMITS, value=ranking.RANK_LIMIT, id='ranking-limit', clearable=False, persistence=True, persistence_type='session'),
+					dbc.Switch(id='ranking-reachable', label='Flyable at this wing loading', value=True, persistence=True, persistence_type='session'),
+				]),
+				width=2
+			)]),
+		dbc.Row(
+			dbc.Col(
+				dcc.Graph(id='ranking-graph'),
+				width=12)
+			),
+	])
+
+def update_tab_fleet_ranking(speed, wing_loading, limit, reachable):
+	polars_db = gp.PolarsDB.get_instance()
+	with section('polar'):
+		matrix = fleet_ranking.matrix(polars_db)
+		ids, sink_rate, glide_ratio = matrix.rank(speed, wing_loading, limit, reachable=reachable)
+		labels = [polars_db.labelFromId(int(glider_id)) for glider_id in ids]
+		speed = matrix.speeds[matrix.nearest(1, speed)]
+		wing_loading = matrix.wing_loadings[matrix.nearest(0, wing_loading)]
+
+	with section('figure'):
+		# best glider on top
+		trace = dict(type='bar', orientation='h', x=glide_ratio[::-1], y=labels[::-1], customdata=sink_rate[::-1],
+			text=['{:.1f}'.format(ld) for ld in glide_ratio[::-1]], textposition='auto', hovertemplate=BAR_HOVER_TEMPLATE)
+		axis_title = dict(size=14, family='Courier', color='crimson')
+		layout = dict(
+			title_text='<b>Best glide ratio at {:.0f} km/h with {:.0f} kg/m2</b>{}'.format(speed, wing_loading,
+				'' if len(ids) > 0 else '<br><i>no glider flies at this wing loading</i>'),
+			height=max(400, 120 + 30 * len(ids)),
+			template='ggplot2',
+			xaxis=dict(title=dict(text='Glide ratio', font=axis_title), range=[0, float(np.max(glide_ratio, initial=0)) * 1.1]),
+			yaxis=dict(automargin=True),
+		)
+		return dict(data=[trace], layout=layout)
@@ -0,0 +1,32 @@
+from dash import dcc
+
+from ui.instrumentation import section
+
+# The glider dropdowns are rendered without options, they are loaded by a callback on the
+# search_value of the dropdown as the user types (see PolarsDB.search()), at most
+# SEARCH_LIMIT of them, so the payload of the tabs does not grow with the polars DB.
+
+SEARCH_PLACEHOLDER = 'Type a glider or a source...'
+
+def glider_dropdown(id, **props):
+	return dcc.Dropdown(options=[], id=id, placeholder=SEARCH_PLACEHOLDER, **props)
+
+def search_options(polars_db, search_value, value, methods = None, by_label = False):
+	# options matching search_value, plus the selected value so that the dropdown keeps its
+	# label. Values are the glider ids, or the 'name / source' labels when by_label is True.
+	with section('polar'):
+		ids = polars_db.search(search_value, methods)
+		selected = value
+		if by_label and value is not None:
+			try:
+				selected = polars_db.gliderId(*value.split(' / ', 1))
+			except Exception:
+				selected = None
+		if selected is not None and selected not in ids and polars_db.isGliderId(selected):
+			ids.append(selected)
+
+		options = []
+		for glider_id in ids:
+			label = polars_db.labelFromId(glider_id)
+			options.append({'label': label, 'value': label if by_label else glider_id})
+	return options
@@ -0,0 +1,202 @@
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+import flask
+from dash.exceptions import PreventUpdate
+
+# Request level metrics of the Dash callbacks. The callbacks of app.py are wrapped with
+# instrument(), the ui code marks with section() the time spent in glider.polar ('polar')
+# and building the plotly figures ('figure'), nested sections pausing the enclosing one.
+# The response of the callback request gives the size of the json sent to the browser.
+#
+# init_app() exposes the metrics in the Prometheus text format on /metrics. They are kept
+# per process: with gunicorn each worker answers with its own counters, labeled by pid.
+# When CALLBACK_LOG is set (a file, or - for stderr) each callback request is also logged
+# as a json line.
+
+CALLBACK_LOG = os.environ.get('CALLBACK_LOG')
+METRICS_PATH = '/metrics'
+DURATION_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]		# seconds
+SECTIONS = ['polar', 'figure']
+
+log = logging.getLogger('glider.callbacks')
+
+class CallbackStats:
+	def __init__(self):
+		self.requests = 0
+		self.errors = 0
+		self.prevented = 0
+		self.duration = 0.0						# seconds in the callback functions
+		self.request_duration = 0.0				# seconds from the request to the serialized response
+		self.buckets = [0] * len(DURATION_BUCKETS)
+		self.sections = {section: 0.0 for section in SECTIONS}
+		self.response_bytes = 0
+
+class CallbackMetrics:
+	def __init__(self):
+		self.__stats = {}
+		self.__lock = threading.Lock()
+
+	def record(self, callback, duration, request_duration, sections, response_bytes, status):
+		with self.__lock:
+			stats = self.__stats.setdefault(callback, CallbackStats())
+			stats.requests += 1
+			stats.errors += status == 'error'
+			stats.prevented += status == 'prevented'
+			stats.duration += duration
+			stats.request_duration += request_duration
+			for i, bucket in enumerate(DURATION_BUCKETS):
+				if request_duration <= bucket:
+					stats.buckets[i] += 1
+			for section, seconds in sections.items():
+				stats.sections[section] = stats.sections.get(section, 0.0) + seconds
+			stats.response_bytes += response_bytes
+
+	def clear(self):
+		with self.__lock:
+			self.__stats.clear()
+
+	def snapshot(self):
+		with self.__lock:
+			return {callback: vars(stats).copy() for callback, stats in self.__stats.items()}
+
+	def prometheus(self, caches = {}):
+		# metrics in the Prometheus text exposition format, caches maps a name to a function
+		# returning a (hits, misses, maxsize, currsize) tuple like functools.lru_cache
+		pid = os.getpid()
+		lines = []
+		def header(name, kind, help):
+			lines.append('# HELP {} {}'.format(name, help))
+			lines.append('# TYPE {} {}'.format(name, kind))
+		def sample(name, labels, value):
+			labels = dict(labels, pid=pid)
+			lines.append('{}{{{}}} {}'.format(name, ','.join('{}="{}"'.format(k, v) for k, v in labels.items()), value))
+
+		snapshot = sorted(self.snapshot().items())
+		for name, field, kind, help in [
+				('glider_callback_requests_total', 'requests', 'counter', 'Callback requests.'),
+				('glider_callback_errors_total', 'errors', 'counter', 'Callback requests that raised an exception.'),
+				('glider_callback_prevented_total', 'prevented', 'counter', 'Callback requests without update (PreventUpdate).'),
+				('glider_callback_seconds_total', 'duration', 'counter', 'Time spent in the callback functions.'),
+				('glider_callback_response_bytes_total', 'response_bytes', 'counter', 'Size of the serialized callback responses.')]:
+			header(name, kind, help)
+			for callback, stats in snapshot:
+				sample(name, {'callback': callback}, stats[field])
+
+		header('glider_callback_section_seconds_total', 'counter', 'Time spent in glider.polar (polar) and building the figures (figure).')
+		for callback, stats in snapshot:
+			for section, seconds in stats['sections'].items():
+				sample('glider_callback_section_seconds_total', {'callback': callback, 'section': section}, seconds)
+
+		header('glider_callback_request_seconds', 'histogram', 'Time from the callback request to its serialized response.')
+		for callback, stats in snapshot:
+			for bucket, count in zip(DURATION_BUCKETS, stats['buckets']):
+				sample('glider_callback_request_seconds_bucket', {'callback': callback, 'le': bucket}, count)
+			sample('glider_callback_request_seconds_bucket', {'callback': callback, 'le': '+Inf'}, stats['requests'])
+			sample('glider_callback_request_seconds_sum', {'callback': callback}, stats['request_duration'])
+			sample('glider_callback_request_seconds_count', {'callback': callback}, stats['requests'])
+
+		infos = [(name, cache_info()) for name, cache_info in sorted(caches.items())]
+		for name, i, kind, help in [
+				('glider_cache_hits_total', 0, 'counter', 'Cache hits.'),
+				('glider_cache_misses_total', 1, 'counter', 'Cache misses.'),
+				('glider_cache_max_size', 2, 'gauge', 'Capacity of the cache.'),
+				('glider_cache_size', 3, 'gauge', 'Number of items in the cache.')]:
+			header(name, kind, help)
+			for cache, info in infos:
+				sample(name, {'cache': cache}, info[i])
+		return '\n'.join(lines) + '\n'
+
+metrics = CallbackMetrics()
+
+def instrument(callback):
+	# to put under @app.callback, records the callback of the request and its duration
+	@wraps(callback)
+	def wrapper(*args, **kwargs):
+		if not flask.has_request_context():
+			return callback(*args, **kwargs)
+
+		flask.g.callback = callback.__name__
+		flask.g.callback_status = 'ok'
+		flask.g.callback_sections = {}
+		flask.g.callback_section_stack = []
+		start = time.perf_counter()
+		try:
+			return callback(*args, **kwargs)
+		except PreventUpdate:
+			flask.g.callback_status = 'prevented'
+			raise
+		except Exception:
+			flask.g.callback_status = 'error'
+			raise
+		finally:
+			flask.g.callback_duration = time.perf_counter() - start
+	return wrapper
+
+@contextmanager
+def section(name):
+	# time spent in name during the current callback, excluding the nested sections
+	if not flask.has_request_context() or 'callback_section_stack' not in flask.g:
+		yield
+		return
+
+	sections, stack = flask.g.callback_sections, flask.g.callback_section_stack
+	now = time.perf_counter()
+	if len(stack) > 0:
+		sections[stack[-1][0]] = sections.get(stack[-1][0], 0.0) + now - stack[-1][1]
+	stack.append([name, now])
+	try:
+		yield
+	finally:
+		now = time.perf_counter()
+		current, start = stack.pop()
+		sections[current] = sections.get(current, 0.0) + now - start
+		if len(stack) > 0:
+			stack[-1][1] = now
+
+def _before_request():
+	flask.g.request_start = time.perf_counter()
+
+def _after_request(response):
+	if 'callback' not in flask.g:
+		return response
+
+	request_duration = time.perf_counter() - flask.g.request_start
+	response_bytes = response.content_length
+	if response_bytes is None:
+		response_bytes = 0 if response.is_streamed else len(response.get_data())
+	metrics.record(flask.g.callback, flask.g.callback_duration, request_duration,
+		flask.g.callback_sections, response_bytes, flask.g.callback_status)
+
+	if log.handlers:
+		log.info(json.dumps({
+			'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+			'pid': os.getpid(),
+			'callback': flask.g.callback,
+			'status': flask.g.callback_status,
+			'callback_seconds': round(flask.g.callback_duration, 6),
+			'request_seconds': round(request_duration, 6),
+			'sections': {k: round(v, 6) for k, v in flask.g.callback_sections.items()},
+			'response_bytes': response_bytes,
+		}))
+	return response
+
+def init_app(server, caches = {}, log_file = CALLBACK_LOG):
+	# hook the metrics on the flask server of the Dash app
+	server.before_request(_before_request)
+	server.after_request(_after_request)
+	server.add_url_rule(METRICS_PATH, 'metrics',
+		lambda: flask.Response(metrics.prometheus(caches), mimetype='text/plain; version=0.0.4'))
+
+	if log_file and not log.handlers:
+		handler = logging.StreamHandler(sys.stderr) if log_file == '-' else logging.FileHandler(log_file)
+		handler.setFormatter(logging.Formatter('%(message)s'))
+		log.addHandler(handler)
+		log.setLevel(logging.INFO)
+		log.propagate = False
@@ -1,71 +1,84 @@
-from dash import Dash, html, dcc, ctx
-from dash.dependencies import Input, Output
+from dash import html, dcc, Patch
 import dash_bootstrap_components as dbc
 
-import json
+from functools import lru_cache
 
 import plotly.graph_objects as go
-import plotly.express as px
 
 import numpy as np
 import glider.polar as gp
+from ui.instrumentation import section
+from ui.glider_search import glider_dropdown
 
-def render_tab_compare_polars(polars_db):
-	options = polars_db.findByMethod()
+COMPARE_SLOTS = 4				# glider slots of the tab when it is rendered, more can be added
+TRACE_CACHE_SIZE = 256
+HOVER_TEMPLATE = '<extra></extra>Speed: %{x:.0f}km/h<br>Sink rate: %{y:.2f}m/s'
+
+# The selection of the compare tab, in the 'polars-selection' store, is the list of the
+# filled slots: {'gliders': [{'id': glider id, 'wing_loading': kg/m2 or None}, ...]}, the ids
+# being those of PolarsDB.findIdsByMethod() and None the reference wing loading of the polar.
+
+def glider_slot(index):
+	return dbc.Col(className='mt-2', children=[
+		html.Div(["Glider #{}".format(index + 1), dbc.Row([
+			dbc.Col(glider_dropdown({'type': 'compare-glider', 'index': index}, persistence=True, persistence_type='session'), width=9),
+			dbc.Col(dcc.Input(id={'type': 'compare-wing-loading', 'index': index}, type='number', min=10, max=100, step=0.1,
+				placeholder='kg/m2', className='form-control', persistence=True, persistence_type='session'), width=3),
+		])])],
+		width=6)
+
+def render_tab_compare_polars():
 	return html.Div(className='mx-5 mt-3', children = [
-		# dcc.Store(id='polars-selection', storage_type='session'),
-		# dcc.Store(id='polars-selection', storage_type='memory'),
-		dbc.Row( 
-			[dbc.Col(className='mt-2', children=[
-				html.Div(["Glider #1", dcc.Dropdown( options, id='glider-1',persistence=True, persistence_type='session')])], 
-				width=6),
-			dbc.Col(className='mt-2', children=[
-				html.Div(["Glider #2",dcc.Dropdown(options, id='glider-2',persistence=True, persistence_type='session')])], 
-				width=6)],
-			),
-		dbc.Row( 
-			[dbc.Col(className='mt-2', children=[
-				html.Div(["Glider #3", dcc.Dropdown(options, id='glider-3',persistence=True, persistence_type='session')])], 
-				width=6),
+		dbc.Row(id='compare-slots', children=[glider_slot(i) for i in range(COMPARE_SLOTS)]),
+		dbc.Row(
 			dbc.Col(className='mt-2', children=[
-				html.Div(["Glider #4",dcc.Dropdown(options, id='glider-4',persistence=True, persistence_type='session')])], 
-				width=6)],
+				dbc.Button('Add a glider', id='compare-add-glider', color='secondary', size='sm', n_clicks=0)],
+				width=12)
 			),
-		dbc.Row( 
+		dbc.Row(
 			dbc.Col(
 				dcc.Graph(className='mt-3',
 					id='speed-polar-compare-graph',
 					# figure=fig,
-				), 
+				),
 				width=12)
 			),
 	])
 
-def update_tab_compare_polars(data):
-	us_data = json.loads(data)
-
-	polars = []
-	for row in us_data['inputs'].values():
-		if row is not None:
-			name = row[:row.index('/')-1]
-			source = row[row.index('/')+2:]
-			# print('Look for glider polar [{}] / [{}]'.format(name,source))
-			polars.append(
-				gp.PolarsDB.get_instance().fromNameAndSource(name,source)
-			)
-
-	# Update plotly figure: Add traces depending on gliders selection
-	traces=[]
-	for polar in polars:
+def add_compare_slot(n_clicks):
+	# append a slot without sending back the existing ones
+	patch = Patch()
+	patch.append(glider_slot(COMPARE_SLOTS + n_clicks - 1))
+	return patch
+
+def polars_selection(glider_ids, wing_loadings):
+	# selection state from the values of the slots (pattern matching callback, slot order)
+	polars_db = gp.PolarsDB.get_instance()
+	gliders = []
+	for glider_id, wing_loading in zip(glider_ids, wing_loadings):
+		# ids persisted in the session may not exist anymore if the polars DB was reloaded
+		if glider_id is None or not polars_db.isGliderId(glider_id):
+			continue
+		gliders.append({'id': glider_id, 'wing_loading': None if wing_loading is None else float(wing_loading)})
+	return {'gliders': gliders}
+
+@lru_cache(maxsize=TRACE_CACHE_SIZE)
+def compare_trace(glider_id, wing_loading, version):
+	# trace of one glider at a wing loading, as a plain dict, rebuilt only when its slot changes
+	polars_db = gp.PolarsDB.get_instance()
+	with section('polar'):
+		name, source = polars_db.labelFromId(glider_id).split(' / ', 1)
+		polar = polars_db.cachedPolar(name, source, wing_loading)
 		x_polar = np.linspace(gp.POLAR_CURVE_START_KM,gp.POLAR_CURVE_END_KM,gp.POLAR_CURVE_NBR_SAMPLE)
 		y_polar = polar.curve(x_polar)
 
-		tn = '{} (wing loading: {} kg/m2)'.format(polar.source,  polar.wing_loading)
-		trace = go.Scatter( x=x_polar, y=y_polar, mode='lines', 
-			name = '<b>{}</b><br><i>{}</i><br>'.format(polar.name,tn),
-			hovertemplate='<extra></extra>Speed: %{x:.0f}km/h<br>Sink rate: %{y:.2f}m/s', hoverinfo='x+y')
-		traces.append(trace)
+	tn = '{} (wing loading: {} kg/m2)'.format(polar.source,  polar.wing_loading)
+	return dict(type='scatter', x=x_polar, y=y_polar, mode='lines',
+		name = '<b>{}</b><br><i>{}</i><br>'.format(polar.name,tn),
+		hovertemplate=HOVER_TEMPLATE, hoverinfo='x+y')
 
+@lru_cache(maxsize=1)
+def compare_layout():
 	# finalize the layout of the graph
 	layout = go.Layout(
 		title_text='<b>side by side comparison of speed polars</b>',
@@ -74,7 +87,7 @@ def update_tab_compare_polars(data):
 		xaxis=dict(range=[0, 250]),
 		template='ggplot2',
 	)
-	fig = go.Figure(data=traces, layout=layout)
+	fig = go.Figure(layout=layout)
 
 	fig.update_yaxes(zeroline=True, zerolinewidth=1, zerolinecolor='black',  dtick=0.5)
 	fig.update_yaxes(title_text='Vz (m/s)', title_font=dict(size=14, family='Courier', color='crimson'))
@@ -85,5 +98,18 @@ def update_tab_compare_polars(data):
 		title_font=dict(size=14, family='Courier', color='crimson')
 	)
 	# fig.update_layout(transition_duration=500, transition_easing= 'elastic-in')
+	return fig.to_plotly_json()['layout']
+
+def update_tab_compare_polars(selection):
+	if selection is None:
+		selection = {'gliders': []}
 
-	return fig
\ No newline at end of file
+	version = gp.PolarsDB.get_instance().version
+	with section('figure'):
+		traces = []
+		for glider in selection['gliders']:
+			wing_loading = glider['wing_loading']
+			if wing_loading is not None:
+				wing_loading = round(wing_loading, gp.POLAR_CACHE_WL_DECIMALS)
+			traces.append(compare_trace(glider['id'], wing_loading, version))
+		return dict(data=traces, layout=compare_layout())
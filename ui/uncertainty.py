@@ -0,0 +1,118 @@
+from functools import lru_cache
+
+from dash import html, dcc
+from dash.exceptions import PreventUpdate
+import dash_bootstrap_components as dbc
+
+import numpy as np
+import glider.polar as gp
+from glider import uncertainty
+from ui.instrumentation import section
+from ui.glider_search import glider_dropdown
+
+# confidence bands of the polars of all the sources of a glider, see glider.uncertainty
+
+BAND_CACHE_SIZE = 32
+BAND_SPEEDS = 81
+SAMPLE_COUNTS = [10000, 50000, uncertainty.INTERACTIVE_SAMPLES]		# larger runs with python -m glider.uncertainty
+COLORS = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b', '#e377c2', '#7f7f7f']
+BAND_HOVER_TEMPLATE = '<extra></extra><b>%{fullData.name}</b><br>Speed: %{x:.0f}km/h<br>Sink rate: %{y:.2f}m/s'
+LD_HOVER_TEMPLATE = '<extra></extra><b>%{x}</b><br>Best L/D: %{y:.1f} [%{customdata[0]:.1f} - %{customdata[1]:.1f}]<br>Invalid fits: %{customdata[2]:.1%}'
+
+def render_tab_uncertainty():
+	return html.Div(className='mx-5', children = [
+		dbc.Row(className='my-4', children= [
+			dbc.Col(
+				html.Div([
+					dbc.Label("Select a glider, all its sources are compared"),
+					glider_dropdown('uncertainty-glider-selected', persistence=True, persistence_type='session')
+				]),
+				width={"size": 3, "offset": 1}
+			),
+			dbc.Col(
+				html.Div([
+					"Error on the sink rates (m/s)",
+					dcc.Slider(0.01, 0.2, 0.01, value=uncertainty.SINK_RATE_SIGMA, id='uncertainty-sigma-slider', persistence=True, persistence_type='session',
+						marks={sigma: '{}'.format(sigma) for sigma in [0.01, 0.05, 0.1, 0.15, 0.2]}),
+				]),
+				width=3
+			),
+			dbc.Col(
+				html.Div([
+					dbc.Label("Wing loading (kg/m2)"),
+					dcc.Input(id='uncertainty-wing-loading', type='number', min=10, max=80, placeholder='reference', debounce=True,
+						className='form-control', persistence=True, persistence_type='session'),
+				]),
+				width=2
+			),
+			dbc.Col(
+				html.Div([
+					dbc.Label("Samples"),
+					dcc.Dropdown(options=SAMPLE_COUNTS, value=SAMPLE_COUNTS[0], id='uncertainty-samples', clearable=False, persistence=True, persistence_type='session'),
+				]),
+				width=2
+			)]),
+		dbc.Row(
+			dbc.Col(
+				dcc.Graph(id='uncertainty-graph'),
+				width=12)
+			),
+	])
+
+@lru_cache(maxsize=BAND_CACHE_SIZE)
+def uncertainty_traces(glider_name, sink_rate_sigma, wing_loading, samples, version):
+	# band and best L/D traces of the sources of a glider, as plain dicts
+	polars_db = gp.PolarsDB.get_instance()
+	with section('polar'):
+		results, rejected = uncertainty.glider_uncertainties(polars_db, glider_name, wing_loading, executor=uncertainty.shared_executor(),
+			samples=samples, sink_rate_sigma=sink_rate_sigma)
+		low = min([r.points()[0].min() for r in results], default=60)
+		high = max([r.points()[0].max() for r in results], default=200)
+		x = np.linspace(low * 0.9, high * 1.1, BAND_SPEEDS)
+		bands = [r.band(x) for r in results]
+		intervals = [r.interval('best_glide_ratio') for r in results]
+
+	with section('figure'):
+		traces = []
+		for i, (result, band) in enumerate(zip(results, bands)):
+			color = COLORS[i % len(COLORS)]
+			name = '{} ({:.1f} kg/m2)'.format(result.source, result.wing_loading)
+			traces.append(dict(type='scatter', x=x, y=band[0], mode='lines', line=dict(width=0, color=color), legendgroup=name,
+				showlegend=False, hoverinfo='skip'))
+			traces.append(dict(type='scatter', x=x, y=band[2], mode='lines', line=dict(width=0, color=color), fill='tonexty',
+				opacity=0.3, legendgroup=name, showlegend=False, hoverinfo='skip'))
+			traces.append(dict(type='scatter', x=x, y=band[1], mode='lines', line=dict(color=color), name=name, legendgroup=name,
+				hovertemplate=BAND_HOVER_TEMPLATE))
+			if result.method != 'ABC':
+				speeds, sink_rates = result.points()
+				traces.append(dict(type='scatter', x=speeds, y=sink_rates, mode='markers', marker=dict(color=color, symbol='x', size=9),
+					legendgroup=name, showlegend=False, hoverinfo='skip'))
+		traces.append(dict(type='scatter', x=[r.source for r in results], y=[i[1] for i in intervals], mode='markers', xaxis='x2', yaxis='y2',
+			marker=dict(color=[COLORS[i % len(COLORS)] for i in range(len(results))], size=10), showlegend=False,
+			error_y=dict(type='data', symmetric=False, array=[i[2] - i[1] for i in intervals], arrayminus=[i[1] - i[0] for i in intervals]),
+			customdata=[(i[0], i[2], r.invalid_fraction()) for i, r in zip(intervals, results)], hovertemplate=LD_HOVER_TEMPLATE))
+		return traces, [label for label, _ in rejected]
+
+def update_tab_uncertainty(glider_id, sink_rate_sigma, wing_loading, samples):
+	polars_db = gp.PolarsDB.get_instance()
+	if glider_id is None or not polars_db.isGliderId(glider_id):
+		raise PreventUpdate
+
+	name = polars_db.labelFromId(glider_id).split(' / ', 1)[0]
+	samples = min(samples, uncertainty.INTERACTIVE_SAMPLES)		# a larger value persisted by an older version
+	traces, rejected = uncertainty_traces(name, sink_rate_sigma, wing_loading, samples, polars_db.version)
+	with section('figure'):
+		axis_title = dict(size=14, family='Courier', color='crimson')
+		layout = dict(
+			title_text='<b>{}: {:.0%} confidence bands, {} m/s error on the sink rates</b>{}'.format(name, uncertainty.CONFIDENCE, sink_rate_sigma,
+				'' if len(rejected) == 0 else '<br><i>not analyzed: {}</i>'.format(', '.join(rejected))),
+			height=600,
+			template='ggplot2',
+			hovermode='closest',
+			xaxis=dict(domain=[0, 0.68], title=dict(text='Speed (km/h)', font=axis_title)),
+			yaxis=dict(title=dict(text='Sink rate (m/s)', font=axis_title)),
+			xaxis2=dict(domain=[0.76, 1], anchor='y2', type='category'),
+			yaxis2=dict(anchor='x2', title=dict(text='Best L/D', font=axis_title)),
+			legend=dict(orientation='h', yanchor='top', y=-0.15, xanchor='left', x=0),
+		)
+		return dict(data=list(traces), layout=layout)
@@ -1,32 +1,37 @@
-from dash import Dash, html, dcc, ctx
-from dash.dependencies import Input, Output
+from dash import html, dcc, ctx, Patch
 from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
 import dash
-import json
+import os
+from functools import lru_cache
 
 import plotly.graph_objects as go
-import plotly.express as px
+from plotly.colors import qualitative
 
 import numpy as np
 import glider.polar as gp
+from ui.instrumentation import section
+from ui.glider_search import glider_dropdown
 
-def polar_to_string(p):
-	polar_str = '{}x<sup>2</sup>'.format(round(p.coeffs[0],4))
-	polar_str += (' + ' if (p.coeffs[1] >= 0 ) else ' ')
-	polar_str += '{}x'.format(round(p.coeffs[1],4))
-	polar_str += (' + ' if (p.coeffs[2] >= 0 ) else ' ')
-	polar_str += '{}'.format(round(p.coeffs[2],4))
+def polar_to_string(coefficients):
+	a, b, c = coefficients
+	polar_str = '{}x<sup>2</sup>'.format(round(a,4))
+	polar_str += (' + ' if (b >= 0 ) else ' ')
+	polar_str += '{}x'.format(round(b,4))
+	polar_str += (' + ' if (c >= 0 ) else ' ')
+	polar_str += '{}'.format(round(c,4))
 	return polar_str
 
+# the wing loading tab works with the quadratic polars only, its dropdown values are labels
+WL_EFFECT_METHODS = ['ABC', '3-points']
+
 def render_tab_wingloading_analysis():
-	options = gp.PolarsDB.get_instance().findByMethod(['ABC','3-points'])
 	return html.Div(className='mx-5', children = [
 		dbc.Row(className='my-4', children= [ 
 			dbc.Col(
 				html.Div([
 					dbc.Label("Select a glider polar"),
-					dcc.Dropdown(options=options,id='glider-selected',persistence=True, persistence_type='session')
+					glider_dropdown('glider-selected',persistence=True, persistence_type='session')
 				]), 
 				width={"size": 3, "offset": 1}
 			),
@@ -47,65 +52,46 @@ def render_tab_wingloading_analysis():
 				), 
 				width=12)
 			),
+		dcc.Store(id='wing-loading-polar', storage_type='memory'),
 	])
 
-def update_tab_wingloading_analysis(glider_name, wingloading_value):
-	if glider_name is None:
-		raise PreventUpdate
+# when True, wing loading slider moves are computed in the browser by assets/wl_effect.js
+CLIENTSIDE_WING_LOADING = os.environ.get('CLIENTSIDE_WING_LOADING', '').lower() in ['1', 'true', 'yes']
 
-	name = glider_name[:glider_name.index('/')-1]
-	source = glider_name[glider_name.index('/')+2:]
-	# print('in update_tab_wingloading_analysis(), name={}, source={}, wing loading={}, triggered_id={}'.format(name,source,wingloading_value,ctx.triggered_id))
-	aGliderPolar = gp.PolarsDB.get_instance().fromNameAndSource(name,source)
+TANGENT_X = np.array([0, 249])							# the tangents are straight lines, their ends are enough
+STATIC_FIGURE_CACHE_SIZE = 128
+HOVER_TEMPLATE = '<extra></extra>Speed: %{x:.0f}km/h<br>Sink rate: %{y:.2f}m/s'
+MARKER_HOVER_TEMPLATE = '<extra></extra>Speed: %{x:.1f}km/h<br>Sink rate: %{y:.2f}m/s'
 
-	# update the polar of the selected glider is we wing loading slider has moved
-	if (ctx.triggered_id == 'wing-loading-slider'):
-		aGliderPolar.update_wing_loading(wingloading_value)
-	else:
-		wingloading_value = aGliderPolar.wing_loading
+def polar_x():
+	return np.linspace(gp.POLAR_CURVE_START_KM,gp.POLAR_CURVE_END_KM,gp.POLAR_CURVE_NBR_SAMPLE)
 
-	x_polar = np.linspace(gp.POLAR_CURVE_START_KM,gp.POLAR_CURVE_END_KM,gp.POLAR_CURVE_NBR_SAMPLE)
-	y_polar = aGliderPolar.curve(x_polar)
-	y_ref_polar = aGliderPolar.init_curve(x_polar)
+def static_figure(name, source):
+	# the part of the figure that does not depend on the wing loading, built once per glider
+	# and per version of the polars DB
+	return _static_figure(name, source, gp.PolarsDB.get_instance().version)
 
-	# Update plotly figure
-	traces=[]
-	colors = px.colors.qualitative.Plotly
+@lru_cache(maxsize=STATIC_FIGURE_CACHE_SIZE)
+def _static_figure(name, source, version):
+	x_polar = polar_x()
+	with section('polar'):
+		aGliderPolar = gp.PolarsDB.get_instance().cachedPolar(name,source)
+		y_polar = aGliderPolar.init_curve(x_polar)
+	colors = qualitative.Plotly
 
 	# add the reference trace
-	trace = go.Scatter( x=x_polar, y=y_ref_polar, mode='lines', 
+	traces=[]
+	trace = go.Scatter( x=x_polar, y=y_polar, mode='lines', 
 		name = '<i>Initial<br>(wing loading: {} kg/m2)</i>'.format(aGliderPolar.init_wing_loading),
 		line = dict(dash='dash') ,
-		hovertemplate='<extra></extra>Speed: %{x:.0f}km/h<br>Sink rate: %{y:.2f}m/s', hoverinfo='x+y', )
+		hovertemplate=HOVER_TEMPLATE, hoverinfo='x+y', )
 	traces.append(trace)
 
-	#TODO: what about ABC method ?
-	if isinstance(aGliderPolar, gp.PolarGlider3Points):
-		traces.append(go.Scatter( x=aGliderPolar.speed, y=aGliderPolar.sink_rate, mode='markers', name='<i>p1, p2, p3 points</i>', marker_symbol = 'diamond',marker=dict(color=colors[1], size=10),
+	if aGliderPolar.method() == '3-points':
+		speed, sink_rate = aGliderPolar.points
+		traces.append(go.Scatter( x=speed, y=sink_rate, mode='markers', name='<i>p1, p2, p3 points</i>', marker_symbol = 'diamond',marker=dict(color=colors[1], size=10),
 			text=['Point #1', 'Point #2', 'Point #3'], hovertemplate='<extra></extra><b>%{text}</b><br>Speed: %{x}km/h<br>Sink rate: %{y}m/s', hoverinfo='x+y+text'))
 
-	# add the horizontal tangent to the polar
-	tg_x = np.arange(0,250)
-	tgh_y, x_int, y_int = aGliderPolar.tangent_horizontal(tg_x)
-	tg_trace = go.Scatter( x=tg_x, y=tgh_y, mode='lines', name = 'Horizontal tangent', line = dict(dash='dash') )
-	msr_marker = go.Scatter( x=x_int, y=y_int, mode='markers', name = 'Min sink rate', marker_symbol = 'x-dot',marker=dict(color=colors[2], size=10), 
-		hovertemplate='<extra></extra>Speed: %{x:.1f}km/h<br>Sink rate: %{y:.2f}m/s', hoverinfo='x+y' )
-	traces.append(tg_trace)
-	traces.append(msr_marker)
-
-	# add the tangent to the polar crossing origin(0,0)
-	tgao_y, x_int, y_int = aGliderPolar.tangent_at_origin(tg_x)
-	tg_trace = go.Scatter( x=tg_x, y=tgao_y, mode='lines', name = 'Tangent at (0,0)', line = dict(dash='dash') )
-	msr_marker = go.Scatter( x=x_int, y=y_int, mode='markers', name = 'Max glide ratio', marker_symbol = 'circle',marker=dict(color=colors[3], size=10),
-			hovertemplate='<extra></extra>Speed: %{x:.1f}km/h<br>Sink rate: %{y:.2f}m/s', hoverinfo='x+y' )
-	traces.append(tg_trace)
-	traces.append(msr_marker)
-
-	# Then add the curve that will be adjusted base on wing loading
-	traces.append(go.Scatter( x=x_polar, y=y_polar, mode='lines+markers', 
-		name = '<b>Adjusted Polar</b><br>(wing loading: {} kg/m2)'.format(aGliderPolar.wing_loading),
-		hovertemplate='<extra></extra>Speed: %{x:.0f}km/h<br>Sink rate: %{y:.2f}m/s', hoverinfo='x+y', ))
-
 	# finalize the layout of the graph
 	layout = go.Layout(
 		title_text='<b>{}</b><span class="font-size: smaller;"> (wing area: {}m2 - method {})</span>'.format(aGliderPolar.name,aGliderPolar.wing_area,aGliderPolar.method()),
@@ -125,11 +111,45 @@ def update_tab_wingloading_analysis(glider_name, wingloading_value):
 		title_font=dict(size=14, family='Courier', color='crimson')
 	)
 	fig.update_layout(transition_duration=500, transition_easing= 'elastic-in')
-	
+	return fig.to_plotly_json()
+
+def wing_loading_traces(aGliderPolar):
+	# the traces that move with the wing loading, as plain dicts to skip plotly validation on each slider tick
+	colors = qualitative.Plotly
+	x_polar = polar_x()
+	traces=[]
+	with section('polar'):
+		tangent_horizontal = aGliderPolar.tangent_horizontal(TANGENT_X)
+		tangent_at_origin = aGliderPolar.tangent_at_origin(TANGENT_X)
+		y_polar = aGliderPolar.curve(x_polar)
+
+	# add the horizontal tangent to the polar
+	tgh_y, x_int, y_int = tangent_horizontal
+	traces.append(dict(type='scatter', x=TANGENT_X, y=tgh_y, mode='lines', name = 'Horizontal tangent', line = dict(dash='dash') ))
+	traces.append(dict(type='scatter', x=x_int, y=y_int, mode='markers', name = 'Min sink rate', marker = dict(symbol='x-dot', color=colors[2], size=10), 
+		hovertemplate=MARKER_HOVER_TEMPLATE, hoverinfo='x+y' ))
+
+	# add the tangent to the polar crossing origin(0,0)
+	tgao_y, x_int, y_int = tangent_at_origin
+	traces.append(dict(type='scatter', x=TANGENT_X, y=tgao_y, mode='lines', name = 'Tangent at (0,0)', line = dict(dash='dash') ))
+	traces.append(dict(type='scatter', x=x_int, y=y_int, mode='markers', name = 'Max glide ratio', marker = dict(symbol='circle', color=colors[3], size=10),
+			hovertemplate=MARKER_HOVER_TEMPLATE, hoverinfo='x+y' ))
+
+	# Then add the curve that will be adjusted base on wing loading
+	traces.append(dict(type='scatter', x=x_polar, y=y_polar, mode='lines+markers', 
+		name = '<b>Adjusted Polar</b><br>(wing loading: {} kg/m2)'.format(aGliderPolar.wing_loading),
+		hovertemplate=HOVER_TEMPLATE, hoverinfo='x+y', ))
+	return traces
+
+def wing_loading_annotations(aGliderPolar):
+	annotations = []
+	with section('polar'):
+		min_sink_rate = aGliderPolar.get_min_sink_rate()
+		max_gilde_ratio = aGliderPolar.get_max_glide_ratio()
+
 	# Min sink rate annotation
-	min_sink_rate = aGliderPolar.get_min_sink_rate()
 	text_annotation = '<b>Min sink rate</b><br> speed: {}km/h<br> Vz: {}m/s<br>L/D: {}'.format(round(min_sink_rate[0],1),round(min_sink_rate[1],2), round(min_sink_rate[2],1) )
-	fig.add_annotation(
+	annotations.append(dict(
 			name = 'min-sink-rate',
 			x=min_sink_rate[0], y=min_sink_rate[1], 
 			text=text_annotation,
@@ -138,12 +158,11 @@ def update_tab_wingloading_analysis(glider_name, wingloading_value):
 			yshift=-5,
 			ax= -10, ay= 80,
 			arrowhead=2,  arrowsize=1, arrowwidth=2,
-		)
+		))
 
 	# Max glide ratio annotation
-	max_gilde_ratio = aGliderPolar.get_max_glide_ratio()
 	text_annotation = '<b>Max glide ratio</b><br> speed: {}km/h<br> Vz: {}m/s<br>L/D: {}'.format(round(max_gilde_ratio[0],1),round(max_gilde_ratio[1],2), round(max_gilde_ratio[2],1) )
-	fig.add_annotation(
+	annotations.append(dict(
 			name = 'max-glide-ratio',
 			x=max_gilde_ratio[0], y=max_gilde_ratio[1], 
 			text=text_annotation,
@@ -152,11 +171,11 @@ def update_tab_wingloading_analysis(glider_name, wingloading_value):
 			yshift=5,xshift=5,
 			ax= 100, ay= -50,
 			arrowhead=2,  arrowsize=1, arrowwidth=2,
-		)
+		))
 	
 	# Speed polar equation
-	text_annotation = 'Polynomial equation for the polar:<br> {}'.format( polar_to_string(aGliderPolar.polynomial))
-	fig.add_annotation(
+	text_annotation = 'Polynomial equation for the polar:<br> {}'.format( polar_to_string(aGliderPolar.coefficients))
+	annotations.append(dict(
 			name = 'polynomial',
 			x=gp.xaxis_unit(50), y=0.4, 
 			text=text_annotation,
@@ -165,12 +184,84 @@ def update_tab_wingloading_analysis(glider_name, wingloading_value):
 			bordercolor='gray',
 			borderwidth=4,
 			showarrow=False,
-		)
+		))
+	return annotations
+
+def update_tab_wingloading_analysis(glider_name, wingloading_value):
+	if glider_name is None:
+		raise PreventUpdate
+
+	name = glider_name[:glider_name.index('/')-1]
+	source = glider_name[glider_name.index('/')+2:]
+
+	# get the polar of the selected glider updated to the wing loading if the slider has moved
+	with section('polar'):
+		if (ctx.triggered_id == 'wing-loading-slider'):
+			aGliderPolar = gp.PolarsDB.get_instance().cachedPolar(name,source,wingloading_value)
+		else:
+			aGliderPolar = gp.PolarsDB.get_instance().cachedPolar(name,source)
+			wingloading_value = aGliderPolar.wing_loading
+
+	with section('figure'):
+		figure = static_figure(name, source)
 
 	#Update wing loading output label
 	wl_output_label = '{} kg/m2'.format(wingloading_value)
 
+	if (ctx.triggered_id == 'wing-loading-slider'):
+		# the graph already shows this glider, only send what depends on the wing loading
+		with section('figure'):
+			patch = Patch()
+			offset = len(figure['data'])
+			for i, trace in enumerate(wing_loading_traces(aGliderPolar)):
+				for key in ('x', 'y', 'name'):
+					patch['data'][offset + i][key] = trace[key]
+			patch['layout']['annotations'] = wing_loading_annotations(aGliderPolar)
+		return [wl_output_label, dash.no_update, patch]
+
+	with section('figure'):
+		fig = full_figure(figure, aGliderPolar)
 	if (ctx.triggered_id == 'glider-selected'):
 		return [wl_output_label, wingloading_value, fig]
 	else:
 		return [wl_output_label, dash.no_update, fig]
+
+def full_figure(figure, aGliderPolar):
+	return dict(data=figure['data'] + wing_loading_traces(aGliderPolar), layout=dict(figure['layout'], annotations=wing_loading_annotations(aGliderPolar)))
+
+def wing_loading_store(figure, aGliderPolar):
+	# what assets/wl_effect.js needs to redo wing_loading_traces() and wing_loading_annotations()
+	return dict(
+		name=aGliderPolar.name,
+		source=aGliderPolar.source,
+		coefficients=list(aGliderPolar.init_coefficients),
+		speed_scale=aGliderPolar.speed_scale,
+		wing_loading=aGliderPolar.init_wing_loading,
+		wing_area=aGliderPolar.wing_area,
+		offset=len(figure['data']),
+		x_polar=polar_x().tolist(),
+		tangent_x=TANGENT_X.tolist(),
+	)
+
+def update_tab_wingloading_analysis_clientside(glider_name):
+	# clientside mode: the server only renders the glider at its reference wing loading,
+	# then the browser updates the figure when the slider moves
+	if glider_name is None:
+		raise PreventUpdate
+
+	name = glider_name[:glider_name.index('/')-1]
+	source = glider_name[glider_name.index('/')+2:]
+	with section('polar'):
+		aGliderPolar = gp.PolarsDB.get_instance().cachedPolar(name,source)
+	with section('figure'):
+		figure = static_figure(name, source)
+		fig = full_figure(figure, aGliderPolar)
+
+	wingloading_value = aGliderPolar.wing_loading
+	wl_output_label = '{} kg/m2'.format(wingloading_value)
+	store = wing_loading_store(figure, aGliderPolar)
+
+	if (ctx.triggered_id == 'glider-selected'):
+		return [wl_output_label, wingloading_value, fig, store]
+	else:
+		return [wl_output_label, dash.no_update, fig, store]
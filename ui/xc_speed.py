@@ -0,0 +1,92 @@
+from dash import html, dcc
+from dash.exceptions import PreventUpdate
+import dash_bootstrap_components as dbc
+
+import glider.polar as gp
+from glider import xcspeed
+from glider import maccready
+from ui.instrumentation import section
+from ui.glider_search import glider_dropdown
+
+# grids of the task speed simulator and of the speeds to fly, one per glider and version of the polars DB
+task_speed_engine = xcspeed.TaskSpeedEngine()
+maccready_engine = maccready.MacCreadyEngine()
+
+HEATMAP_HOVER_TEMPLATE = '<extra></extra>Thermal: %{x:.2f}m/s<br>Ballast: %{y:.0f}kg<br>Task speed: %{z:.1f}km/h'
+COLOR_SCALE = 'Viridis'
+
+def render_tab_xc_speed():
+	return html.Div(className='mx-5', children = [
+		dbc.Row(className='my-4', children= [
+			dbc.Col(
+				html.Div([
+					dbc.Label("Select a glider polar"),
+					glider_dropdown('xc-glider-selected', persistence=True, persistence_type='session')
+				]),
+				width={"size": 3, "offset": 1}
+			),
+			dbc.Col(
+				html.Div([
+					"MacCready setting (m/s)",
+					dcc.Slider(0, 5, 0.25, value=1.5, id='xc-mac-cready-slider', persistence=True, persistence_type='session',
+						marks={mc: '{}'.format(mc) for mc in range(6)}),
+				]),
+				width=3
+			),
+			dbc.Col(
+				html.Div([
+					"Airmass between the thermals (m/s)",
+					dcc.Slider(-2, 1, 0.25, value=0, id='xc-netto-slider', persistence=True, persistence_type='session',
+						marks={netto: '{}'.format(netto) for netto in range(-2, 2)}),
+				]),
+				width=3
+			)]),
+		dbc.Row(
+			dbc.Col(
+				dcc.Graph(id='xc-speed-graph'),
+				width=12)
+			),
+	])
+
+def heatmap(grid, values, axis):
+	return dict(type='heatmap', x=grid.axes[0], y=grid.ballast, z=values.T, xaxis='x' + axis, yaxis='y' + axis,
+		coloraxis='coloraxis', hovertemplate=HEATMAP_HOVER_TEMPLATE)
+
+def update_tab_xc_speed(glider_id, mac_cready, netto):
+	polars_db = gp.PolarsDB.get_instance()
+	if glider_id is None or not polars_db.isGliderId(glider_id):
+		raise PreventUpdate
+
+	with section('polar'):
+		name, source = polars_db.labelFromId(glider_id).split(' / ', 1)
+		grid = task_speed_engine.grid(name, source)
+		mc = grid.axes[2][grid.nearest(2, mac_cready)]
+		speed_to_fly = maccready_engine.speed_to_fly(name, source, mc, grid.wing_loading[[0, -1]], netto)[maccready.SPEED]
+
+	with section('figure'):
+		best = grid.best(netto)[0]
+		ballast = grid.best_ballast(netto)[0]
+		traces = [
+			heatmap(grid, grid.at(mac_cready, netto), ''),
+			heatmap(grid, best, '2'),
+			dict(type='scatter', x=grid.axes[0], y=ballast, xaxis='x2', yaxis='y2', mode='lines+markers', name='Best ballast',
+				line=dict(color='white'), hovertemplate='<extra></extra>Thermal: %{x:.2f}m/s<br>Best ballast: %{y:.0f}kg'),
+		]
+
+		axis_title = dict(size=14, family='Courier', color='crimson')
+		layout = dict(
+			title_text='<b>{} - {}</b>: task speed (km/h) vs thermal strength and ballast, airmass {} m/s'.format(name, source, grid.axes[3][grid.nearest(3, netto)]),
+			height=700,
+			template='ggplot2',
+			showlegend=False,
+			coloraxis=dict(colorscale=COLOR_SCALE, cmin=0, colorbar=dict(title='km/h')),
+			xaxis=dict(domain=[0, 0.45], title=dict(text='Thermal (m/s)', font=axis_title)),
+			yaxis=dict(title=dict(text='Ballast (kg)', font=axis_title)),
+			xaxis2=dict(domain=[0.55, 1], title=dict(text='Thermal (m/s)', font=axis_title)),
+			yaxis2=dict(anchor='x2', title=dict(text='Ballast (kg)', font=axis_title)),
+			annotations=[
+				dict(text='MacCready {} m/s, speed to fly {:.0f} km/h empty, {:.0f} km/h full'.format(mc, *speed_to_fly), xref='x domain', yref='y domain', x=0.5, y=1.05, showarrow=False),
+				dict(text='Best MacCready setting, and best ballast', xref='x2 domain', yref='y2 domain', x=0.5, y=1.05, showarrow=False),
+			],
+		)
+		return dict(data=traces, layout=layout)